@@ -0,0 +1,63 @@
+# Licensed under GPL3 https://github.com/maoschanz/drawing/blob/master/LICENSE
+
+from .utilities_histogram import utilities_histogram_of_pixbuf, \
+                                 utilities_histogram_update
+
+class DrHistogramManager():
+	"""Provides the histograms of the main pixbuf of an image, computed only
+	when they're needed, and cached as long as the pixbuf doesn't change. When
+	an operation tells which rectangle of the pixbuf it changed, the cached
+	histograms are updated by counting only the pixels of this rectangle."""
+	__gtype_name__ = 'DrHistogramManager'
+
+	def __init__(self, image):
+		self._image = image
+		self._histograms = None
+		# the value of `main_pixbuf_generation` the histograms correspond to
+		self._generation = None
+		self._selection_histograms = None
+		self._selection_generation = None
+
+	def get_histograms(self):
+		"""Return the histograms of the main pixbuf (see utilities_histogram).
+		The returned lists shouldn't be modified."""
+		generation = self._image.main_pixbuf_generation
+		if self._histograms is None or self._generation != generation:
+			self._histograms = utilities_histogram_of_pixbuf( \
+			                                            self._image.main_pixbuf)
+			self._generation = generation
+		return self._histograms
+
+	def get_selection_histograms(self):
+		"""Same as `get_histograms`, but for the pixbuf of the selection."""
+		selection = self._image.selection
+		if self._selection_histograms is None or \
+		          self._selection_generation != selection.pixbuf_generation:
+			self._selection_histograms = utilities_histogram_of_pixbuf( \
+			                                         selection.selection_pixbuf)
+			self._selection_generation = selection.pixbuf_generation
+		return self._selection_histograms
+
+	def on_main_pixbuf_replaced(self, old_pixbuf, rectangle):
+		"""Called by the image when its main pixbuf has been replaced by a new
+		one, which only differs from `old_pixbuf` inside `rectangle` (or
+		anywhere if `rectangle` is None)."""
+		generation = self._image.main_pixbuf_generation
+		if self._histograms is None or self._generation != generation - 1:
+			return # nothing to update: they'll be computed if they're needed
+		new_pixbuf = self._image.main_pixbuf
+		if rectangle is None or old_pixbuf is None or new_pixbuf is None or \
+		                  old_pixbuf.get_width() != new_pixbuf.get_width() or \
+		                  old_pixbuf.get_height() != new_pixbuf.get_height():
+			self._histograms = None
+			return
+		if rectangle[2] > 0 and rectangle[3] > 0:
+			old_histograms = utilities_histogram_of_pixbuf(old_pixbuf, rectangle)
+			new_histograms = utilities_histogram_of_pixbuf(new_pixbuf, rectangle)
+			utilities_histogram_update(self._histograms, old_histograms, \
+			                                                     new_histograms)
+		self._generation = generation
+
+	############################################################################
+################################################################################
+
@@ -1,6 +1,8 @@
 # Licensed under GPL3 https://github.com/maoschanz/drawing/blob/master/LICENSE
 
+import cairo, time
 from gi.repository import Gdk, Gio, GdkPixbuf, GLib
+from .utilities_snapshots import TiledPixbuf
 # from .abstract_tool import WrongToolIdException
 
 ################################################################################
@@ -8,6 +10,24 @@ from gi.repository import Gdk, Gio, GdkPixbuf, GLib
 class DrHistoryManager():
 	__gtype_name__ = 'DrHistoryManager'
 
+	# A copy of the image is attached as a "keyframe" to the operation applied
+	# after this number of operations since the last keyframe (or state)…
+	KEYFRAME_INTERVAL = 20
+	# … or as soon as replaying the operations since then would take more than
+	# this duration (in seconds), so rebuilding the image never has to replay
+	# the whole history since the last saving…
+	KEYFRAME_BUDGET = 0.5
+	# … or earlier if splitting the keyframes into tiles is cheap: as soon as
+	# the time tiling the last snapshot took is less than this fraction of the
+	# time the operations since the last keyframe took.
+	KEYFRAME_OVERHEAD = 0.1
+	# When the history uses more memory than allowed by the user, keyframes
+	# are removed, except this number of the most recent ones…
+	KEPT_KEYFRAMES = 2
+	# … and except if replaying the operations since the previous keyframe
+	# would then take more than this duration (in seconds).
+	THINNED_KEYFRAME_BUDGET = 4 * KEYFRAME_BUDGET
+
 	def __init__(self, image, **kwargs):
 		self._image = image
 
@@ -15,6 +35,13 @@ class DrHistoryManager():
 		self._redo_history = []
 		self._is_saved = True
 		self._waiting_for_rebuild = False
+		self._reset_keyframe_counters()
+		# the only state or keyframe whose pixels aren't in the tile store
+		self._raw_snapshot = None
+		# time (in seconds) the last snapshot took to be tiled, unknown yet
+		self._tiling_duration = float('inf')
+		self.initial_operation = None
+		self._reset_memory_size()
 
 	def get_saved(self):
 		# XXX undoing/redoing doesn't update the title so the "*" isn't visible
@@ -22,13 +49,17 @@ class DrHistoryManager():
 		return self._is_saved
 
 	def empty_history(self):
-		"""Probably useless way to explicitly 'forget' the objects. It doesn't
-		really free the memory, but it kinda helps i suppose."""
+		"""Explicitly 'forget' the objects, so the pixbufs can be freed even if
+		something still references the image or its operations."""
 		for op in self._undo_history:
 			self._delete_operation(op)
 		for op in self._redo_history:
 			self._delete_operation(op)
 		self._delete_operation(self.initial_operation)
+		self._undo_history = []
+		self._redo_history = []
+		self._raw_snapshot = None
+		self._reset_memory_size()
 
 	def _delete_operation(self, op):
 		for key in op:
@@ -45,6 +76,8 @@ class DrHistoryManager():
 			return
 		if len(self._undo_history) > 0:
 			last_op = self._undo_history.pop()
+			# its keyframe would be computed again if the operation is redone
+			self._remove_keyframe(last_op)
 			self._redo_history.append(last_op)
 		self._rebuild_from_history_async()
 		self._image.update_history_sensitivity()
@@ -55,6 +88,8 @@ class DrHistoryManager():
 			self._undo_history.append(operation)
 			self._image.restore_last_state()
 		else:
+			# it will be counted again when added back to the history
+			self._count_operation(operation, -1)
 			self._get_tool(operation['tool_id']).apply_operation(operation)
 
 	def can_undo(self):
@@ -87,15 +122,22 @@ class DrHistoryManager():
 	def rewind_history(self):
 		"""Put the entire 'undo' history into the 'redo' history, so the image
 		can be reset without losing any data."""
+		for op in self._undo_history:
+			self._remove_keyframe(op)
 		self._redo_history = self._undo_history[::-1] + self._redo_history
 		self._undo_history = []
+		self._reset_keyframe_counters()
 		self._image.update_history_sensitivity()
 
 	############################################################################
 	# Serialized operations ####################################################
 
-	def add_operation(self, operation):
+	def add_operation(self, operation, duration=0.0):
+		"""Add an operation which has just been applied to the history.
+		`duration` is the time (in seconds) it took to apply it, which is what
+		replaying it would cost when rebuilding the image."""
 		self._image.set_surface_as_stable_pixbuf()
+		self._image.reset_damaged_rectangle()
 		# print('add_operation_to_history')
 		# print(operation['tool_id'])
 		# if 'select' in operation['tool_id']:
@@ -103,6 +145,178 @@ class DrHistoryManager():
 		# 	print('-----------------------------------')
 		self._is_saved = False
 		self._undo_history.append(operation)
+		self._count_operation(operation, 1)
+		self._update_keyframe(operation, duration)
+
+	############################################################################
+	# Keyframes ################################################################
+
+	def _reset_keyframe_counters(self):
+		self._ops_since_keyframe = 0
+		self._cost_since_keyframe = 0.0
+
+	def _update_keyframe(self, operation, duration):
+		"""Attach the pixels of the image to the operation if the operations
+		since the last keyframe are becoming too long to replay. A keyframe is
+		a dict looking like a state, so it can be restored the same way."""
+		# a redone operation may have a keyframe computed with other operations
+		# before it, so it's not reliable
+		self._remove_keyframe(operation)
+		self._ops_since_keyframe += 1
+		self._cost_since_keyframe += duration
+		if self._ops_since_keyframe < self.KEYFRAME_INTERVAL \
+		and self._cost_since_keyframe < self.KEYFRAME_BUDGET \
+		and self._cost_since_keyframe * self.KEYFRAME_OVERHEAD \
+		                                            < self._tiling_duration:
+			return
+		if self._image.selection.is_active:
+			# the selection wouldn't be restored with the keyframe, so the next
+			# operations couldn't be replayed from it
+			return
+		# the main pixbuf is never modified, only replaced, and it's copied
+		# when a state is restored, so no copy is needed here: the keyframe is
+		# only split into tiles later, when the application is idle
+		pixbuf = self._image.main_pixbuf
+		operation['keyframe'] = {
+			'tool_id': None,
+			'pixbuf': pixbuf,
+			'width': pixbuf.get_width(),
+			'height': pixbuf.get_height(),
+			# time to replay the operations since the previous keyframe
+			'cost': self._cost_since_keyframe
+		}
+		self._count_pixels(pixbuf, 1)
+		self._reset_keyframe_counters()
+		self._set_raw_snapshot(operation['keyframe'])
+
+	def _remove_keyframe(self, operation):
+		keyframe = operation.pop('keyframe', None)
+		if keyframe is None:
+			return
+		# it may be waiting to be tiled, but it's now useless
+		self._count_pixels(keyframe['pixbuf'], -1)
+		keyframe['pixbuf'] = None
+		if keyframe is self._raw_snapshot:
+			self._raw_snapshot = None
+
+	def _thin_out_keyframes(self):
+		"""Remove keyframes from the oldest operations, merging them with the
+		next ones, until the history fits in the memory allowed by the user.
+		The old parts of the history can still be rebuilt, by replaying more
+		operations, but never more than `THINNED_KEYFRAME_BUDGET` allows. The
+		states and the pixbufs of the operations are kept, since they can't
+		always be computed again: a saved file, or a pasted image, can't be
+		replayed."""
+		budget = self.get_memory_budget()
+		indexes = [i for i, op in enumerate(self._undo_history) \
+		                                  if op.get('keyframe') is not None]
+		for position, index in enumerate(indexes[:-1 * self.KEPT_KEYFRAMES]):
+			if self._nb_bytes <= budget:
+				break
+			next_index = indexes[position + 1]
+			next_keyframe = self._undo_history[next_index]['keyframe']
+			cost = self._undo_history[index]['keyframe']['cost'] + \
+			                                                next_keyframe['cost']
+			if cost > self.THINNED_KEYFRAME_BUDGET:
+				continue
+			if any(op['tool_id'] is None \
+			                  for op in self._undo_history[index + 1:next_index]):
+				# the operations before a state aren't replayed from the
+				# keyframe, so their cost isn't known
+				continue
+			next_keyframe['cost'] = cost
+			self._remove_keyframe(self._undo_history[index])
+		is_over_budget = self._nb_bytes > budget
+		if is_over_budget and not self._is_over_budget:
+			self._image.window.log_message("the history uses %s, more than " \
+			       "the %s allowed, but its keyframes can't be thinned out " \
+			       "more" % (GLib.format_size(self._nb_bytes), \
+			                                         GLib.format_size(budget)))
+		self._is_over_budget = is_over_budget
+
+	############################################################################
+	# Tiles of the snapshots ###################################################
+
+	def _set_raw_snapshot(self, snapshot):
+		"""Keep as a pixbuf the pixels of `snapshot` (a state or a keyframe),
+		since it's the most likely to be restored soon. The previous one is
+		split into tiles, stored in the tile store shared by all the images,
+		when the application is idle."""
+		previous_snapshot = self._raw_snapshot
+		self._raw_snapshot = snapshot
+		if previous_snapshot is snapshot:
+			return
+		GLib.idle_add(self._tile_snapshot, previous_snapshot)
+
+	def _tile_snapshot(self, snapshot):
+		"""Replace the pixbuf of `snapshot` by its tiles, unless it has been
+		restored in the meantime, and remove keyframes if the history still
+		uses too much memory. This is used as a GSourceFunc so it should return
+		False."""
+		if snapshot is not None and snapshot is not self._raw_snapshot \
+		and isinstance(snapshot['pixbuf'], GdkPixbuf.Pixbuf):
+			tile_store = self._image.window.app.tile_store
+			self._count_pixels(snapshot['pixbuf'], -1)
+			time0 = time.perf_counter()
+			snapshot['pixbuf'] = TiledPixbuf(snapshot['pixbuf'], tile_store)
+			self._tiling_duration = time.perf_counter() - time0
+			self._count_pixels(snapshot['pixbuf'], 1)
+		self._thin_out_keyframes()
+		return False
+
+	def _get_raw_snapshot(self, snapshot):
+		"""Rebuild the pixbuf of `snapshot` from its tiles if needed, and return
+		the snapshot."""
+		if isinstance(snapshot['pixbuf'], TiledPixbuf):
+			self._count_pixels(snapshot['pixbuf'], -1)
+			snapshot['pixbuf'] = snapshot['pixbuf'].get_pixbuf()
+			self._count_pixels(snapshot['pixbuf'], 1)
+		self._set_raw_snapshot(snapshot)
+		return snapshot
+
+	############################################################################
+	# Memory usage #############################################################
+
+	def get_memory_budget(self):
+		"""Return the maximal amount of memory (in bytes) the history should use
+		according to the user's settings."""
+		gsettings = self._image.window.gsettings
+		return gsettings.get_int('history-max-memory') * 1000 * 1000
+
+	def get_memory_size(self):
+		"""Return the number of bytes used by the pixels stored in the history,
+		both in the undo-history and the redo-history. A tile used by several
+		snapshots is counted once."""
+		return self._nb_bytes
+
+	def _reset_memory_size(self):
+		self._nb_bytes = 0
+		# number of snapshots using each tile
+		self._tile_uses = {}
+		self._is_over_budget = False
+
+	def _count_operation(self, operation, delta):
+		"""Update the memory size for `operation` being added to the history
+		(if `delta` is 1) or removed from it (if it's -1), except its keyframe
+		which is counted separately."""
+		self._nb_bytes += delta * _get_operation_size(operation)
+
+	def _count_pixels(self, pixels, delta):
+		"""Update the memory size for the pixels of a snapshot (a pixbuf or a
+		TiledPixbuf) being added to the history (if `delta` is 1) or removed
+		from it (if it's -1)."""
+		if isinstance(pixels, GdkPixbuf.Pixbuf):
+			self._nb_bytes += delta * pixels.get_byte_length()
+		elif isinstance(pixels, TiledPixbuf):
+			for tile in pixels.get_tiles():
+				nb_uses = self._tile_uses.get(tile, 0) + delta
+				if nb_uses == 0:
+					del self._tile_uses[tile]
+					self._nb_bytes -= len(tile.data)
+					continue
+				if nb_uses == 1 and delta == 1:
+					self._nb_bytes += len(tile.data)
+				self._tile_uses[tile] = nb_uses
 
 	############################################################################
 	# Cached pixbufs ###########################################################
@@ -112,54 +326,60 @@ class DrHistoryManager():
 		g = float(rgba_array[1])
 		b = float(rgba_array[2])
 		a = float(rgba_array[3])
+		if self.initial_operation is not None:
+			self._count_pixels(self.initial_operation['pixbuf'], -1)
 		self.initial_operation = {
 			'tool_id': None,
 			'pixbuf': pixbuf,
 			'rgba': Gdk.RGBA(red=r, green=g, blue=b, alpha=a),
 			'width': width, 'height': height
 		}
+		self._count_pixels(pixbuf, 1)
+		self._reset_keyframe_counters()
+		self._set_raw_snapshot(self.initial_operation)
 
 	def add_state(self, pixbuf):
 		if pixbuf is None:
 			# Context: an error message
 			raise Exception(_("Attempt to save an invalid state"))
-		self._undo_history.append({
+		state = {
 			'tool_id': None,
 			'pixbuf': pixbuf,
 			'width': pixbuf.get_width(),
 			'height': pixbuf.get_height()
-		})
+		}
+		self._undo_history.append(state)
+		self._count_pixels(pixbuf, 1)
 		self._is_saved = True
+		self._reset_keyframe_counters()
+		self._set_raw_snapshot(state)
 
 	def has_initial_pixbuf(self):
 		return self.initial_operation['pixbuf'] is not None
 
+	def get_initial_state(self):
+		return self._get_raw_snapshot(self.initial_operation)
+
 	def get_last_saved_state(self):
-		index = self._get_last_state_index(False)
+		"""Return the most recent state from which the image can be rebuilt:
+		the keyframe of an operation, a state, or the initial operation. Its
+		pixels are rebuilt from the tiles if needed."""
+		index = self._get_last_keyframe_index()
 		if index == -1:
-			return self.initial_operation
-		else:
-			return self._undo_history[index]
-
-	def _get_last_state_index(self, allow_yeeting_states):
-		"""Return the index of the last "state" operation (dict whose 'tool_id'
-		value is None) in the undo-history. If there is no such operation, the
-		returned index is -1 which means the only known state is the
-		self.initial_operation attribute."""
-
-		returned_index = -1
-		nbPixbufs = 0
-		for op in self._undo_history:
-			if op['tool_id'] is None:
-				last_saved_pixbuf_op = op
-				returned_index = self._undo_history.index(op)
-				nbPixbufs += 1
-
-		# TODO if there are too many pixbufs in the history, remove a few ones
-		# Issue #200, needs more design because saving can change the data
-
-		# print("returned_index : " + str(returned_index))
-		return returned_index
+			return self.get_initial_state()
+		op = self._undo_history[index]
+		if op['tool_id'] is None:
+			return self._get_raw_snapshot(op)
+		return self._get_raw_snapshot(op['keyframe'])
+
+	def _get_last_keyframe_index(self):
+		"""Return the index of the last operation of the undo-history which is
+		a state or has a keyframe, or -1 if there is no such operation."""
+		for index in range(len(self._undo_history) - 1, -1, -1):
+			op = self._undo_history[index]
+			if op['tool_id'] is None or op.get('keyframe') is not None:
+				return index
+		return -1
 
 	############################################################################
 	# Other private methods ####################################################
@@ -182,17 +402,16 @@ class DrHistoryManager():
 			return False
 		self._waiting_for_rebuild = False
 
-		last_save_index = self._get_last_state_index(True)
+		last_keyframe_index = self._get_last_keyframe_index()
 		self._image.restore_last_state()
-		history = self._undo_history.copy()
-		self._undo_history = []
+		self._reset_keyframe_counters()
+		history = self._undo_history[last_keyframe_index + 1:]
+		self._undo_history = self._undo_history[:last_keyframe_index + 1]
 		for op in history:
-			if history.index(op) > last_save_index:
-				# print("do", op['tool_id'])
-				self._get_tool(op['tool_id']).simple_apply_operation(op)
-			else:
-				# print("skip", op['tool_id'])
-				self._undo_history.append(op)
+			# it will be counted again when added back to the history
+			self._count_operation(op, -1)
+			# print("do", op['tool_id'])
+			self._get_tool(op['tool_id']).simple_apply_operation(op)
 		self._image.update()
 		return False
 
@@ -210,4 +429,18 @@ class DrHistoryManager():
 	############################################################################
 ################################################################################
 
+def _get_operation_size(operation):
+	"""Return the number of bytes used by the pixbufs and the surfaces of an
+	operation, without its keyframe."""
+	size = 0
+	for key, value in operation.items():
+		if isinstance(value, GdkPixbuf.Pixbuf):
+			size += value.get_byte_length()
+		elif isinstance(value, cairo.ImageSurface):
+			size += value.get_stride() * value.get_height()
+		elif isinstance(value, dict) and key != 'keyframe':
+			size += _get_operation_size(value)
+	return size
+
+################################################################################
 
@@ -17,7 +17,9 @@
 
 import cairo, random, math
 from gi.repository import Gtk, Gdk, Gio, GdkPixbuf, Pango, GLib
+from .histogram_manager import DrHistogramManager
 from .history_manager import DrHistoryManager
+from .pixel_sampler import DrPixelSampler
 from .selection_manager import DrSelectionManager
 from .properties import DrPropertiesDialog
 from .utilities_files import InvalidFileFormatException
@@ -63,6 +65,14 @@ class DrImage(Gtk.Box):
 
 		self.gfile = None
 		self.filename = None
+		self.main_pixbuf = None
+		# incremented each time `main_pixbuf` is replaced, so tools caching
+		# things computed from the pixbuf can know when they're outdated
+		self.main_pixbuf_generation = 0
+		# rectangle changed by the ongoing operation, if the tool knows it
+		self._damaged_rectangle = None
+		# reads the pixels of `surface`, created when it's needed
+		self._pixel_sampler = None
 		self._waiting_for_monitor = False
 		self._gfile_monitor = None
 		self._can_reload()
@@ -156,6 +166,7 @@ class DrImage(Gtk.Box):
 
 		# History initialization
 		self._history = DrHistoryManager(self)
+		self.histogram = DrHistogramManager(self)
 		self.set_action_sensitivity('undo', False)
 		self.set_action_sensitivity('redo', False)
 
@@ -174,13 +185,13 @@ class DrImage(Gtk.Box):
 		return GdkPixbuf.Pixbuf.new(GdkPixbuf.Colorspace.RGB, True, 8, w, h)
 
 	def restore_last_state(self):
-		"""Set the last saved pixbuf from the history as the main_pixbuf. This
-		is used to rebuild the picture from its history."""
+		"""Set the last saved pixbuf (or keyframe) from the history as the
+		main_pixbuf. This is used to rebuild the picture from its history."""
 		last_saved_pixbuf_op = self._history.get_last_saved_state()
 		self._apply_state(last_saved_pixbuf_op)
 
 	def reset_to_initial_pixbuf(self):
-		self._apply_state(self._history.initial_operation)
+		self._apply_state(self._history.get_initial_state())
 		self._history.rewind_history()
 
 	def _apply_state(self, state_op):
@@ -190,7 +201,9 @@ class DrImage(Gtk.Box):
 		height = state_op['height']
 		self.set_temp_pixbuf(self._new_blank_pixbuf(1, 1))
 		self.selection.init_pixbuf()
+		self.reset_damaged_rectangle()
 		self.surface = cairo.ImageSurface(cairo.Format.ARGB32, width, height)
+		self._pixel_sampler = None
 		if pixbuf is None:
 			# no pixbuf in the operation: the restored state is a blank one
 			rgba = state_op['rgba']
@@ -328,6 +341,7 @@ class DrImage(Gtk.Box):
 			self.destroy()
 			self.selection.reset(False)
 			self.main_pixbuf = None
+			self.main_pixbuf_generation += 1
 			self.temp_pixbuf = None
 			self._history.empty_history()
 			return True
@@ -370,8 +384,8 @@ class DrImage(Gtk.Box):
 		self.set_action_sensitivity('redo', self._history.can_redo())
 		# self.update_history_actions_labels()
 
-	def add_to_history(self, operation):
-		self._history.add_operation(operation)
+	def add_to_history(self, operation, duration=0.0):
+		self._history.add_operation(operation, duration)
 
 	def should_replace(self):
 		if self._history.can_undo():
@@ -381,6 +395,12 @@ class DrImage(Gtk.Box):
 	def get_initial_rgba(self):
 		return self._history.initial_operation['rgba']
 
+	def get_history_memory(self):
+		"""Return the number of bytes used by the history, and the number of
+		bytes it's allowed to use."""
+		return self._history.get_memory_size(), \
+		                                     self._history.get_memory_budget()
+
 	############################################################################
 	# Misc ? ###################################################################
 
@@ -545,6 +565,14 @@ class DrImage(Gtk.Box):
 	def get_surface(self):
 		return self.surface
 
+	def get_pixel_sampler(self):
+		"""Return the object reading the colors of the pixels of the surface.
+		It stays valid until the surface is replaced."""
+		if self._pixel_sampler is None \
+		or not self._pixel_sampler.is_for_surface(self.surface):
+			self._pixel_sampler = DrPixelSampler(self.surface)
+		return self._pixel_sampler
+
 	def on_enter_image(self, *args):
 		self.window.set_cursor(True)
 
@@ -558,7 +586,9 @@ class DrImage(Gtk.Box):
 	def set_surface_as_stable_pixbuf(self):
 		w = self.surface.get_width()
 		h = self.surface.get_height()
+		old_pixbuf = self.main_pixbuf
 		self.main_pixbuf = Gdk.pixbuf_get_from_surface(self.surface, 0, 0, w, h)
+		self._on_main_pixbuf_replaced(old_pixbuf)
 		self._framerate_hint = math.sqrt(w * h) - 1000
 		self._framerate_hint = int(self._framerate_hint * 0.2)
 		# between 500 and 33ms (= between 2 and 30 fps)
@@ -570,6 +600,7 @@ class DrImage(Gtk.Box):
 		each operation (even unapplied)."""
 		# maybe the "scale" parameter should be 1 instead of 0
 		self.surface = Gdk.cairo_surface_create_from_pixbuf(self.main_pixbuf, 0, None)
+		self._pixel_sampler = None
 		# print('image.py: use_stable_pixbuf')
 		self.surface.set_device_scale(self.SCALE_FACTOR, self.SCALE_FACTOR)
 
@@ -585,7 +616,36 @@ class DrImage(Gtk.Box):
 		if new_pixbuf is None:
 			raise NoPixbufNoChangeException('main_pixbuf')
 		else:
+			old_pixbuf = self.main_pixbuf
 			self.main_pixbuf = new_pixbuf
+			self._on_main_pixbuf_replaced(old_pixbuf)
+
+	def _on_main_pixbuf_replaced(self, old_pixbuf):
+		self.main_pixbuf_generation += 1
+		self.histogram.on_main_pixbuf_replaced(old_pixbuf, \
+		                                               self._damaged_rectangle)
+		if self._damaged_rectangle is not None:
+			# the changes are now part of the main pixbuf: if it's replaced
+			# again by the same operation, nothing else has changed
+			self._damaged_rectangle = (0, 0, 0, 0)
+
+	def set_damaged_rectangle(self, x, y, width, height):
+		"""Tell which rectangle of the main pixbuf the ongoing operation
+		changes, so the data computed from the whole pixbuf (the histograms)
+		can be updated instead of being computed again. Operations not calling
+		this method are considered as having changed the whole pixbuf."""
+		rectangle = self._damaged_rectangle
+		if rectangle is not None and rectangle[2] > 0 and rectangle[3] > 0:
+			x1 = max(x + width, rectangle[0] + rectangle[2])
+			y1 = max(y + height, rectangle[1] + rectangle[3])
+			x = min(x, rectangle[0])
+			y = min(y, rectangle[1])
+			width = x1 - x
+			height = y1 - y
+		self._damaged_rectangle = (x, y, width, height)
+
+	def reset_damaged_rectangle(self):
+		self._damaged_rectangle = None
 
 	############################################################################
 	# Temporary pixbuf management ##############################################
@@ -22,6 +22,7 @@ from gi.repository import Gtk, Gio, GLib, Gdk
 from .window import DrWindow
 from .preferences import DrPrefsWindow
 from .utilities_files import utilities_gfile_is_image
+from .utilities_snapshots import TileStore
 
 def main(version):
 	app = Application(version)
@@ -51,6 +52,8 @@ class Application(Gtk.Application):
 		self._version = version
 		self.has_tools_in_menubar = False
 		self.runs_in_sandbox = False
+		# the snapshots of the history of all the images share their tiles
+		self.tile_store = TileStore()
 
 		self.connect('startup', self.on_startup)
 		self.register(None)
@@ -44,6 +44,7 @@ class OptionsBarFilters(AbstractOptionsBar):
 		adj.configure(*adj_as_array)
 		widget_spinbtn.set_adjustment(adj)
 		utilities_add_unit_to_spinbtn(widget_spinbtn, spin_chars, unit)
+		widget_spinbtn.connect('value-changed', self.filters_tool.on_filter_preview)
 
 		self.centered_box.add(widget_label)
 		self.centered_box.add(widget_spinbtn)
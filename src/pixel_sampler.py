@@ -0,0 +1,76 @@
+# Licensed under GPL3 https://github.com/maoschanz/drawing/blob/master/LICENSE
+
+from .utilities_pixels import numpy, utilities_has_numpy, \
+                              utilities_surface_as_array, RGBA_INDICES
+
+class DrPixelSampler():
+	"""Reads the colors of pixels directly in the memory of a surface (a
+	cairo.Format.ARGB32 image surface), without copying anything. The colors
+	are given like in a pixbuf: as tuples of 4 integers between 0 and 255 (red,
+	green, blue, alpha), not premultiplied.
+	A sampler is only valid for the surface it has been created for: the image
+	gives a new one each time its surface is replaced."""
+	__gtype_name__ = 'DrPixelSampler'
+
+	def __init__(self, surface):
+		self._surface = surface
+		self._width = surface.get_width()
+		self._height = surface.get_height()
+		if utilities_has_numpy():
+			self._pixels = utilities_surface_as_array(surface)
+		else:
+			self._pixels = surface.get_data()
+		self._stride = surface.get_stride()
+
+	def is_for_surface(self, surface):
+		return surface is self._surface
+
+	def get_rgba(self, x, y):
+		"""Return the color of the pixel at (x, y), or None if these coordinates
+		are outside of the surface."""
+		x = int(x)
+		y = int(y)
+		if x < 0 or y < 0 or x >= self._width or y >= self._height:
+			return None
+		# the tools may have drawn on the surface since the last sample
+		self._surface.flush()
+		if utilities_has_numpy():
+			values = self._pixels[y, x].tolist()
+		else:
+			index = y * self._stride + x * 4
+			values = self._pixels[index:index + 4].tolist()
+		return _unpremultiply([values[i] for i in RGBA_INDICES])
+
+	def get_rgbas(self, points):
+		"""Return the colors of the pixels at the coordinates of `points` (a
+		list of (x, y) tuples) in one go. The color of a point outside of the
+		surface is None."""
+		if not utilities_has_numpy():
+			return [self.get_rgba(x, y) for x, y in points]
+		if len(points) == 0:
+			return []
+		self._surface.flush()
+		coords = numpy.array(points, dtype=numpy.float64).reshape(-1, 2)
+		coords = coords.astype(numpy.int64)
+		xs, ys = coords[:, 0], coords[:, 1]
+		inside = (xs >= 0) & (ys >= 0) & (xs < self._width) & (ys < self._height)
+		values = self._pixels[ys[inside], xs[inside]][:, RGBA_INDICES]
+		values = values.astype(numpy.uint32)
+		alpha = values[:, 3:]
+		# rounded like GdkPixbuf does when it unpremultiplies the colors
+		colors = (values[:, :3] * 255 + alpha // 2) // numpy.maximum(alpha, 1)
+		values[:, :3] = numpy.where(alpha == 0, 0, colors)
+		rgbas = iter(map(tuple, values.tolist()))
+		return [next(rgbas) if is_inside else None for is_inside in inside]
+
+	############################################################################
+################################################################################
+
+def _unpremultiply(values):
+	alpha = values[3]
+	if alpha == 0:
+		return (0, 0, 0, 0)
+	return tuple([(c * 255 + alpha // 2) // alpha for c in values[:3]] + [alpha])
+
+################################################################################
+
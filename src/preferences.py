@@ -32,6 +32,7 @@ class DrPrefsWindow(Gtk.Window):
 	adj_width = Gtk.Template.Child()
 	adj_height = Gtk.Template.Child()
 	adj_preview = Gtk.Template.Child()
+	adj_history = Gtk.Template.Child()
 
 	_current_grid = None
 	_grid_attach_cpt = 0
@@ -167,6 +168,10 @@ class DrPrefsWindow(Gtk.Window):
 		# Context: title of a section of the preferences
 		self.add_section_title(_("Advanced options"))
 		self.add_adj(_("Preview size"), 'preview-size', self.adj_preview)
+		# Context: the maximal amount of memory (in megabytes) used to remember
+		# the previous versions of an image, in order to undo operations
+		self.add_adj(_("History memory limit (MB)"), 'history-max-memory', \
+		                                                self.adj_history, None)
 		if is_beta:
 			# This label will not be displayed in the UI of stable versions
 			self.add_switch(_("Development features"), 'devel-only')
@@ -255,10 +260,10 @@ class DrPrefsWindow(Gtk.Window):
 		color_btn.connect('color-set', self.on_colorbtn_changed, key)
 		self.add_row(label_text, color_btn)
 
-	def add_adj(self, label_text, key, adj):
+	def add_adj(self, label_text, key, adj, unit='px'):
 		spinbtn = Gtk.SpinButton(adjustment=adj)
 		spinbtn.set_value(self._gsettings.get_int(key))
-		utilities_add_unit_to_spinbtn(spinbtn, 4, 'px')
+		utilities_add_unit_to_spinbtn(spinbtn, 4, unit)
 		spinbtn.connect('value-changed', self.on_adj_changed, key)
 		self.add_row(label_text, spinbtn)
 
@@ -15,7 +15,9 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from gi.repository import Gtk, GdkPixbuf, Pango
+from gi.repository import Gtk, GdkPixbuf, GLib, Pango
+from .utilities_histogram import utilities_histogram_get_bounds, \
+                                 utilities_histogram_get_mean
 
 class DrPropertiesDialog(Gtk.Dialog):
 	__gtype_name__ = 'DrPropertiesDialog'
@@ -83,6 +85,25 @@ class DrPropertiesDialog(Gtk.Dialog):
 		# TODO display both the colorspace of the file and of the surface, with
 		# a warning if there might be a loss of data
 
+		# Statistics about the pixels ##########################################
+
+		separator = Gtk.Separator(visible=True)
+		self._grid.attach(separator, 0, 7, 3, 1)
+		self._add_histogram_rows(8)
+
+		# Memory used by the history ###########################################
+
+		separator = Gtk.Separator(visible=True)
+		self._grid.attach(separator, 0, 11, 3, 1)
+		history_size, history_budget = self._image.get_history_memory()
+		# Context: the memory used by the history of the image, and the limit
+		# set in the preferences. For example "345.6 MB (limit: 1.1 GB)"
+		history_label = _("%s (limit: %s)") % (GLib.format_size(history_size), \
+		                                      GLib.format_size(history_budget))
+		# Context: the memory used to remember the previous versions of the
+		# image, in order to undo operations
+		self._add_grid_row(12, _("History size"), history_label)
+
 	def _add_grid_row(self, index, key, value):
 		"""Adds a row 2 labels (a key and a value) to the dialog's main grid."""
 		key_label = Gtk.Label(label=key, halign=Gtk.Align.END, visible=True)
@@ -92,6 +113,26 @@ class DrPropertiesDialog(Gtk.Dialog):
 		value_label.get_style_context().add_class('dim-label')
 		self._grid.attach(value_label, 1, index, 2, 1)
 
+	def _add_histogram_rows(self, index):
+		histograms = self._image.histogram.get_histograms()
+		means = [utilities_histogram_get_mean(h) for h in histograms[:3]]
+		if None in means:
+			return # the image has no pixel
+		average_color = '#' + ''.join(['%02x' % round(m) for m in means])
+		lowest, highest = utilities_histogram_get_bounds(histograms)
+		nb_pixels = sum(histograms[3])
+		transparent_ratio = 100 * (nb_pixels - histograms[3][255]) / nb_pixels
+
+		# Context: the average color of the pixels of the image
+		self._add_grid_row(index, _("Average color"), average_color)
+		# Context: the lowest and the highest values of the color channels of
+		# the pixels of the image
+		self._add_grid_row(index + 1, _("Tonal range"), \
+		                                       "%s – %s" % (lowest, highest))
+		# Context: the ratio of pixels which aren't fully opaque
+		self._add_grid_row(index + 2, _("Transparent pixels"), \
+		                                _("%s %%") % round(transparent_ratio, 1))
+
 	def _set_colorspace_label(self):
 		# Useless, it will always return "ARGB32"
 		enum = {
@@ -17,6 +17,8 @@
 
 import cairo
 from gi.repository import Gtk, Gdk, GdkPixbuf
+from .utilities_masks import utilities_mask_contains, \
+                             utilities_mask_get_extents
 
 class NoSelectionPixbufException(Exception):
 	def __init__(self, *args):
@@ -34,6 +36,8 @@ class DrSelectionManager():
 
 	def __init__(self, image):
 		self.image = image
+		# incremented each time `selection_pixbuf` is replaced
+		self.pixbuf_generation = 0
 		self.init_pixbuf()
 		self.reset_future_data()
 
@@ -49,17 +53,22 @@ class DrSelectionManager():
 		# print('⇒ init pixbuf')
 		self.selection_pixbuf = GdkPixbuf.Pixbuf.new(GdkPixbuf.Colorspace.RGB, \
 		                                                          True, 8, 1, 1)
+		self.pixbuf_generation += 1
 		self.set_coords(True, 0, 0)
 		self.selection_path = None
+		self.selection_mask = None
 		self.is_active = False
 
-	def load_from_path(self, new_path, rgba=None):
+	def load_from_path(self, new_path, rgba=None, mask=None):
 		"""Create a selection_pixbuf from a minimal part of the main surface by
-		erasing everything outside of the provided path."""
+		erasing everything outside of the provided path. If the path has been
+		computed from a mask (see utilities_masks), the mask is used instead of
+		the path to erase the pixels, and it's kept for the hit tests."""
 		if new_path is None:
 			raise NoSelectionPathException()
 
 		self.selection_path = new_path
+		self.selection_mask = mask
 		self.is_active = True
 		main_pixbuf = self.image.main_pixbuf
 
@@ -68,15 +77,25 @@ class DrSelectionManager():
 		surface.set_device_scale(self.image.SCALE_FACTOR, self.image.SCALE_FACTOR)
 		cairo_context = cairo.Context(surface)
 		cairo_context.set_operator(cairo.Operator.DEST_IN)
+		cairo_context.set_fill_rule(cairo.FillRule.EVEN_ODD)
 		cairo_context.new_path()
 		cairo_context.append_path(self.selection_path)
-		cairo_context.fill_preserve()
+		if mask is None:
+			cairo_context.fill_preserve()
+		else:
+			cairo_context.mask_surface(mask, 0, 0)
 		cairo_context.set_operator(cairo.Operator.OVER)
 
 		# Find the coords to reduce the size of what will be stored
 		main_width = main_pixbuf.get_width()
 		main_height = main_pixbuf.get_height()
 		xmin, ymin, xmax, ymax = cairo_context.path_extents()
+		if mask is not None:
+			# the path may be simplified, so it's not as accurate as the mask
+			extents = utilities_mask_get_extents(mask)
+			if extents is not None:
+				xmin, ymin = extents[0], extents[1]
+				xmax, ymax = xmin + extents[2], ymin + extents[3]
 		xmax = min(xmax, main_width)
 		ymax = min(ymax, main_height)
 		xmin = int( max(xmin, 0.0) ) # If everything is right, this is selection_x
@@ -99,6 +118,7 @@ class DrSelectionManager():
 					                                int(rgba[1] * 255), \
 					                                int(rgba[2] * 255))
 				self.selection_pixbuf = pixbuf
+				self.pixbuf_generation += 1
 			# can't use `set_pixbuf` here ^ because it would replace the free
 			# path with a rectangle path
 		else:
@@ -115,6 +135,7 @@ class DrSelectionManager():
 	def set_pixbuf(self, pixbuf):
 		# print('⇒ set pixbuf')
 		self.selection_pixbuf = pixbuf
+		self.pixbuf_generation += 1
 		self._create_path_from_pixbuf()
 
 	def get_pixbuf(self):
@@ -123,7 +144,9 @@ class DrSelectionManager():
 	def reset(self, update_image):
 		# print('⇒ reset pixbuf')
 		self.selection_pixbuf = None
+		self.pixbuf_generation += 1
 		self.selection_path = None
+		self.selection_mask = None
 		self.set_coords(True, 0, 0)
 		self.is_active = False
 		if update_image:
@@ -166,8 +189,14 @@ class DrSelectionManager():
 		exist, it returns None."""
 		if not self.is_active:
 			return True # shouldn't happen
+		if self.selection_mask is not None:
+			# the mask doesn't move with the selection, unlike the coords
+			mask_x = tested_x - self.selection_x + self.temp_x
+			mask_y = tested_y - self.selection_y + self.temp_y
+			return utilities_mask_contains(self.selection_mask, mask_x, mask_y)
 		scrolled_path = self.get_path_with_scroll(self.image.scroll_x, self.image.scroll_y)
 		cairo_context = self._get_context()
+		cairo_context.set_fill_rule(cairo.FillRule.EVEN_ODD)
 		cairo_context.new_path()
 		cairo_context.append_path(scrolled_path)
 		return cairo_context.in_fill(tested_x, tested_y)
@@ -191,6 +220,7 @@ class DrSelectionManager():
 		cairo_context.rel_line_to(-1 * self.selection_pixbuf.get_width(), 0)
 		cairo_context.close_path()
 		self.selection_path = cairo_context.copy_path()
+		self.selection_mask = None
 		self.hide_popovers()
 		self.image.update_actions_state()
 
@@ -199,11 +229,17 @@ class DrSelectionManager():
 
 	def _get_context_with_path(self, delta_x, delta_y):
 		cairo_context = self._get_context()
+		# the path can be made of several sub-paths (e.g. a color selection)
 		for pts in self.selection_path:
-			if pts[1] != ():
-				x = pts[1][0] + delta_x
-				y = pts[1][1] + delta_y
-				cairo_context.line_to(int(x), int(y))
+			if pts[0] == cairo.PathDataType.CLOSE_PATH:
+				cairo_context.close_path()
+				continue
+			x = int(pts[1][0] + delta_x)
+			y = int(pts[1][1] + delta_y)
+			if pts[0] == cairo.PathDataType.MOVE_TO:
+				cairo_context.move_to(x, y)
+			else:
+				cairo_context.line_to(x, y)
 		return cairo_context
 
 	############################################################################
@@ -238,6 +274,7 @@ class DrSelectionManager():
 		self._future_x = 0
 		self._future_y = 0
 		self._future_path = None
+		self._future_mask = None
 
 	def set_future_coords(self, x, y):
 		self._future_x = int(x)
@@ -246,8 +283,9 @@ class DrSelectionManager():
 	def get_future_coords(self):
 		return self._future_x, self._future_y
 
-	def set_future_path(self, path, resync_coords):
+	def set_future_path(self, path, resync_coords, mask=None):
 		self._future_path = path
+		self._future_mask = mask
 
 		if not resync_coords:
 			return
@@ -265,6 +303,9 @@ class DrSelectionManager():
 	def get_future_path(self):
 		return self._future_path
 
+	def get_future_mask(self):
+		return self._future_mask
+
 	def update_from_transform_tool(self, new_pixbuf, dx, dy):
 		self.set_pixbuf(new_pixbuf)
 		x = self.selection_x + dx
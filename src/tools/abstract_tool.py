@@ -15,7 +15,7 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import cairo
+import cairo, time
 from gi.repository import Gtk, Gdk
 
 class WrongToolIdException(Exception):
@@ -273,6 +273,7 @@ class AbstractAbstractTool():
 		if operation['tool_id'] != self.id:
 			raise WrongToolIdException(operation['tool_id'], self.id)
 		self.restore_pixbuf()
+		self.get_image().reset_damaged_rectangle()
 		self._ongoing_operation = True
 
 	def apply_operation(self, operation):
@@ -285,8 +286,10 @@ class AbstractAbstractTool():
 	def simple_apply_operation(self, operation):
 		"""Simpler apply_operation, for the 'rebuild from history' method."""
 		try:
+			time0 = time.perf_counter()
 			self.do_tool_operation(operation)
-			self.get_image().add_to_history(operation)
+			duration = time.perf_counter() - time0
+			self.get_image().add_to_history(operation, duration)
 		except Exception as e:
 			self.show_error(str(e))
 		self._ongoing_operation = False
@@ -322,6 +325,9 @@ class AbstractAbstractTool():
 	def get_context(self):
 		return cairo.Context(self.get_surface())
 
+	def get_pixel_sampler(self):
+		return self.get_image().get_pixel_sampler()
+
 	def get_main_pixbuf(self):
 		return self.get_image().main_pixbuf
 
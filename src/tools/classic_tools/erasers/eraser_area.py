@@ -44,38 +44,35 @@ class EraserArea(AbstractEraser):
 	def do_operation(self, cairo_context, operation):
 		cairo_context.set_operator(cairo.Operator.SOURCE)
 		censor_type = operation['censor-type']
+		cairo_context.append_path(operation['path'])
+		[x1, y1, x2, y2] = cairo_context.path_extents()
+		self._tool.get_image().set_damaged_rectangle(x1, y1, x2 - x1, y2 - y1)
 
 		if censor_type == 'solid':
 			cairo_context.set_source_rgba(*operation['replacement'])
-			cairo_context.append_path(operation['path'])
 			cairo_context.fill()
 			return
-		else:
-			cairo_context.append_path(operation['path'])
 
-		[r0, r1, r2, r3] = cairo_context.path_extents()
-		[r0, r1, r2, r3] = [int(r0), int(r1), int(r2), int(r3)]
+		[r0, r1, r2, r3] = [int(x1), int(y1), int(x2), int(y2)]
 		width = r2 - r0
 		height = r3 - r1
-		surface = cairo.ImageSurface(cairo.Format.ARGB32, width, height)
-		ccontext2 = cairo.Context(surface)
-		ccontext2.set_source_surface(self._tool.get_surface(), -1 * r0, -1 * r1)
-		ccontext2.paint()
-		scale = self._tool.scale_factor()
-		surface.set_device_scale(scale, scale)
+		roi = (r0, r1, width, height)
 
 		b_rad = min(15, int(min(width, height) / 4))
 		b_dir = BlurDirection.BOTH
 		shuffle_intensity = int((width * height) / 2)
 		if censor_type == 'mosaic':
-			bs = utilities_blur_surface(surface, b_rad, BlurType.TILES, b_dir)
+			bs = utilities_blur_surface(self._tool.get_surface(), b_rad, \
+			                                        BlurType.TILES, b_dir, roi)
 		elif censor_type == 'blur':
-			bs = utilities_blur_surface(surface, b_rad, BlurType.PX_BOX, b_dir)
+			bs = utilities_blur_surface(self._tool.get_surface(), b_rad, \
+			                                     BlurType.GAUSSIAN, b_dir, roi)
 		elif censor_type == 'shuffle':
-			bs = self._shuffle_pixels(surface, shuffle_intensity)
+			bs = self._shuffle_pixels(self._get_area_copy(roi), shuffle_intensity)
 		elif censor_type == 'mixed':
-			bs = self._shuffle_pixels(surface, shuffle_intensity / 2)
-			bs = utilities_blur_surface(bs, b_rad, BlurType.CAIRO_REPAINTS, b_dir)
+			bs = self._get_area_copy(roi)
+			bs = self._shuffle_pixels(bs, shuffle_intensity / 2)
+			bs = utilities_blur_surface(bs, b_rad, BlurType.AUTO, b_dir)
 
 		cairo_context.clip()
 		# XXX this ^ doesn't work with the 'rubber' shape, which forces me to
@@ -83,6 +80,16 @@ class EraserArea(AbstractEraser):
 		cairo_context.set_source_surface(bs, r0, r1)
 		cairo_context.paint()
 
+	def _get_area_copy(self, roi):
+		r0, r1, width, height = roi
+		surface = cairo.ImageSurface(cairo.Format.ARGB32, width, height)
+		ccontext2 = cairo.Context(surface)
+		ccontext2.set_source_surface(self._tool.get_surface(), -1 * r0, -1 * r1)
+		ccontext2.paint()
+		scale = self._tool.scale_factor()
+		surface.set_device_scale(scale, scale)
+		return surface
+
 	def _shuffle_pixels(self, surface, iterations):
 		w = surface.get_width()
 		h = surface.get_height()
@@ -1,8 +1,10 @@
 # Licensed under GPL3 https://github.com/maoschanz/drawing/blob/master/LICENSE
 
 import cairo
+from gi.repository import Gdk
 from .abstract_eraser import AbstractEraser
-from .utilities_paths import utilities_get_rgba_for_xy
+from .utilities_pixels import utilities_has_numpy, \
+                              utilities_surface_erase_colors
 
 class EraserColor(AbstractEraser):
 	__gtype_name__ = 'EraserColor'
@@ -10,59 +12,64 @@ class EraserColor(AbstractEraser):
 	def __init__(self, tool):
 		super().__init__()
 		self._tool = tool
+		self._previous_point = None
 
 	def get_label_options(self, options={}):
 		return _("Remove color")
 
-	# XXX on_motion pourrait foreach entre le point courant et le précédent ?
-
 	def on_release(self, cairo_context, press, event, path=None):
 		# in this eraser, "path" is actually a list of rgba
 		if path is None:
 			path = []
-		new_rgba = utilities_get_rgba_for_xy(self._tool.get_surface(), *event)
-		if new_rgba[3] == 0:
-			# no need to erase what's already erased
-			return path
-		path.append(new_rgba)
+			self._previous_point = press
+		# the colors of all the pixels between the previous event and this one
+		# are erased, not only the colors under the events
+		points = _get_segment_points(self._previous_point, event)
+		self._previous_point = event
+		for rgba in self._tool.get_pixel_sampler().get_rgbas(points):
+			if rgba is None or rgba[3] == 0:
+				# no need to erase what's already erased
+				continue
+			if rgba not in path:
+				path.append(rgba)
 		return path
 
 	############################################################################
 
 	def do_operation(self, cairo_context, operation):
-		"""Replace the color with transparency by adding an alpha channel."""
-		all_rgbas = operation['path']
-		for rgba in all_rgbas:
-			self._erase_rgb(rgba[0:3])
-			# ^ it's not possible to take into account the alpha channel :(
-
-	def _erase_rgb(self, rgb0, margin=0):
-		self._clip_red(*rgb0, margin)
-		self._tool.restore_pixbuf()
+		"""Replace the colors with transparency, in a single pass over the
+		pixels if possible."""
+		# it's not possible to take into account the alpha channel :(
+		all_rgbs = set([tuple(rgba[0:3]) for rgba in operation['path']])
+		if len(all_rgbs) == 0:
+			return
+		surface = self._tool.get_surface()
+		if utilities_has_numpy():
+			utilities_surface_erase_colors(surface, all_rgbs)
+		else:
+			self._erase_with_pixbuf(cairo_context, surface, all_rgbs)
 		self._tool.non_destructive_show_modif()
 
-	def _clip_red(self, r0, g0, b0, margin=0):
-		for i in range(-1 * margin, margin + 1):
-			r = r0 + i
-			if r <= 255 and r >= 0:
-				self._clip_green(r, g0, b0, margin)
-
-	def _clip_green(self, r, g0, b0, margin=0):
-		for i in range(-1 * margin, margin + 1):
-			g = g0 + i
-			if g <= 255 and g >= 0:
-				self._clip_blue(r, g, b0, margin)
+	def _erase_with_pixbuf(self, cairo_context, surface, all_rgbs):
+		pixbuf = Gdk.pixbuf_get_from_surface(surface, 0, 0, \
+		                                surface.get_width(), surface.get_height())
+		for red, green, blue in all_rgbs:
+			pixbuf = pixbuf.add_alpha(True, red, green, blue)
+		cairo_context.set_operator(cairo.Operator.SOURCE)
+		Gdk.cairo_set_source_pixbuf(cairo_context, pixbuf, 0, 0)
+		cairo_context.paint()
 
-	def _clip_blue(self, r, g, b0, margin=0):
-		for i in range(-1 * margin, margin + 1):
-			b = b0 + i
-			if b <= 255 and b >= 0:
-				self._replace_main_with_alpha(r, g, b)
+	############################################################################
+################################################################################
 
-	def _replace_main_with_alpha(self, red, green, blue):
-		new_pixbuf = self._tool.get_main_pixbuf().add_alpha(True, red, green, blue)
-		self._tool.get_image().set_main_pixbuf(new_pixbuf)
+def _get_segment_points(start, end):
+	"""Return the coordinates of the pixels on the segment between the points
+	`start` and `end`, both included."""
+	dx = end[0] - start[0]
+	dy = end[1] - start[1]
+	nb_steps = max(1, int(max(abs(dx), abs(dy))))
+	return [(start[0] + dx * i / nb_steps, start[1] + dy * i / nb_steps) \
+	                                               for i in range(nb_steps + 1)]
 
-	############################################################################
 ################################################################################
 
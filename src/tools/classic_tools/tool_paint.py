@@ -16,10 +16,10 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import cairo
-from gi.repository import Gdk
 from .abstract_classic_tool import AbstractClassicTool
-from .utilities_paths import utilities_get_magic_path
-from .utilities_paths import utilities_get_rgba_for_xy
+from .utilities_masks import utilities_mask_flood_fill, \
+                             utilities_mask_get_tolerance, \
+                             utilities_mask_of_color
 
 class ToolPaint(AbstractClassicTool):
 	__gtype_name__ = 'ToolPaint'
@@ -27,9 +27,9 @@ class ToolPaint(AbstractClassicTool):
 	def __init__(self, window, **kwargs):
 		# Context: the name of a tool to fill an area of one color with an other
 		super().__init__('paint', _("Paint"), 'tool-paint-symbolic', window)
-		self._magic_path = None
 		self.use_size = False
 		self.add_tool_action_enum('paint_algo', 'replace')
+		self.add_tool_action_enum('paint_tolerance', 'low')
 
 	def get_options_label(self):
 		return _("Painting options")
@@ -40,11 +40,13 @@ class ToolPaint(AbstractClassicTool):
 			return [_("Click on an area to replace its color by transparency")]
 		elif paint_algo == 'whole':
 			return [_("Click on the canvas to entirely paint it")]
-
-		label_warning1 = self.label + " - " + _("May not work for complex shapes")
-		label_warning2 = self.label + " - " + _("It will not work well if " + \
-		                                          "the area's edges are blurry")
-		return [label_warning1, label_warning2]
+		elif paint_algo == 'all':
+			return [_("Click on a color to replace it everywhere in the image")]
+		elif paint_algo == 'fill':
+			return [self.label + " - " + _("It will not work well if " + \
+			                                       "the area's edges are blurry")]
+		return [self.label + " - " + _("Increase the tolerance if the " + \
+		                                         "area's edges are blurry")]
 
 	############################################################################
 
@@ -56,33 +58,21 @@ class ToolPaint(AbstractClassicTool):
 		if event_x < 0 or event_x > surface.get_width() \
 		or event_y < 0 or event_y > surface.get_height():
 			return
-
-		self.old_color = utilities_get_rgba_for_xy(surface, event_x, event_y)
-
-		if self.get_option_value('paint_algo') == 'fill':
-			self._magic_path = utilities_get_magic_path(surface, event_x, \
-			                                            event_y, self.window, 1)
-		elif self.get_option_value('paint_algo') == 'replace':
-			self._magic_path = utilities_get_magic_path(surface, event_x, \
-			                                            event_y, self.window, 2)
-		else:
-			pass # == 'whole'
-
 		operation = self.build_operation(event_x, event_y)
 		self.apply_operation(operation)
 
 	############################################################################
 
 	def build_operation(self, x, y):
+		tolerance = self.get_option_value('paint_tolerance')
 		operation = {
 			'tool_id': self.id,
 			'algo': self.get_option_value('paint_algo'),
-			# 'x': x,
-			# 'y': y,
+			'x': int(x),
+			'y': int(y),
 			'new_rgba': self.main_color,
 			'antialias': self._use_antialias,
-			'old_rgba': self.old_color,
-			'path': self._magic_path
+			'tolerance': utilities_mask_get_tolerance(tolerance),
 		}
 		return operation
 
@@ -91,6 +81,8 @@ class ToolPaint(AbstractClassicTool):
 
 		if operation['algo'] == 'replace':
 			self._op_replace(operation)
+		elif operation['algo'] == 'all':
+			self._op_replace_all(operation)
 		elif operation['algo'] == 'whole':
 			self._op_whole(operation)
 		else: # if operation['algo'] == 'fill':
@@ -105,100 +97,39 @@ class ToolPaint(AbstractClassicTool):
 		cairo_context.paint()
 
 	def _op_fill(self, operation):
-		"""Simple but ugly, and it's relying on the precision of the provided
-		path whose creation is based on shitty heurisctics."""
-		if operation['path'] is None:
+		"""Paint the area of pixels of the same color around the clicked pixel,
+		using the mask computed by a flood fill of the current surface."""
+		mask = utilities_mask_flood_fill(self.get_surface(), operation['x'], \
+		                                                         operation['y'])
+		if mask is None:
 			return
 		cairo_context = self.get_context()
 		cairo_context.set_source_rgba(*operation['new_rgba'])
-		cairo_context.append_path(operation['path'])
-		# can_fill = cairo_context.in_fill(operation['x'], operation['y'])
-		# print(can_fill)
-		# if not can_fill:
-		# 	cairo_context.set_fill_rule(cairo.FillRule.EVEN_ODD)
-		# 	XXX doesn't work as i expected
-		cairo_context.fill()
+		cairo_context.mask_surface(mask, 0, 0)
 
 	def _op_replace(self, operation):
-		"""Algorithmically less ugly than `_op_fill`, but the replacing strategy
-		itself doesn't handle (semi-) transparent colors correctly. Looks fine
-		when there is no alpha at all and the anti-aliasing is off."""
-		# In this example, the user paints in blue and clicks on X (red):
-		#
-		# rrrrrrrrrrrrrrrrrrrrrrrrr
-		# rrrgggggggggggggggggrrXrr
-		# rrrgaaaaaaaaaaaaaaagrrrrr
-		# rrrgaaaaaaaaaaaaaaagrrrrr
-		# rrrgggggggggggggggggrraaa
-		# rrrrrrrrrrrrrrrrrrrrrraaa
-		#
-		# All red pixels will be painted blue, but FIXME all the green ones too.
-		if operation['path'] is None:
+		"""Replace the pixels of the area around the clicked pixel, whose colors
+		are close enough to its color, by the new color. Unlike `_op_fill`, the
+		new color isn't blended with the old ones, so it works with (semi-)
+		transparent colors too."""
+		mask = utilities_mask_flood_fill(self.get_surface(), operation['x'], \
+		                                   operation['y'], operation['tolerance'])
+		self._replace_through_mask(mask, operation['new_rgba'])
+
+	def _op_replace_all(self, operation):
+		"""Same as `_op_replace`, but for all the pixels of the image whose
+		colors are close enough to the color of the clicked pixel."""
+		mask = utilities_mask_of_color(self.get_surface(), operation['x'], \
+		                                   operation['y'], operation['tolerance'])
+		self._replace_through_mask(mask, operation['new_rgba'])
+
+	def _replace_through_mask(self, mask, new_rgba):
+		if mask is None:
 			return
-
-		# First, everything BUT the targeted area is erased
-		surface = self.get_surface()
-		cairo_context = cairo.Context(surface)
-		old_rgba = operation['old_rgba']
-		cairo_context.set_source_rgba(255, 255, 255, 1.0)
-		cairo_context.append_path(operation['path'])
-		cairo_context.set_operator(cairo.Operator.DEST_IN)
-		cairo_context.set_line_width(4) # ptêt too much mdr
-		cairo_context.set_antialias(cairo.Antialias.NONE)
-		cairo_context.stroke_preserve()
-		# cairo_context.fill_preserve()
-
-		# The result is loaded as the temp pixbuf…
-		self.get_image().set_temp_pixbuf(Gdk.pixbuf_get_from_surface(surface, \
-		                       0, 0, surface.get_width(), surface.get_height()))
-		# …where the targeted color is replaced by pure alpha
-		TOLERANCE = 10 # XXX uuugly
-		i = -1 * TOLERANCE
-		while i < TOLERANCE:
-			red = max(0, old_rgba[0]+i)
-			green = max(0, old_rgba[1]+i)
-			blue = max(0, old_rgba[2]+i)
-			red = int(min(255, red))
-			green = int(min(255, green))
-			blue = int(min(255, blue))
-			self._replace_temp_with_alpha(red, green, blue)
-			i = i+1
-
-		# The main pixbuf is restored, since its alterations were a side effect
-		# of this highly stupid algorithm
-		self.restore_pixbuf()
-		# We get a context from it again
-		cairo_context2 = self.get_context()
-
-		# The content of the path is cleared
-		cairo_context2.append_path(operation['path'])
-		cairo_context2.set_operator(cairo.Operator.CLEAR)
-		cairo_context2.set_source_rgba(255, 255, 255, 1.0)
-		cairo_context2.set_line_width(3) # ptêt too much mdr
-		cairo_context.set_antialias(cairo.Antialias.NONE)
-		cairo_context2.stroke_preserve()
-		cairo_context2.fill()
-
-		# The temp pixbuf (where "only" the pixels around the outline which are
-		# not in the targeted color still exist) is shown on top of the image
-		cairo_context2.set_operator(cairo.Operator.OVER)
-		Gdk.cairo_set_source_pixbuf(cairo_context2, \
-		                                     self.get_image().temp_pixbuf, 0, 0)
-		cairo_context2.paint()
-		self.non_destructive_show_modif()
-
-		# The transparent pixels within the path are painted with the new color
-		cairo_context2.set_operator(cairo.Operator.DEST_OVER)
-		cairo_context2.set_source_rgba(*operation['new_rgba'])
-		cairo_context2.append_path(operation['path'])
-		# cairo_context2.paint()
-		cairo_context2.set_line_width(3) # ptêt too much mdr
-		cairo_context2.stroke_preserve()
-		cairo_context2.fill()
-
-	def _replace_temp_with_alpha(self, red, green, blue):
-		new_pixbuf = self.get_image().temp_pixbuf.add_alpha(True, red, green, blue)
-		self.get_image().set_temp_pixbuf(new_pixbuf)
+		cairo_context = self.get_context()
+		cairo_context.set_operator(cairo.Operator.SOURCE)
+		cairo_context.set_source_rgba(*new_rgba)
+		cairo_context.mask_surface(mask, 0, 0)
 
 	############################################################################
 ################################################################################
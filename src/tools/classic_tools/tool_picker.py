@@ -34,7 +34,8 @@ class ToolPicker(AbstractClassicTool):
 		return None
 
 	def get_tooltip(self, event_x, event_y, motion_behavior):
-		color = utilities_gdk_rgba_from_xy(self.get_surface(), event_x, event_y)
+		color = utilities_gdk_rgba_from_xy(self.get_pixel_sampler(), event_x, \
+		                                                                event_y)
 		if color is None:
 			return None
 		color_name = utilities_get_rgba_name(color)
@@ -42,7 +43,8 @@ class ToolPicker(AbstractClassicTool):
 		return color_name + "\n" + color_code
 
 	def on_release_on_area(self, event, surface, event_x, event_y):
-		color = utilities_gdk_rgba_from_xy(surface, event_x, event_y)
+		color = utilities_gdk_rgba_from_xy(self.get_pixel_sampler(), event_x, \
+		                                                                event_y)
 		if event.button == 1:
 			self.window.options_manager.set_left_color(color)
 		elif event.button == 3:
@@ -190,8 +190,8 @@ class AbstractSelectionTool(AbstractAbstractTool):
 	def _pre_load_coords(self, x, y):
 		self.get_selection().set_future_coords(x, y)
 
-	def _pre_load_path(self, path, resync_coords=True):
-		self.get_selection().set_future_path(path, resync_coords)
+	def _pre_load_path(self, path, resync_coords=True, mask=None):
+		self.get_selection().set_future_path(path, resync_coords, mask)
 
 	def _build_rectangle_path(self, press_x, press_y, release_x, release_y):
 		"""Build rectangle path and pre-load it in the selection manager. This
@@ -320,6 +320,7 @@ class AbstractSelectionTool(AbstractAbstractTool):
 			'tool_id': self.id,
 			'operation_type': self.operation_type,
 			'initial_path': self.get_selection().get_future_path(),
+			'initial_mask': self.get_selection().get_future_mask(),
 			'replacement': color,
 			'extract': self.get_option_value('selection-extract'),
 			'pixbuf': pixbuf,
@@ -355,11 +356,15 @@ class AbstractSelectionTool(AbstractAbstractTool):
 			return # The user double-clicked: there is no path, and it's normal
 		cairo_context = self.get_context()
 		cairo_context.new_path()
-		cairo_context.append_path(operation['initial_path'])
 		replacement_rgba = operation['replacement']
 		cairo_context.set_operator(cairo.Operator.SOURCE)
 		cairo_context.set_source_rgba(*replacement_rgba)
-		cairo_context.fill()
+		if operation['initial_mask'] is None:
+			cairo_context.set_fill_rule(cairo.FillRule.EVEN_ODD)
+			cairo_context.append_path(operation['initial_path'])
+			cairo_context.fill()
+		else:
+			cairo_context.mask_surface(operation['initial_mask'], 0, 0)
 		cairo_context.set_operator(cairo.Operator.OVER)
 
 	def _op_drag(self, op):
@@ -375,7 +380,8 @@ class AbstractSelectionTool(AbstractAbstractTool):
 			replacement = op['replacement']
 		else:
 			replacement = None
-		self.get_selection().load_from_path(op['initial_path'], replacement)
+		self.get_selection().load_from_path(op['initial_path'], replacement, \
+		                                                     op['initial_mask'])
 
 	def _op_apply(self, operation):
 		cairo_context = self.get_context()
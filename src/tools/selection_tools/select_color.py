@@ -19,19 +19,48 @@ from .abstract_select import AbstractSelectionTool
 from .utilities_colors import utilities_get_rgba_name, \
                               utilities_gdk_rgba_from_xy, \
                               utilities_gdk_rgba_to_hexadecimal
-from .utilities_paths import utilities_get_magic_path
+from .utilities_masks import utilities_mask_flood_fill, \
+                             utilities_mask_get_tolerance, \
+                             utilities_mask_of_color, \
+                             utilities_mask_to_path
 
 class ToolColorSelect(AbstractSelectionTool):
 	__gtype_name__ = 'ToolColorSelect'
 
+	# The path is only shown above the selection (the pixels are selected using
+	# the mask), so it can be simplified, to be drawn faster.
+	PATH_TOLERANCE = 1.0
+
 	def __init__(self, window, **kwargs):
 		# Context: this is a tool to "magically" select an area depending on its
 		# color. For example clicking on a white pixel will select the
 		# surrounding area made of white pixels.
 		super().__init__('color_select', _("Color selection"), 'tool-magic-symbolic', window)
+		self.add_tool_action_boolean('color-select-global', False)
+		self.add_tool_action_enum('color-select-tolerance', 'exact')
+		self._set_options_sensitivity(False)
+		# mask of the pixels which would be selected by a click where the
+		# pointer is, in the "global" mode, and what it depends on
+		self._preview_mask = None
+		self._preview_key = None
+
+	def on_tool_selected(self, *args):
+		super().on_tool_selected()
+		self._set_options_sensitivity(True)
+
+	def on_tool_unselected(self, *args):
+		super().on_tool_unselected()
+		self._set_options_sensitivity(False)
+		self._preview_mask = None
+		self._preview_key = None
+
+	def _set_options_sensitivity(self, state):
+		self.set_action_sensitivity('color-select-global', state)
+		self.set_action_sensitivity('color-select-tolerance', state)
 
 	def get_tooltip(self, event_x, event_y, motion_behavior):
-		color = utilities_gdk_rgba_from_xy(self.get_surface(), event_x, event_y)
+		color = utilities_gdk_rgba_from_xy(self.get_pixel_sampler(), event_x, \
+		                                                                event_y)
 		if color is None:
 			return None
 		color_name = utilities_get_rgba_name(color)
@@ -40,12 +69,16 @@ class ToolColorSelect(AbstractSelectionTool):
 
 	def get_editing_tips(self):
 		tips = super().get_editing_tips()
-		if not self.selection_is_active():
-			label_warning1 = self.label + " - " + _("May not work for complex shapes")
-			tips.append(label_warning1)
-			label_warning2 = self.label + " - " + _("It will not work well " + \
+		if self.selection_is_active():
+			return tips
+		if self.get_option_value('color-select-global'):
+			label_tip = self.label + " - " + _("Click on a color to select " + \
+			                                  "it everywhere in the image")
+			tips.append(label_tip)
+		else:
+			label_warning = self.label + " - " + _("It will not work well " + \
 				                               "if the area's edges are blurry")
-			tips.append(label_warning2)
+			tips.append(label_warning)
 		return tips
 
 	############################################################################
@@ -57,14 +90,53 @@ class ToolColorSelect(AbstractSelectionTool):
 		pass
 
 	def release_define(self, surfc, event_x, event_y):
-		path = utilities_get_magic_path(surfc, event_x, event_y, self.window, 1)
-		self._pre_load_path(path)
-		if path is None:
+		mask = self._get_mask(surfc, event_x, event_y)
+		if mask is None:
 			return
+		path = utilities_mask_to_path(mask, self.PATH_TOLERANCE)
+		self._pre_load_path(path, True, mask)
 		self.operation_type = 'op-define'
 		operation = self.build_operation()
 		self.apply_operation(operation)
 
+	def _get_mask(self, surface, x, y):
+		tolerance = self.get_option_value('color-select-tolerance')
+		tolerance = utilities_mask_get_tolerance(tolerance)
+		if self.get_option_value('color-select-global'):
+			return utilities_mask_of_color(surface, x, y, tolerance)
+		return utilities_mask_flood_fill(surface, x, y, tolerance)
+
+	############################################################################
+	# Preview of the global mode ###############################################
+
+	def on_unclicked_motion_on_area(self, event, surface):
+		super().on_unclicked_motion_on_area(event, surface)
+		if self.selection_is_active() \
+		or not self.get_option_value('color-select-global'):
+			self._preview_mask = None
+			return
+		x, y = self.get_image().get_event_coords(event)
+		rgba = self.get_pixel_sampler().get_rgba(x, y)
+		key = (self.get_image().main_pixbuf_generation, rgba, \
+		                     self.get_option_value('color-select-tolerance'))
+		if key == self._preview_key:
+			return
+		# the mask is computed again only if the hovered color changed
+		self._preview_key = key
+		if rgba is None:
+			self._preview_mask = None
+		else:
+			self._preview_mask = self._get_mask(surface, x, y)
+		self.non_destructive_show_modif()
+
+	def on_draw_above(self, area, ccontext):
+		super().on_draw_above(area, ccontext)
+		if self._preview_mask is None or self.selection_is_active():
+			return
+		ccontext.set_source_rgba(0.1, 0.1, 0.3, 0.4)
+		ccontext.mask_surface(self._preview_mask, -1 * self.get_image().scroll_x, \
+		                                       -1 * self.get_image().scroll_y)
+
 	############################################################################
 ################################################################################
 
@@ -1,17 +1,32 @@
 # Licensed under GPL3 https://github.com/maoschanz/drawing/blob/master/LICENSE
 
+from gi.repository import Gdk
+
 class AbstractFilter():
 	__gtype_name__ = 'AbstractFilter'
 
 	def __init__(self, filter_id, filters_tool, *args):
 		self._id = filter_id
 		self._tool = filters_tool
+		self._widgets = []
+
+	def _add_spinbtn(self, caption, adj_as_array, spin_chars, unit):
+		label, spinbtn = self._tool.bar.add_spinbtn(caption, adj_as_array, \
+		                                                      spin_chars, unit)
+		self._widgets.append((label, spinbtn))
+		return spinbtn
 
 	def get_preferred_minimum_width(self):
-		return 0
+		width = 0
+		for label, spinbtn in self._widgets:
+			width += label.get_preferred_width()[0] + \
+			       spinbtn.get_preferred_width()[0]
+		return width
 
 	def set_filter_compact(self, is_active, is_compact):
-		pass
+		for label, spinbtn in self._widgets:
+			label.set_visible(is_active and not is_compact)
+			spinbtn.set_visible(is_active)
 
 	def set_attributes_values(self):
 		pass
@@ -19,8 +34,96 @@ class AbstractFilter():
 	def build_filter_op(self):
 		return {}
 
+	def get_scaled_operation(self, operation, scale):
+		"""Return a copy of `operation` adapted to be applied to a pixbuf whose
+		size has been multiplied by `scale`, for a quick preview."""
+		scaled_operation = dict(operation)
+		roi = operation.get('roi', None)
+		if roi is not None:
+			scaled_operation['roi'] = [value * scale for value in roi]
+		return scaled_operation
+
+	def get_folded_operation(self, operation, next_operation):
+		"""Return a single operation with the same effect as `operation`
+		followed by `next_operation` (both using this filter), or None if the
+		filter can't merge them."""
+		return None
+
+	def get_roi_margin(self, operation):
+		"""How many pixels around the region of interest the filter needs to
+		compute correctly the pixels of this region."""
+		return 0
+
 	def do_filter_operation(self, source_pixbuf, operation):
-		pass
+		"""Set the temp pixbuf of the image with the result of the filter. If
+		the operation has a region of interest, only this rectangle (and its
+		margin) is filtered, the rest of the pixbuf is left unchanged."""
+		new_pixbuf = self.get_operation_result(source_pixbuf, operation)
+		if new_pixbuf is not None:
+			self._tool.get_image().set_temp_pixbuf(new_pixbuf)
+
+	def get_operation_result(self, source_pixbuf, operation):
+		"""Return the pixbuf `do_filter_operation` would use as the temp pixbuf.
+		It doesn't change anything in the image or the tool, so it can be run
+		by the background worker computing the previews."""
+		roi = operation.get('roi', None)
+		if roi is None:
+			return self.get_filtered_pixbuf(source_pixbuf, operation)
+		return self._get_filtered_roi(source_pixbuf, operation, roi)
+
+	def get_filtered_pixbuf(self, source_pixbuf, operation):
+		"""Return a new pixbuf, the result of the filter applied to the whole
+		`source_pixbuf`, or None if the filter can't be applied. It may run in
+		a background thread, so it shouldn't have any side effect.
+		Filters have to implement this method or `filter_surface`: by default,
+		each one is implemented by converting the data for the other one."""
+		surface = Gdk.cairo_surface_create_from_pixbuf(source_pixbuf, 0, None)
+		scale = operation.get('scale_factor', 1)
+		surface.set_device_scale(scale, scale)
+		new_surface = self.filter_surface(surface, operation)
+		if new_surface is None:
+			return None
+		return Gdk.pixbuf_get_from_surface(new_surface, 0, 0, \
+		                      new_surface.get_width(), new_surface.get_height())
+
+	def filter_surface(self, surface, operation):
+		"""Return a surface, the result of the filter applied to `surface`, or
+		None if the filter can't be applied. The given surface belongs to the
+		caller, which will not use it anymore: it can be modified, and returned
+		as the result. Chains of filters pass the same surface along, so
+		filters implementing this method avoid converting it to pixbufs."""
+		pixbuf = Gdk.pixbuf_get_from_surface(surface, 0, 0, \
+		                              surface.get_width(), surface.get_height())
+		new_pixbuf = self.get_filtered_pixbuf(pixbuf, operation)
+		if new_pixbuf is None:
+			return None
+		new_surface = Gdk.cairo_surface_create_from_pixbuf(new_pixbuf, 0, None)
+		new_surface.set_device_scale(*surface.get_device_scale())
+		return new_surface
+
+	def _get_filtered_roi(self, source_pixbuf, operation, roi):
+		width = source_pixbuf.get_width()
+		height = source_pixbuf.get_height()
+		x0 = max(0, int(roi[0]))
+		y0 = max(0, int(roi[1]))
+		x1 = min(width, int(roi[0] + roi[2]))
+		y1 = min(height, int(roi[1] + roi[3]))
+		if x1 <= x0 or y1 <= y0:
+			return source_pixbuf.copy()
+
+		margin = self.get_roi_margin(operation)
+		mx0 = max(0, x0 - margin)
+		my0 = max(0, y0 - margin)
+		mx1 = min(width, x1 + margin)
+		my1 = min(height, y1 + margin)
+		sub_pixbuf = source_pixbuf.new_subpixbuf(mx0, my0, mx1 - mx0, my1 - my0)
+		filtered = self.get_filtered_pixbuf(sub_pixbuf, operation)
+		if filtered is None:
+			return None
+		new_pixbuf = source_pixbuf.copy()
+		filtered.copy_area(x0 - mx0, y0 - my0, x1 - x0, y1 - y0, \
+		                                                   new_pixbuf, x0, y0)
+		return new_pixbuf
 
 	############################################################################
 ################################################################################
@@ -0,0 +1,40 @@
+# Licensed under GPL3 https://github.com/maoschanz/drawing/blob/master/LICENSE
+
+from .abstract_filter import AbstractFilter
+from .utilities_pixels import utilities_has_numpy
+from .utilities_color_matrix import utilities_color_matrix_apply_to_pixbuf, \
+                                    utilities_color_matrix_apply_to_surface, \
+                                    utilities_color_matrix_get_identity
+
+class AbstractMatrixFilter(AbstractFilter):
+	"""Filters changing the colors of the image using a color matrix (see
+	utilities_color_matrix): the 4 channels of each pixel are mixed together.
+	Subclasses only have to build the matrix from the operation, and any
+	number of consecutive matrix filters can be applied in one pass over the
+	pixels by composing their matrices. It needs NumPy."""
+	__gtype_name__ = 'AbstractMatrixFilter'
+
+	def build_matrix(self, operation):
+		"""Return the 4x5 color matrix corresponding to the operation."""
+		return utilities_color_matrix_get_identity()
+
+	############################################################################
+
+	def get_filtered_pixbuf(self, source_pixbuf, operation):
+		return utilities_color_matrix_apply_to_pixbuf(source_pixbuf, \
+		                                          self.build_matrix(operation))
+
+	def filter_surface(self, surface, operation):
+		if not utilities_has_numpy():
+			# subclasses may have a fallback working on the pixbuf
+			return super().filter_surface(surface, operation)
+		return self.filter_surface_with_matrix(surface, \
+		                                          self.build_matrix(operation))
+
+	def filter_surface_with_matrix(self, surface, matrix):
+		utilities_color_matrix_apply_to_surface(surface, matrix)
+		return surface
+
+	############################################################################
+################################################################################
+
@@ -0,0 +1,45 @@
+# Licensed under GPL3 https://github.com/maoschanz/drawing/blob/master/LICENSE
+
+from gi.repository import Gdk
+from .abstract_filter import AbstractFilter
+from .utilities_pixels import utilities_has_numpy
+from .utilities_tones import utilities_tones_apply_to_pixbuf, \
+                             utilities_tones_apply_to_surface, \
+                             utilities_tones_get_identity
+
+class AbstractToneFilter(AbstractFilter):
+	"""Filters changing the tones of the image using a lookup table (LUT): each
+	color channel of each pixel is replaced by the item of the table at its
+	index. Subclasses only have to build the table from the operation, and any
+	number of consecutive tone filters can be applied in one pass over the
+	pixels by composing their tables."""
+	__gtype_name__ = 'AbstractToneFilter'
+
+	def build_lut(self, operation):
+		"""Return the list of the 256 new values of the color channels."""
+		return utilities_tones_get_identity()
+
+	############################################################################
+
+	def get_filtered_pixbuf(self, source_pixbuf, operation):
+		return utilities_tones_apply_to_pixbuf(source_pixbuf, \
+		                                             self.build_lut(operation))
+
+	def filter_surface(self, surface, operation):
+		return self.filter_surface_with_lut(surface, self.build_lut(operation))
+
+	def filter_surface_with_lut(self, surface, lut):
+		if not utilities_has_numpy():
+			# going through a pixbuf is faster than any pure-python loop
+			pixbuf = Gdk.pixbuf_get_from_surface(surface, 0, 0, \
+			                          surface.get_width(), surface.get_height())
+			new_pixbuf = utilities_tones_apply_to_pixbuf(pixbuf, lut)
+			new_surface = Gdk.cairo_surface_create_from_pixbuf(new_pixbuf, 0, None)
+			new_surface.set_device_scale(*surface.get_device_scale())
+			return new_surface
+		utilities_tones_apply_to_surface(surface, lut)
+		return surface
+
+	############################################################################
+################################################################################
+
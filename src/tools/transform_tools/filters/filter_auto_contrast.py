@@ -0,0 +1,37 @@
+# Licensed under GPL3 https://github.com/maoschanz/drawing/blob/master/LICENSE
+
+from .abstract_tone_filter import AbstractToneFilter
+from .utilities_histogram import utilities_histogram_get_bounds
+from .utilities_tones import utilities_tones_get_levels
+
+class FilterAutoContrast(AbstractToneFilter):
+	"""Stretches the values of the image to the whole range, like the 'levels'
+	filter, with the black and white points found in the histograms. They're
+	stored in the operation, so applying it again from the history gives the
+	same result, whatever the histograms are at this moment."""
+	__gtype_name__ = 'FilterAutoContrast'
+
+	# Ratio of the darkest and lightest values ignored when finding the points,
+	# so a few isolated pixels don't prevent the image from being stretched
+	CLIPPED_RATIO = 0.005
+
+	def build_filter_op(self):
+		image = self._tool.get_image()
+		if self._tool.apply_to_selection:
+			histograms = image.histogram.get_selection_histograms()
+		else:
+			histograms = image.histogram.get_histograms()
+		black, white = utilities_histogram_get_bounds(histograms, \
+		                                                   self.CLIPPED_RATIO)
+		options = {
+			'black': black,
+			'white': white
+		}
+		return options
+
+	def build_lut(self, operation):
+		return utilities_tones_get_levels(operation['black'], operation['white'])
+
+	############################################################################
+################################################################################
+
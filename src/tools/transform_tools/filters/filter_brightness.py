@@ -0,0 +1,27 @@
+# Licensed under GPL3 https://github.com/maoschanz/drawing/blob/master/LICENSE
+
+from .abstract_tone_filter import AbstractToneFilter
+from .utilities_tones import utilities_tones_clamp
+
+class FilterBrightness(AbstractToneFilter):
+	__gtype_name__ = 'FilterBrightness'
+
+	def __init__(self, filter_id, filters_tool, *args):
+		super().__init__(filter_id, filters_tool)
+		self._spinbtn = self._add_spinbtn(_("Brightness"), \
+		                                  [0, -100, 100, 5, 10, 0], 4, '%')
+		# it's [value, lower, upper, step_increment, page_increment, page_size]
+
+	def build_filter_op(self):
+		options = {
+			'percent': self._spinbtn.get_value() / 100
+		}
+		return options
+
+	def build_lut(self, operation):
+		delta = 255 * operation['percent']
+		return [utilities_tones_clamp(value + delta) for value in range(256)]
+
+	############################################################################
+################################################################################
+
@@ -0,0 +1,122 @@
+# Licensed under GPL3 https://github.com/maoschanz/drawing/blob/master/LICENSE
+
+from .abstract_filter import AbstractFilter
+from .abstract_matrix_filter import AbstractMatrixFilter
+from .abstract_tone_filter import AbstractToneFilter
+from .utilities_color_matrix import utilities_color_matrix_compose
+from .utilities_pixels import utilities_has_numpy
+from .utilities_tones import utilities_tones_apply_to_pixbuf, \
+                             utilities_tones_compose
+
+class FilterChain(AbstractFilter):
+	"""Applies an ordered list of filters to a single surface, so the pixels
+	are only converted from and to a pixbuf at the ends of the chain. The
+	operation has a 'chain' list of operations, each one with the 'filter_id'
+	of the filter to use, and the options of this filter."""
+	__gtype_name__ = 'FilterChain'
+
+	def _get_filter(self, sub_operation):
+		return self._tool.get_filter(sub_operation['filter_id'])
+
+	def get_chain_with(self, chain, sub_operation):
+		"""Return a copy of `chain` with `sub_operation` at its end. If the last
+		operation of the chain uses the same filter, and if this filter can
+		merge both operations in one, the result replaces the last operation."""
+		if len(chain) > 0:
+			last_operation = chain[-1]
+			if last_operation['filter_id'] == sub_operation['filter_id']:
+				active_filter = self._get_filter(sub_operation)
+				folded = active_filter.get_folded_operation(last_operation, \
+				                                                  sub_operation)
+				if folded is not None:
+					return chain[:-1] + [folded]
+		return chain + [sub_operation]
+
+	def get_scaled_operation(self, operation, scale):
+		scaled_operation = super().get_scaled_operation(operation, scale)
+		scaled_operation['chain'] = [self._get_filter(sub_op) \
+		                                    .get_scaled_operation(sub_op, scale) \
+		                                     for sub_op in operation['chain']]
+		return scaled_operation
+
+	def get_roi_margin(self, operation):
+		# each filter may need the margin of the filter applied before it
+		margin = 0
+		for sub_operation in operation['chain']:
+			active_filter = self._get_filter(sub_operation)
+			margin += active_filter.get_roi_margin(sub_operation)
+		return margin
+
+	def get_filtered_pixbuf(self, source_pixbuf, operation):
+		lut = self._get_tones_lut(operation['chain'])
+		if lut is None:
+			return super().get_filtered_pixbuf(source_pixbuf, operation)
+		# the chain is only made of tone filters: no need for a surface
+		return utilities_tones_apply_to_pixbuf(source_pixbuf, lut)
+
+	def filter_surface(self, surface, operation):
+		# consecutive tone filters are applied together, with a single LUT, and
+		# consecutive matrix filters are applied with a single matrix
+		group_filter = None
+		group_data = None
+		for sub_operation in operation['chain']:
+			active_filter = self._get_filter(sub_operation)
+			group_type = self._get_group_type(active_filter)
+			if group_filter is not None and \
+			                 group_type != self._get_group_type(group_filter):
+				surface = self._apply_group(surface, group_filter, group_data)
+				group_filter = None
+				group_data = None
+			if group_type is None:
+				new_surface = active_filter.filter_surface(surface, sub_operation)
+				if new_surface is not None:
+					surface = new_surface
+				continue
+			group_data = self._add_to_group(group_data, active_filter, \
+			                                                     sub_operation)
+			group_filter = active_filter
+		if group_filter is not None:
+			surface = self._apply_group(surface, group_filter, group_data)
+		return surface
+
+	def _get_group_type(self, active_filter):
+		if isinstance(active_filter, AbstractToneFilter):
+			return AbstractToneFilter
+		if isinstance(active_filter, AbstractMatrixFilter) and \
+		                                                 utilities_has_numpy():
+			return AbstractMatrixFilter
+		return None
+
+	def _add_to_group(self, group_data, active_filter, sub_operation):
+		if isinstance(active_filter, AbstractToneFilter):
+			return self._compose_luts(group_data, active_filter, sub_operation)
+		matrix = active_filter.build_matrix(sub_operation)
+		if group_data is None:
+			return matrix
+		return utilities_color_matrix_compose(group_data, matrix)
+
+	def _apply_group(self, surface, group_filter, group_data):
+		if isinstance(group_filter, AbstractToneFilter):
+			return group_filter.filter_surface_with_lut(surface, group_data)
+		return group_filter.filter_surface_with_matrix(surface, group_data)
+
+	def _get_tones_lut(self, chain):
+		"""Return the LUT equivalent to the whole chain if it's only made of
+		tone filters, None otherwise."""
+		lut = None
+		for sub_operation in chain:
+			active_filter = self._get_filter(sub_operation)
+			if not isinstance(active_filter, AbstractToneFilter):
+				return None
+			lut = self._compose_luts(lut, active_filter, sub_operation)
+		return lut
+
+	def _compose_luts(self, lut, tone_filter, sub_operation):
+		new_lut = tone_filter.build_lut(sub_operation)
+		if lut is None:
+			return new_lut
+		return utilities_tones_compose(lut, new_lut)
+
+	############################################################################
+################################################################################
+
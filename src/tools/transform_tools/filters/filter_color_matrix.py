@@ -0,0 +1,86 @@
+# Licensed under GPL3 https://github.com/maoschanz/drawing/blob/master/LICENSE
+
+from .abstract_matrix_filter import AbstractMatrixFilter
+from .utilities_pixels import utilities_has_numpy
+from .utilities_color_matrix import utilities_color_matrix_compose, \
+                                    utilities_color_matrix_mix, \
+                                    utilities_color_matrix_grayscale, \
+                                    utilities_color_matrix_sepia, \
+                                    utilities_color_matrix_hue_rotation, \
+                                    utilities_color_matrix_channels_rotation
+
+class FilterColorMatrix(AbstractMatrixFilter):
+	"""Presets of color matrices. The matrix is computed when the operation is
+	built, and stored in it, so successive operations can be folded into a
+	single one."""
+	__gtype_name__ = 'FilterColorMatrix'
+
+	def __init__(self, filter_id, filters_tool, *args):
+		super().__init__(filter_id, filters_tool)
+		self._preset = 'grayscale'
+		# Context: how much the filter changes the image, as a percentage
+		self._amount_spinbtn = self._add_spinbtn(_("Amount"), \
+		                                    [100, 0, 100, 5, 10, 0], 3, '%')
+		# Context: the angle of the rotation of the hue of the colors
+		self._angle_spinbtn = self._add_spinbtn(_("Angle"), \
+		                                    [180, 0, 360, 5, 30, 0], 3, '°')
+		# it's [value, lower, upper, step_increment, page_increment, page_size]
+
+	def set_preset(self, preset):
+		self._preset = preset
+
+	def set_filter_compact(self, is_active, is_compact):
+		visible_spinbtns = {
+			'grayscale': [self._amount_spinbtn],
+			'sepia': [self._amount_spinbtn],
+			'hue': [self._angle_spinbtn],
+		}.get(self._preset, [])
+		for label, spinbtn in self._widgets:
+			is_visible = is_active and spinbtn in visible_spinbtns
+			label.set_visible(is_visible and not is_compact)
+			spinbtn.set_visible(is_visible)
+
+	def build_filter_op(self):
+		amount = self._amount_spinbtn.get_value() / 100
+		if self._preset == 'grayscale':
+			matrix = utilities_color_matrix_grayscale()
+			matrix = utilities_color_matrix_mix(matrix, amount)
+		elif self._preset == 'sepia':
+			matrix = utilities_color_matrix_sepia()
+			matrix = utilities_color_matrix_mix(matrix, amount)
+		elif self._preset == 'hue':
+			angle = self._angle_spinbtn.get_value()
+			matrix = utilities_color_matrix_hue_rotation(angle)
+		else:
+			matrix = utilities_color_matrix_channels_rotation()
+		options = {
+			'preset': self._preset,
+			'amount': amount,
+			'matrix': matrix
+		}
+		return options
+
+	def get_folded_operation(self, operation, next_operation):
+		if not utilities_has_numpy():
+			# the pixbuf fallback can't apply a composed matrix
+			return None
+		matrix = utilities_color_matrix_compose(operation['matrix'], \
+		                                               next_operation['matrix'])
+		return {**next_operation, 'matrix': matrix}
+
+	def build_matrix(self, operation):
+		return operation['matrix']
+
+	def get_filtered_pixbuf(self, source_pixbuf, operation):
+		if utilities_has_numpy():
+			return super().get_filtered_pixbuf(source_pixbuf, operation)
+		# only the grayscale preset is available without NumPy, using the
+		# intensity instead of the luminance
+		new_pixbuf = source_pixbuf.copy()
+		source_pixbuf.saturate_and_pixelate(new_pixbuf, \
+		                                        1 - operation['amount'], False)
+		return new_pixbuf
+
+	############################################################################
+################################################################################
+
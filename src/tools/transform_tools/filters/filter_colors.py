@@ -1,10 +1,12 @@
 # Licensed under GPL3 https://github.com/maoschanz/drawing/blob/master/LICENSE
 
 import cairo
-from gi.repository import Gdk
 from .abstract_filter import AbstractFilter
+from .abstract_matrix_filter import AbstractMatrixFilter
+from .utilities_pixels import utilities_has_numpy
+from .utilities_color_matrix import utilities_color_matrix_inversion
 
-class FilterColors(AbstractFilter):
+class FilterColors(AbstractMatrixFilter):
 	__gtype_name__ = 'FilterColors'
 
 	def __init__(self, filter_id, filters_tool, *args):
@@ -12,15 +14,24 @@ class FilterColors(AbstractFilter):
 
 	# this filter could be so much more, but what's pertinent?
 
-	def do_filter_operation(self, source_pixbuf, operation):
-		surface = Gdk.cairo_surface_create_from_pixbuf(source_pixbuf, 0, None)
+	def build_matrix(self, operation):
+		return utilities_color_matrix_inversion()
+
+	def get_filtered_pixbuf(self, source_pixbuf, operation):
+		if utilities_has_numpy():
+			return super().get_filtered_pixbuf(source_pixbuf, operation)
+		return AbstractFilter.get_filtered_pixbuf(self, source_pixbuf, operation)
+
+	def filter_surface(self, surface, operation):
+		if utilities_has_numpy():
+			return super().filter_surface(surface, operation)
+		# without NumPy, the colors are inverted by cairo, but the transparent
+		# areas become opaque
 		cairo_context = cairo.Context(surface)
 		cairo_context.set_operator(cairo.Operator.DIFFERENCE)
 		cairo_context.set_source_rgba(1.0, 1.0, 1.0, 1.0)
 		cairo_context.paint()
-		new_pixbuf = Gdk.pixbuf_get_from_surface(surface, 0, 0, \
-		                              surface.get_width(), surface.get_height())
-		self._tool.get_image().set_temp_pixbuf(new_pixbuf)
+		return surface
 
 	############################################################################
 ################################################################################
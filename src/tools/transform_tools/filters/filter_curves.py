@@ -0,0 +1,79 @@
+# Licensed under GPL3 https://github.com/maoschanz/drawing/blob/master/LICENSE
+
+from .abstract_tone_filter import AbstractToneFilter
+from .utilities_tones import utilities_tones_clamp
+
+class FilterCurves(AbstractToneFilter):
+	"""A tone curve going through (0, 0) and (255, 255), and through 3 points
+	whose output values are chosen by the user, for the shadows (input 64),
+	the midtones (input 128), and the highlights (input 192)."""
+	__gtype_name__ = 'FilterCurves'
+
+	INPUTS = [0, 64, 128, 192, 255]
+
+	def __init__(self, filter_id, filters_tool, *args):
+		super().__init__(filter_id, filters_tool)
+		self._spinbtns = [
+			self._add_spinbtn(_("Shadows"), [64, 0, 255, 1, 10, 0], 3, ''),
+			self._add_spinbtn(_("Midtones"), [128, 0, 255, 1, 10, 0], 3, ''),
+			self._add_spinbtn(_("Highlights"), [192, 0, 255, 1, 10, 0], 3, ''),
+		]
+		# it's [value, lower, upper, step_increment, page_increment, page_size]
+
+	def build_filter_op(self):
+		options = {
+			'points': [spinbtn.get_value_as_int() for spinbtn in self._spinbtns]
+		}
+		return options
+
+	def build_lut(self, operation):
+		outputs = [0] + list(operation['points']) + [255]
+		slopes = self._get_slopes(self.INPUTS, outputs)
+		lut = []
+		segment = 0
+		for value in range(256):
+			while value > self.INPUTS[segment + 1]:
+				segment += 1
+			x0, x1 = self.INPUTS[segment], self.INPUTS[segment + 1]
+			y0, y1 = outputs[segment], outputs[segment + 1]
+			m0, m1 = slopes[segment], slopes[segment + 1]
+			lut.append(utilities_tones_clamp( \
+			               self._hermite(value, x0, x1, y0, y1, m0, m1)))
+		return lut
+
+	def _get_slopes(self, xs, ys):
+		"""Tangents of a monotone cubic interpolation (Fritsch-Carlson), so the
+		curve doesn't overshoot between the points."""
+		deltas = [(ys[i + 1] - ys[i]) / (xs[i + 1] - xs[i]) \
+		                                          for i in range(len(xs) - 1)]
+		slopes = [deltas[0]]
+		for i in range(1, len(xs) - 1):
+			if deltas[i - 1] * deltas[i] <= 0:
+				slopes.append(0.0)
+			else:
+				slopes.append((deltas[i - 1] + deltas[i]) / 2)
+		slopes.append(deltas[-1])
+		for i, delta in enumerate(deltas):
+			if delta == 0:
+				slopes[i] = slopes[i + 1] = 0.0
+				continue
+			alpha = slopes[i] / delta
+			beta = slopes[i + 1] / delta
+			norm = alpha * alpha + beta * beta
+			if norm > 9:
+				tau = 3 / (norm ** 0.5)
+				slopes[i] = tau * alpha * delta
+				slopes[i + 1] = tau * beta * delta
+		return slopes
+
+	def _hermite(self, x, x0, x1, y0, y1, m0, m1):
+		width = x1 - x0
+		t = (x - x0) / width
+		t2 = t * t
+		t3 = t2 * t
+		return (2 * t3 - 3 * t2 + 1) * y0 + (t3 - 2 * t2 + t) * width * m0 + \
+		       (-2 * t3 + 3 * t2) * y1 + (t3 - t2) * width * m1
+
+	############################################################################
+################################################################################
+
@@ -0,0 +1,24 @@
+# Licensed under GPL3 https://github.com/maoschanz/drawing/blob/master/LICENSE
+
+from .abstract_filter import AbstractFilter
+from .utilities_convolution import utilities_convolve_surface
+
+class FilterEdges(AbstractFilter):
+	__gtype_name__ = 'FilterEdges'
+
+	# Laplacian kernel: uniform areas become black, and the edges are bright
+	KERNEL = [
+		[-1, -1, -1],
+		[-1,  8, -1],
+		[-1, -1, -1],
+	]
+
+	def get_roi_margin(self, operation):
+		return 1
+
+	def filter_surface(self, surface, operation):
+		return utilities_convolve_surface(surface, self.KERNEL)
+
+	############################################################################
+################################################################################
+
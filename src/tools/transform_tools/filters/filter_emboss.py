@@ -1,20 +1,38 @@
 # Licensed under GPL3 https://github.com/maoschanz/drawing/blob/master/LICENSE
 
 import cairo
-from gi.repository import Gdk
 from .abstract_filter import AbstractFilter
 from .utilities_blur import utilities_blur_surface, BlurType, BlurDirection
+from .utilities_convolution import utilities_convolve_surface
+from .utilities_pixels import utilities_has_numpy
 
 class FilterEmboss(AbstractFilter):
 	__gtype_name__ = 'FilterEmboss'
 
-	def do_filter_operation(self, source_pixbuf, operation):
-		surface = Gdk.cairo_surface_create_from_pixbuf(source_pixbuf, 0, None)
-		scale = self._tool.scale_factor()
-		surface.set_device_scale(scale, scale)
-		width = source_pixbuf.get_width()
-		height = source_pixbuf.get_height()
+	# The differences along the diagonal are added to a medium gray, so uniform
+	# areas become gray, and the edges look lit from the top-left corner
+	KERNEL = [
+		[-1, -1,  0],
+		[-1,  0,  1],
+		[ 0,  1,  1],
+	]
+	BIAS = 128
+
+	def get_roi_margin(self, operation):
+		return 1
+
+	def filter_surface(self, surface, operation):
+		if not utilities_has_numpy():
+			return self._filter_surface_with_cairo(surface)
+		return utilities_convolve_surface(surface, self.KERNEL, self.BIAS)
+
+	def _filter_surface_with_cairo(self, surface):
+		"""Approximation of the embossing without NumPy: the inverted colors of
+		a blurred copy of the image are painted above it."""
+		width = surface.get_width()
+		height = surface.get_height()
 		new_surface = cairo.ImageSurface(cairo.Format.ARGB32, width, height)
+		new_surface.set_device_scale(*surface.get_device_scale())
 
 		cairo_context = cairo.Context(new_surface)
 		cairo_context.set_source_surface(surface)
@@ -22,7 +40,7 @@ class FilterEmboss(AbstractFilter):
 		cairo_context.paint()
 
 		bdir = BlurDirection.BOTH # could be an option
-		bs = utilities_blur_surface(surface, 1, BlurType.CAIRO_REPAINTS, bdir)
+		bs = utilities_blur_surface(surface, 1, BlurType.AUTO, bdir)
 		cairo_context2 = cairo.Context(bs)
 		cairo_context2.set_operator(cairo.Operator.DIFFERENCE)
 		cairo_context2.set_source_rgba(1.0, 1.0, 1.0, 1.0)
@@ -31,10 +49,7 @@ class FilterEmboss(AbstractFilter):
 		cairo_context.set_source_surface(bs)
 		cairo_context.set_operator(cairo.Operator.OVER)
 		cairo_context.paint_with_alpha(0.5)
-
-		new_pixbuf = Gdk.pixbuf_get_from_surface(new_surface, 0, 0, \
-		                      new_surface.get_width(), new_surface.get_height())
-		self._tool.get_image().set_temp_pixbuf(new_pixbuf)
+		return new_surface
 
 	############################################################################
 ################################################################################
@@ -0,0 +1,30 @@
+# Licensed under GPL3 https://github.com/maoschanz/drawing/blob/master/LICENSE
+
+from .abstract_tone_filter import AbstractToneFilter
+from .utilities_tones import utilities_tones_clamp
+
+class FilterGamma(AbstractToneFilter):
+	__gtype_name__ = 'FilterGamma'
+
+	def __init__(self, filter_id, filters_tool, *args):
+		super().__init__(filter_id, filters_tool)
+		# Context: the gamma correction of the image, as a percentage, where
+		# 100% doesn't change anything
+		self._spinbtn = self._add_spinbtn(_("Gamma"), \
+		                                  [100, 10, 500, 10, 50, 0], 3, '%')
+		# it's [value, lower, upper, step_increment, page_increment, page_size]
+
+	def build_filter_op(self):
+		options = {
+			'gamma': self._spinbtn.get_value() / 100
+		}
+		return options
+
+	def build_lut(self, operation):
+		exponent = 1.0 / operation['gamma']
+		return [utilities_tones_clamp(255 * ((value / 255) ** exponent)) \
+		                                                for value in range(256)]
+
+	############################################################################
+################################################################################
+
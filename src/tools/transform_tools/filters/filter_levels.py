@@ -0,0 +1,31 @@
+# Licensed under GPL3 https://github.com/maoschanz/drawing/blob/master/LICENSE
+
+from .abstract_tone_filter import AbstractToneFilter
+from .utilities_tones import utilities_tones_get_levels
+
+class FilterLevels(AbstractToneFilter):
+	__gtype_name__ = 'FilterLevels'
+
+	def __init__(self, filter_id, filters_tool, *args):
+		super().__init__(filter_id, filters_tool)
+		# Context: the value under which everything becomes black
+		self._black_spinbtn = self._add_spinbtn(_("Black point"), \
+		                                      [0, 0, 254, 1, 10, 0], 3, '')
+		# Context: the value above which everything becomes white
+		self._white_spinbtn = self._add_spinbtn(_("White point"), \
+		                                    [255, 1, 255, 1, 10, 0], 3, '')
+		# it's [value, lower, upper, step_increment, page_increment, page_size]
+
+	def build_filter_op(self):
+		options = {
+			'black': self._black_spinbtn.get_value_as_int(),
+			'white': self._white_spinbtn.get_value_as_int()
+		}
+		return options
+
+	def build_lut(self, operation):
+		return utilities_tones_get_levels(operation['black'], operation['white'])
+
+	############################################################################
+################################################################################
+
@@ -0,0 +1,47 @@
+# Licensed under GPL3 https://github.com/maoschanz/drawing/blob/master/LICENSE
+
+from .abstract_filter import AbstractFilter
+from .utilities_convolution import utilities_convolve_surface, \
+                                   utilities_get_gaussian_kernel
+
+class FilterSharpen(AbstractFilter):
+	"""Unsharp masking: the difference between the image and a blurred version
+	of it is added to the image. It's done with a single kernel, which is the
+	identity plus `amount` times (identity minus a gaussian kernel)."""
+	__gtype_name__ = 'FilterSharpen'
+
+	def __init__(self, filter_id, filters_tool, *args):
+		super().__init__(filter_id, filters_tool)
+		# Context: how much the image will be sharpened
+		self._amount_spinbtn = self._add_spinbtn(_("Amount"), \
+		                                      [100, 0, 500, 10, 50, 0], 3, '%')
+		self._radius_spinbtn = self._add_spinbtn(_("Radius"), \
+		                                           [2, 1, 20, 1, 5, 0], 2, 'px')
+		# it's [value, lower, upper, step_increment, page_increment, page_size]
+
+	def build_filter_op(self):
+		options = {
+			'amount': self._amount_spinbtn.get_value() / 100,
+			'radius': self._radius_spinbtn.get_value_as_int()
+		}
+		return options
+
+	def get_scaled_operation(self, operation, scale):
+		scaled_operation = super().get_scaled_operation(operation, scale)
+		scaled_operation['radius'] = max(1, round(operation['radius'] * scale))
+		return scaled_operation
+
+	def get_roi_margin(self, operation):
+		return operation['radius']
+
+	def filter_surface(self, surface, operation):
+		amount = operation['amount']
+		gaussian = utilities_get_gaussian_kernel(operation['radius'])
+		size = len(gaussian)
+		kernel = [[-amount * gx * gy for gx in gaussian] for gy in gaussian]
+		kernel[size // 2][size // 2] += 1 + amount
+		return utilities_convolve_surface(surface, kernel)
+
+	############################################################################
+################################################################################
+
@@ -0,0 +1,58 @@
+# Licensed under GPL3 https://github.com/maoschanz/drawing/blob/master/LICENSE
+
+from collections import OrderedDict
+
+class DrFiltersCache():
+	"""Least-recently-used cache of the previews of the filters, so going back
+	to recently previewed values doesn't compute them again. The previews are
+	all computed from the same source pixbuf: the cache is emptied when the
+	source changes. The total size of the cached pixbufs is bounded."""
+	__gtype_name__ = 'DrFiltersCache'
+
+	def __init__(self, max_bytes):
+		self._max_bytes = max_bytes
+		self._nb_bytes = 0
+		self._pixbufs = OrderedDict()
+		self._source_key = None
+
+	def set_source(self, image, is_selection):
+		"""Empty the cache if the source pixbuf isn't the one the previews have
+		been computed from."""
+		if is_selection:
+			generation = image.selection.pixbuf_generation
+		else:
+			generation = image.main_pixbuf_generation
+		source_key = (image, is_selection, generation)
+		if self._source_key != source_key:
+			self.clear()
+			self._source_key = source_key
+
+	def clear(self):
+		self._pixbufs.clear()
+		self._nb_bytes = 0
+		self._source_key = None
+
+	def get(self, key):
+		pixbuf = self._pixbufs.get(key, None)
+		if pixbuf is not None:
+			self._pixbufs.move_to_end(key)
+		return pixbuf
+
+	def add(self, key, pixbuf):
+		nb_bytes = self._get_pixbuf_size(pixbuf)
+		if nb_bytes > self._max_bytes:
+			return
+		if key in self._pixbufs:
+			self._nb_bytes -= self._get_pixbuf_size(self._pixbufs.pop(key))
+		self._pixbufs[key] = pixbuf
+		self._nb_bytes += nb_bytes
+		while self._nb_bytes > self._max_bytes:
+			oldest_key, oldest_pixbuf = self._pixbufs.popitem(last=False)
+			self._nb_bytes -= self._get_pixbuf_size(oldest_pixbuf)
+
+	def _get_pixbuf_size(self, pixbuf):
+		return pixbuf.get_rowstride() * pixbuf.get_height()
+
+	############################################################################
+################################################################################
+
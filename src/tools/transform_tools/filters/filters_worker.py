@@ -0,0 +1,83 @@
+# Licensed under GPL3 https://github.com/maoschanz/drawing/blob/master/LICENSE
+
+import threading
+from gi.repository import GLib
+
+class DrFiltersWorker():
+	"""Computes the previews of the filters in a background thread, so the
+	user interface stays responsive while they're changing the options.
+
+	Each job gets a generation number. Only the most recent job matters: a job
+	submitted while another one is waiting replaces it, and the results of
+	stale jobs (including the one being computed) are dropped instead of being
+	posted back to the main thread."""
+	__gtype_name__ = 'DrFiltersWorker'
+
+	def __init__(self):
+		self._generation = 0
+		self._pending_job = None
+		self._condition = threading.Condition()
+		self._thread = None
+
+	def submit(self, active_filter, source_pixbuf, operation, callback, *args):
+		"""Schedule the filtering of a private copy of `source_pixbuf`. Once
+		it's done, and if the job is still the most recent one, `callback` is
+		called on the main thread with the result, the exception raised (if
+		any), and `args`."""
+		job_data = (active_filter, source_pixbuf.copy(), dict(operation), \
+		                                                       callback, args)
+		with self._condition:
+			self._generation += 1
+			self._pending_job = (self._generation, job_data)
+			self._start_thread()
+			self._condition.notify()
+		return self._generation
+
+	def cancel(self):
+		"""Make all the jobs stale, whether they're waiting or running."""
+		with self._condition:
+			self._generation += 1
+			self._pending_job = None
+
+	def is_current(self, generation):
+		return generation == self._generation
+
+	############################################################################
+
+	def _start_thread(self):
+		if self._thread is not None:
+			return
+		self._thread = threading.Thread(target=self._run, daemon=True, \
+		                                                name='filters-worker')
+		self._thread.start()
+
+	def _run(self):
+		while True:
+			with self._condition:
+				while self._pending_job is None:
+					self._condition.wait()
+				generation, job_data = self._pending_job
+				self._pending_job = None
+			if not self.is_current(generation):
+				continue
+			active_filter, source_pixbuf, operation, callback, args = job_data
+			result, error = None, None
+			try:
+				result = active_filter.get_operation_result(source_pixbuf, \
+				                                                      operation)
+			except Exception as e:
+				error = e
+			if self.is_current(generation):
+				GLib.idle_add(self._post_result, generation, result, error, \
+				                                                callback, args)
+
+	def _post_result(self, generation, result, error, callback, args):
+		"""This is used as a GSourceFunc so it should return False."""
+		# a newer job may have been submitted since the end of this one
+		if self.is_current(generation):
+			callback(result, error, *args)
+		return False
+
+	############################################################################
+################################################################################
+
@@ -15,22 +15,45 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import cairo
+import cairo, math
 from gi.repository import Gdk, GdkPixbuf, Gio, GLib
 from .abstract_transform_tool import AbstractCanvasTool
+from .filter_auto_contrast import FilterAutoContrast
 from .filter_blur import FilterBlur
+from .filter_brightness import FilterBrightness
+from .filter_chain import FilterChain
+from .filter_color_matrix import FilterColorMatrix
 from .filter_colors import FilterColors
 from .filter_contrast import FilterContrast
+from .filter_curves import FilterCurves
+from .filter_edges import FilterEdges
 from .filter_emboss import FilterEmboss
+from .filter_gamma import FilterGamma
+from .filter_levels import FilterLevels
 from .filter_saturation import FilterSaturation
+from .filter_sharpen import FilterSharpen
 from .filter_transparency import FilterTransparency
 from .filter_veil import FilterVeil
+from .filters_cache import DrFiltersCache
+from .filters_worker import DrFiltersWorker
 from .optionsbar_filters import OptionsBarFilters
+from .utilities_overlay import utilities_show_overlay_on_context
 from .utilities_blur import utilities_blur_surface, BlurType, BlurDirection
+from .utilities_pixels import utilities_has_numpy
 
 class ToolFilters(AbstractCanvasTool):
 	__gtype_name__ = 'ToolFilters'
 
+	# Below this number of pixels, previews are computed at full resolution
+	MIN_LOW_RES_PIXELS = 640 * 480
+	# Delay (in milliseconds) before refining a low-resolution preview
+	REFINE_DELAY = 300
+	# Maximal size (in bytes) of the previously computed previews kept in memory
+	CACHE_MAX_BYTES = 256 * 1024 * 1024
+	# Types of filters which need NumPy, so they're not in the menu without it
+	NUMPY_FILTERS_TYPES = ['sharpen', 'edges', 'color_sepia', 'color_hue', \
+	                                                       'color_channels']
+
 	def __init__(self, window):
 		super().__init__('filters', _("Filters"), 'tool-filters-symbolic', window)
 		self.cursor_name = 'pointer'
@@ -43,13 +66,42 @@ class ToolFilters(AbstractCanvasTool):
 		self.add_tool_action_enum('filters_blur_dir', 'none')
 		self.blur_algo = BlurType.INVALID
 
+		# Filters previously chosen by the user, which will be applied (in the
+		# same operation) before the active one
+		self._chain = []
+		self.add_tool_action_simple('filters_chain_push', self._push_to_chain)
+		self.add_tool_action_simple('filters_chain_clear', self._clear_chain)
+
+		# Region of interest, as a rectangle (x, y, width, height) in the
+		# coordinates of the image, or None to filter the whole pixbuf
+		self._roi = None
+		self.x_press = self.y_press = None
+		self.x_motion = self.y_motion = None
+
+		# Previews are first computed on a downscaled copy of the pixbuf, and
+		# refined at full resolution once the user stops changing the options
+		self._low_res_allowed = True
+		self._low_res_source = None
+		self._refine_source_id = None
+		self._worker = DrFiltersWorker()
+		self._cache = DrFiltersCache(self.CACHE_MAX_BYTES)
+
 		# Initialisation of the filters
 		self._all_filters = {
+			'auto_contrast': FilterAutoContrast('auto_contrast', self),
 			'blur': FilterBlur('blur', self),
+			'brightness': FilterBrightness('brightness', self),
+			'chain': FilterChain('chain', self),
+			'color_matrix': FilterColorMatrix('color_matrix', self),
 			'colors': FilterColors('colors', self),
 			'contrast': FilterContrast('contrast', self),
+			'curves': FilterCurves('curves', self),
+			'edges': FilterEdges('edges', self),
 			'emboss': FilterEmboss('emboss', self),
+			'gamma': FilterGamma('gamma', self),
+			'levels': FilterLevels('levels', self),
 			'saturation': FilterSaturation('saturation', self),
+			'sharpen': FilterSharpen('sharpen', self),
 			'transparency': FilterTransparency('transparency', self),
 			'veil': FilterVeil('veil', self),
 		}
@@ -64,6 +116,15 @@ class ToolFilters(AbstractCanvasTool):
 		self.bar.menu_btn.connect('notify::active', self._set_blur_direction)
 		return self.bar
 
+	def get_options_model(self):
+		model = super().get_options_model()
+		if not utilities_has_numpy():
+			_remove_menu_items(model, self.NUMPY_FILTERS_TYPES)
+		return model
+
+	def get_filter(self, filter_id):
+		return self._all_filters[filter_id]
+
 	def get_max_filter_width(self):
 		width = 0
 		for f in self._all_filters.values():
@@ -79,7 +140,13 @@ class ToolFilters(AbstractCanvasTool):
 
 	def get_editing_tips(self):
 		tip_label = _("Click on the image to preview the selected filter")
-		return [self.type_label, tip_label]
+		roi_label = _("Draw a rectangle to only filter this area")
+		tips = [self.type_label, tip_label, roi_label]
+		if len(self._chain) > 0:
+			# Context: the number of filters which will be applied before the
+			# selected one
+			tips.append(_("Previous filters: %s") % len(self._chain))
+		return tips
 
 	############################################################################
 
@@ -98,6 +165,10 @@ class ToolFilters(AbstractCanvasTool):
 			self.blur_algo = BlurType.PX_BOX
 			self.type_label = _("Slow blur")
 			self._active_filter = 'blur'
+		elif state_as_string == 'blur_gaussian':
+			self.blur_algo = BlurType.GAUSSIAN
+			self.type_label = _("Gaussian blur")
+			self._active_filter = 'blur'
 		elif state_as_string == 'tiles':
 			self.blur_algo = BlurType.TILES
 			self.type_label = _("Mosaic")
@@ -110,10 +181,52 @@ class ToolFilters(AbstractCanvasTool):
 			self.type_label = _("Veil")
 			self._active_filter = 'veil'
 
+		elif state_as_string == 'color_grayscale':
+			self.type_label = _("Grayscale")
+			self._set_color_matrix_preset('grayscale')
+		elif state_as_string == 'color_sepia':
+			# Context: a filter giving the brownish tones of old photographs
+			self.type_label = _("Sepia")
+			self._set_color_matrix_preset('sepia')
+		elif state_as_string == 'color_hue':
+			self.type_label = _("Rotate hue")
+			self._set_color_matrix_preset('hue')
+		elif state_as_string == 'color_channels':
+			# Context: a filter exchanging the red, green, and blue values
+			self.type_label = _("Swap channels")
+			self._set_color_matrix_preset('channels')
+
 		elif state_as_string == 'contrast':
 			self.type_label = _("Increase contrast")
 			self._active_filter = 'contrast'
-		# TODO changer la luminosity tant qu'à faire
+		elif state_as_string == 'brightness':
+			self.type_label = _("Brightness")
+			self._active_filter = 'brightness'
+		elif state_as_string == 'gamma':
+			# Context: a filter changing the gamma correction of the image
+			self.type_label = _("Gamma correction")
+			self._active_filter = 'gamma'
+		elif state_as_string == 'levels':
+			# Context: a filter changing the black and white points
+			self.type_label = _("Levels")
+			self._active_filter = 'levels'
+		elif state_as_string == 'auto_contrast':
+			# Context: a filter stretching the tones of the image to use the
+			# whole range of values
+			self.type_label = _("Auto contrast")
+			self._active_filter = 'auto_contrast'
+		elif state_as_string == 'curves':
+			# Context: a filter changing the tones with a curve
+			self.type_label = _("Curves")
+			self._active_filter = 'curves'
+
+		elif state_as_string == 'sharpen':
+			self.type_label = _("Sharpen")
+			self._active_filter = 'sharpen'
+		elif state_as_string == 'edges':
+			# Context: a filter only keeping the edges of the shapes
+			self.type_label = _("Detect edges")
+			self._active_filter = 'edges'
 		elif state_as_string == 'emboss':
 			# Context: a filter. See "image embossing" on wikipedia
 			self.type_label = _("Emboss")
@@ -130,10 +243,17 @@ class ToolFilters(AbstractCanvasTool):
 			self.type_label = _("Select a filter…")
 		self.bar.on_filter_changed()
 
+	def _set_color_matrix_preset(self, preset):
+		self._all_filters['color_matrix'].set_preset(preset)
+		self._active_filter = 'color_matrix'
+
 	############################################################################
 
 	def on_tool_selected(self, *args):
 		super().on_tool_selected()
+		self._roi = None
+		self._chain = []
+		self._low_res_source = None
 		self._set_active_type()
 		self._set_blur_direction()
 		GLib.timeout_add(100, self._async_open_menu, {})
@@ -141,19 +261,157 @@ class ToolFilters(AbstractCanvasTool):
 			self.on_filter_preview()
 			# XXX great optimization but it displays shit
 
+	def on_tool_unselected(self, *args):
+		super().on_tool_unselected()
+		self._cancel_refinement()
+		self._worker.cancel()
+		self._cache.clear()
+		self._low_res_source = None
+
 	def _async_open_menu(self, *args):
 		"""This is used as a GSourceFunc so it should return False."""
 		self.bar.menu_btn.set_active(True)
 		return False
 
 	def on_press_on_area(self, event, surface, event_x, event_y):
+		self.x_press = self.x_motion = event_x
+		self.y_press = self.y_motion = event_y
+
+	def on_motion_on_area(self, event, surface, event_x, event_y, render=True):
+		self.x_motion = event_x
+		self.y_motion = event_y
+		if render:
+			self.get_image().update()
+
+	def on_release_on_area(self, event, surface, event_x, event_y):
+		# a simple click resets the region of interest to the whole image
+		self._roi = self._get_dragged_rectangle(event_x, event_y)
+		self.x_press = self.y_press = None
+		self.on_filter_preview()
+
+	def _get_dragged_rectangle(self, event_x, event_y):
+		width = abs(event_x - self.x_press)
+		height = abs(event_y - self.y_press)
+		if width < 2 or height < 2:
+			return None
+		return (min(event_x, self.x_press), min(event_y, self.y_press), \
+		                                                         width, height)
+
+	def on_draw_above(self, area, cairo_context):
+		if self.x_press is not None:
+			rectangle = self._get_dragged_rectangle(self.x_motion, self.y_motion)
+		else:
+			rectangle = self._roi
+		if rectangle is None:
+			return
+		x, y, width, height = rectangle
+		x1, x2, y1, y2 = self.get_image().get_corrected_coords(x, x + width, \
+		                                             y, y + height, False, False)
+		cairo_context.new_path()
+		cairo_context.rectangle(x1, y1, x2 - x1, y2 - y1)
+		roi_path = cairo_context.copy_path()
+		thickness = self.get_overlay_thickness()
+		utilities_show_overlay_on_context(cairo_context, roi_path, thickness)
+
+	############################################################################
+	# Chain of filters #########################################################
+
+	def _get_active_filter_op(self):
+		options = self._all_filters[self._active_filter].build_filter_op()
+		return {'filter_id': self._active_filter, **options}
+
+	def _push_to_chain(self, *args):
+		"""Keep the active filter with its current options, so the user can
+		choose another filter to apply after it."""
+		self._set_active_type()
+		self._set_blur_direction()
+		chain_filter = self._all_filters['chain']
+		self._chain = chain_filter.get_chain_with(self._chain, \
+		                                           self._get_active_filter_op())
+		self.window.set_window_subtitles()
+		self.on_filter_preview()
+
+	def _clear_chain(self, *args):
+		self._chain = []
+		self.window.set_window_subtitles()
 		self.on_filter_preview()
 
+	############################################################################
+
 	def on_filter_preview(self, *args):
 		self._set_active_type()
 		self._set_blur_direction()
+		self._low_res_allowed = True
 		self.build_and_do_op()
 
+	############################################################################
+	# Low-resolution preview ###################################################
+
+	def _get_preview_scale(self, source_pixbuf):
+		"""Return the factor by which the source pixbuf should be downscaled to
+		be previewed quickly: it's the zoom level, or less if the pixbuf would
+		still have more pixels than the viewport."""
+		image = self.get_image()
+		nb_pixels = source_pixbuf.get_width() * source_pixbuf.get_height()
+		max_pixels = max(self.MIN_LOW_RES_PIXELS, \
+		                 image.get_widget_width() * image.get_widget_height())
+		if nb_pixels <= max_pixels:
+			return 1.0
+		return min(1.0, image.zoom_level, math.sqrt(max_pixels / nb_pixels))
+
+	def _get_low_res_source(self, source_pixbuf, scale):
+		"""Downscale the source pixbuf, reusing the previous result if nothing
+		changed since the last preview."""
+		if self._low_res_source is not None:
+			pixbuf, previous_scale, low_res_pixbuf = self._low_res_source
+			if pixbuf is source_pixbuf and previous_scale == scale:
+				return low_res_pixbuf
+		width = max(1, int(source_pixbuf.get_width() * scale))
+		height = max(1, int(source_pixbuf.get_height() * scale))
+		low_res_pixbuf = source_pixbuf.scale_simple(width, height, \
+		                                          GdkPixbuf.InterpType.BILINEAR)
+		self._low_res_source = (source_pixbuf, scale, low_res_pixbuf)
+		return low_res_pixbuf
+
+	def _low_res_preview(self, is_selection, width, height):
+		"""Like `temp_preview`, but the temp pixbuf is stretched to the size of
+		the pixbuf it previews the filtering of."""
+		pixbuf = self.get_image().temp_pixbuf
+		cairo_context = self.get_context()
+		if is_selection:
+			x = self.get_selection().selection_x
+			y = self.get_selection().selection_y
+		else:
+			x = 0
+			y = 0
+			cairo_context.set_operator(cairo.Operator.SOURCE)
+		cairo_context.translate(x, y)
+		cairo_context.scale(width / pixbuf.get_width(), \
+		                    height / pixbuf.get_height())
+		Gdk.cairo_set_source_pixbuf(cairo_context, pixbuf, 0, 0)
+		cairo_context.get_source().set_extend(cairo.Extend.PAD)
+		cairo_context.rectangle(0, 0, pixbuf.get_width(), pixbuf.get_height())
+		cairo_context.fill()
+		self.get_image().update()
+
+	def _schedule_refinement(self):
+		self._cancel_refinement()
+		self._refine_source_id = GLib.timeout_add(self.REFINE_DELAY, \
+		                                                  self._async_refine, {})
+
+	def _cancel_refinement(self):
+		if self._refine_source_id is not None:
+			GLib.source_remove(self._refine_source_id)
+			self._refine_source_id = None
+
+	def _async_refine(self, *args):
+		"""Compute the preview at full resolution.
+		This is used as a GSourceFunc so it should return False."""
+		self._refine_source_id = None
+		self._low_res_allowed = False
+		self.build_and_do_op()
+		return False
+
 	############################################################################
 
 	def build_operation(self):
@@ -163,23 +421,137 @@ class ToolFilters(AbstractCanvasTool):
 			'is_preview': True,
 			'local_dx': 0,
 			'local_dy': 0,
-			'filter_id': self._active_filter
+			'roi': self._get_operation_roi(),
+			# read here because the filters may run in the worker thread, which
+			# shouldn't access the widgets
+			'scale_factor': self.scale_factor(),
 		}
-		options = self._all_filters[self._active_filter].build_filter_op()
-		return {**operation, **options}
+		active_filter_op = self._get_active_filter_op()
+		if len(self._chain) == 0:
+			return {**operation, **active_filter_op}
+		# the whole chain is applied as a single operation
+		chain_filter = self._all_filters['chain']
+		operation['filter_id'] = 'chain'
+		operation['chain'] = chain_filter.get_chain_with(self._chain, \
+		                                                       active_filter_op)
+		return operation
+
+	def _get_operation_roi(self):
+		"""Convert the region of interest to the coordinates of the pixbuf the
+		filter will be applied to."""
+		if self._roi is None:
+			return None
+		x, y, width, height = self._roi
+		if self.apply_to_selection:
+			x -= self.get_selection().selection_x
+			y -= self.get_selection().selection_y
+		return [x, y, width, height]
 
 	def do_tool_operation(self, operation):
+		if operation['is_preview']:
+			self._submit_preview(operation)
+			return
+		self._cancel_refinement()
+		self._worker.cancel()
 		self.start_tool_operation(operation)
-		if operation['is_selection']:
-			source_pixbuf = self.get_selection_pixbuf()
-		else:
-			source_pixbuf = self.get_main_pixbuf()
-
+		roi = operation.get('roi', None)
+		if roi is not None and not operation['is_selection']:
+			self.get_image().set_damaged_rectangle(*roi)
+		source_pixbuf = self._get_source_pixbuf(operation)
 		active_filter = self._all_filters[operation['filter_id']]
 		active_filter.do_filter_operation(source_pixbuf, operation)
-
 		self.common_end_operation(operation)
 
+	def _get_source_pixbuf(self, operation):
+		if operation['is_selection']:
+			return self.get_selection_pixbuf()
+		return self.get_main_pixbuf()
+
 	############################################################################
+	# Previews computed in the background ######################################
+
+	def _submit_preview(self, operation):
+		"""Previews are computed by the worker thread, the image is updated
+		when the result of the most recent preview is available."""
+		source_pixbuf = self._get_source_pixbuf(operation)
+		active_filter = self._all_filters[operation['filter_id']]
+		scale = 1.0
+		if self._low_res_allowed:
+			scale = self._get_preview_scale(source_pixbuf)
+		if scale < 1.0:
+			job_source = self._get_low_res_source(source_pixbuf, scale)
+			job_operation = active_filter.get_scaled_operation(operation, scale)
+		else:
+			job_source = source_pixbuf
+			job_operation = operation
+
+		self._cache.set_source(self.get_image(), operation['is_selection'])
+		cache_key = self._get_cache_key(job_operation, scale)
+		generation = self._get_source_generation(operation['is_selection'])
+		preview_data = (operation, self.get_image(), source_pixbuf.get_width(), \
+		                  source_pixbuf.get_height(), scale, cache_key, generation)
+		cached_pixbuf = self._cache.get(cache_key)
+		if cached_pixbuf is not None:
+			# a result the worker may post later would replace this one
+			self._worker.cancel()
+			self._on_preview_computed(cached_pixbuf, None, *preview_data)
+			return
+		self._worker.submit(active_filter, job_source, job_operation, \
+		                              self._on_preview_computed, *preview_data)
+
+	def _get_source_generation(self, is_selection):
+		if is_selection:
+			return self.get_selection().pixbuf_generation
+		return self.get_image().main_pixbuf_generation
+
+	def _get_cache_key(self, operation, scale):
+		operation = {**operation}
+		operation.pop('is_preview')
+		return (scale, self._get_hashable_value(operation))
+
+	def _get_hashable_value(self, value):
+		if isinstance(value, dict):
+			return tuple((name, self._get_hashable_value(value[name])) \
+			                                            for name in sorted(value))
+		if isinstance(value, list):
+			return tuple(self._get_hashable_value(item) for item in value)
+		return value
+
+	def _on_preview_computed(self, new_pixbuf, error, operation, image, \
+	                               width, height, scale, cache_key, generation):
+		if error is not None:
+			self.show_error(str(error))
+			return
+		if new_pixbuf is None or image is not self.get_image():
+			return
+		if generation != self._get_source_generation(operation['is_selection']):
+			# the source has been replaced (by an undo for example) while the
+			# preview was computed from the previous one
+			return
+		self._cache.add(cache_key, new_pixbuf)
+		self.start_tool_operation(operation)
+		image.set_temp_pixbuf(new_pixbuf)
+		if scale < 1.0:
+			self._low_res_preview(operation['is_selection'], width, height)
+			self._schedule_refinement()
+		else:
+			self.common_end_operation(operation)
+
+	############################################################################
+################################################################################
+
+def _remove_menu_items(menu, targets):
+	"""Remove from `menu`, and from its sections and submenus, the items whose
+	target is in the list `targets`."""
+	for index in range(menu.get_n_items() - 1, -1, -1):
+		for link in (Gio.MENU_LINK_SECTION, Gio.MENU_LINK_SUBMENU):
+			submenu = menu.get_item_link(index, link)
+			if submenu is not None:
+				_remove_menu_items(submenu, targets)
+		target = menu.get_item_attribute_value(index, \
+		                   Gio.MENU_ATTRIBUTE_TARGET, GLib.VariantType.new('s'))
+		if target is not None and target.get_string() in targets:
+			menu.remove(index)
+
 ################################################################################
 
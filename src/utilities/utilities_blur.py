@@ -1,7 +1,12 @@
 # Licensed under GPL3 https://github.com/maoschanz/drawing/blob/master/LICENSE
 
-import cairo, threading
+import cairo, math, os, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from gi.repository import GLib
 # from datetime import datetime # Not actually needed, just to measure perfs
+from .utilities_pixels import numpy, utilities_has_numpy, \
+                              utilities_surface_as_array, \
+                              utilities_surface_is_opaque
 
 class BlurType(int):
 	INVALID = -1
@@ -10,6 +15,7 @@ class BlurType(int):
 	PX_BOX_MULTI = 2
 	CAIRO_REPAINTS = 3
 	TILES = 4
+	GAUSSIAN = 5
 
 class BlurDirection(int):
 	INVALID = -1
@@ -19,56 +25,305 @@ class BlurDirection(int):
 
 ################################################################################
 
-def utilities_blur_surface(surface, radius, blur_type, blur_direction):
+def utilities_blur_surface(surface, radius, blur_type, blur_direction, roi=None):
 	"""This is the 'official' method to access the blur algorithms.
 	The third argument is an integer corresponding to the BlurType enumeration.
-	The 4th one is an integer corresponding to the BlurDirection enumeration."""
+	The 4th one is an integer corresponding to the BlurDirection enumeration.
+	The optional `roi` is a rectangle (x, y, width, height) in pixels: if it's
+	given, only this region is blurred, and the returned surface has its size.
+	Whatever the algorithm, the result is a new surface: `surface` itself is
+	never changed."""
 	radius = int(radius)
+	if roi is not None:
+		return _blur_region(surface, radius, blur_type, blur_direction, roi)
 	if radius < 1:
-		return surface
+		return _get_surface_copy(surface)
 	blurred_surface = None
 	# time0 = datetime.now()
 	# print('blurring begins, using algo ', blur_type, '-', blur_direction)
 
 	if blur_type == BlurType.INVALID:
-		return surface
+		return _get_surface_copy(surface)
 	elif blur_type == BlurType.AUTO:
-		blur_type = BlurType.PX_BOX
-		# XXX c'est nul ça mdr, mais bon c'est peu utilisé
+		blur_type = _get_auto_blur_type(surface, radius, blur_direction)
 
 	if blur_type == BlurType.PX_BOX:
 		blurred_surface = _generic_px_box_blur(surface, radius, blur_direction)
 	elif blur_type == BlurType.PX_BOX_MULTI:
 		blurred_surface = _generic_multi_threaded_blur(surface, radius, blur_direction)
 	elif blur_type == BlurType.CAIRO_REPAINTS:
-		blurred_surface = _generic_cairo_blur(surface, radius, blur_direction)
+		# these algorithms work in place
+		blurred_surface = _get_surface_copy(surface)
+		blurred_surface = _generic_cairo_blur(blurred_surface, radius, \
+		                                                          blur_direction)
 	elif blur_type == BlurType.TILES:
-		blurred_surface = _generic_tiled_blur(surface, radius, blur_direction)
+		blurred_surface = _get_surface_copy(surface)
+		blurred_surface = _generic_tiled_blur(blurred_surface, radius, \
+		                                                          blur_direction)
+	elif blur_type == BlurType.GAUSSIAN:
+		blurred_surface = _generic_gaussian_blur(surface, radius, blur_direction)
 
 	# time1 = datetime.now()
 	# print('blurring ended, total time:', time1 - time0)
 	return blurred_surface
 
+################################################################################
+# Region of interest ###########################################################
+
+def utilities_blur_get_margin(radius, blur_type):
+	"""Return how many pixels around a pixel can change its blurred value."""
+	radius = int(radius)
+	if radius < 1 or blur_type in (BlurType.INVALID, BlurType.TILES):
+		# the tiles are aligned on the region itself
+		return 0
+	if blur_type == BlurType.GAUSSIAN:
+		return sum(_get_gaussian_boxes_radii(radius / 2, 3))
+	return radius
+
+def _blur_region(surface, radius, blur_type, blur_direction, roi):
+	"""Blur the `roi` of `surface`, using the pixels around it (if any) for
+	the context, so the result is the same as if the whole surface had been
+	blurred, while the cost only depends on the size of the region."""
+	x, y, roi_width, roi_height = [int(value) for value in roi]
+	roi_width = max(0, roi_width)
+	roi_height = max(0, roi_height)
+	margin = utilities_blur_get_margin(radius, blur_type)
+	x0 = max(0, x - margin)
+	y0 = max(0, y - margin)
+	x1 = min(surface.get_width(), x + roi_width + margin)
+	y1 = min(surface.get_height(), y + roi_height + margin)
+	if x1 <= x0 or y1 <= y0:
+		# the region is out of the surface
+		return _get_surface_region(surface, x, y, roi_width, roi_height)
+	context = _get_surface_region(surface, x0, y0, x1 - x0, y1 - y0)
+	blurred = utilities_blur_surface(context, radius, blur_type, blur_direction)
+	return _get_surface_region(blurred, x - x0, y - y0, roi_width, roi_height)
+
+def _get_surface_region(surface, x, y, width, height):
+	"""Return a copy of the given rectangle (in pixels) of `surface`."""
+	scale_x, scale_y = surface.get_device_scale()
+	region = cairo.ImageSurface(cairo.Format.ARGB32, width, height)
+	region.set_device_scale(scale_x, scale_y)
+	cairo_context = cairo.Context(region)
+	cairo_context.set_operator(cairo.Operator.SOURCE)
+	cairo_context.set_source_surface(surface, -x / scale_x, -y / scale_y)
+	cairo_context.paint()
+	region.flush()
+	return region
+
+################################################################################
+# BlurType.AUTO ################################################################
+
+# The cost of each algorithm is modeled as a fixed cost plus a cost for each
+# "unit of work", in nanoseconds. A unit is a pixel blurred in one direction,
+# except with CAIRO_REPAINTS, where it's a pixel painted once. These default
+# values are used until they're replaced by the values the micro-benchmark
+# `utilities_blur_calibrate` measures on the actual machine, when the app is
+# idle after its startup.
+_COST_MODEL = {
+	'numpy': {
+		BlurType.PX_BOX: (50000, 30.0),
+		BlurType.PX_BOX_MULTI: (300000, 30.0 / (os.cpu_count() or 1)),
+		BlurType.CAIRO_REPAINTS: (20000, 2.0),
+	},
+	'python': {
+		BlurType.PX_BOX: (50000, 1500.0),
+		BlurType.CAIRO_REPAINTS: (20000, 2.0),
+	},
+}
+_is_cost_model_calibrated = False
+
+# Above this radius, or on surfaces with transparent areas, the artefacts of
+# CAIRO_REPAINTS are too visible for it to be an acceptable choice.
+_CAIRO_MAX_AUTO_RADIUS = 3
+
+_BLUR_TYPES_NAMES = {
+	BlurType.PX_BOX: 'PX_BOX',
+	BlurType.PX_BOX_MULTI: 'PX_BOX_MULTI',
+	BlurType.CAIRO_REPAINTS: 'CAIRO_REPAINTS',
+}
+
+_log_function = None
+
+def utilities_blur_set_logger(log_function):
+	"""The choices made by BlurType.AUTO will be given as strings to this
+	function, which should print them in devel mode only."""
+	global _log_function
+	_log_function = log_function
+
+def _get_backend_name():
+	return 'numpy' if utilities_has_numpy() else 'python'
+
+def _get_nb_units(blur_type, nb_pixels, radius, blur_direction):
+	if blur_direction in [BlurDirection.HORIZONTAL, BlurDirection.VERTICAL]:
+		nb_phases = 1
+	else:
+		nb_phases = 2
+	if blur_type == BlurType.CAIRO_REPAINTS:
+		return nb_pixels * nb_phases * _get_cairo_nb_paints(radius)
+	return nb_pixels * nb_phases
+
+def _estimate_blur_cost(blur_type, nb_pixels, radius, blur_direction):
+	fixed_cost, unit_cost = _COST_MODEL[_get_backend_name()][blur_type]
+	nb_units = _get_nb_units(blur_type, nb_pixels, radius, blur_direction)
+	return fixed_cost + unit_cost * nb_units
+
+def _get_auto_blur_type(surface, radius, blur_direction):
+	"""Pick the fastest acceptable algorithm according to the cost model. The
+	candidates produce (almost) the same result as PX_BOX."""
+	nb_pixels = surface.get_width() * surface.get_height()
+	costs = {}
+	for blur_type in _COST_MODEL[_get_backend_name()].keys():
+		costs[blur_type] = _estimate_blur_cost(blur_type, nb_pixels, radius, \
+		                                                         blur_direction)
+	chosen_type = min(costs, key=costs.get)
+
+	# Checking the alpha channel costs a full reading of the surface, so it's
+	# done only if the result of the check matters.
+	if chosen_type == BlurType.CAIRO_REPAINTS:
+		if radius > _CAIRO_MAX_AUTO_RADIUS \
+		or not utilities_surface_is_opaque(surface):
+			costs.pop(BlurType.CAIRO_REPAINTS)
+			chosen_type = min(costs, key=costs.get)
+
+	if _log_function is not None:
+		_log_function("blur of %spx on %s pixels, estimated to %sms with %s" % \
+		                   (radius, nb_pixels, round(costs[chosen_type] / 1e6, 1), \
+		                                        _BLUR_TYPES_NAMES[chosen_type]))
+	return chosen_type
+
+def utilities_blur_calibrate_when_idle():
+	"""Calibrate the cost model once the application is idle, so the first
+	blur doesn't wait for the micro-benchmark."""
+	if not _is_cost_model_calibrated:
+		GLib.idle_add(_calibrate_if_needed)
+
+def _calibrate_if_needed(*args):
+	"""This is used as a GSourceFunc so it should return False."""
+	if not _is_cost_model_calibrated:
+		utilities_blur_calibrate()
+	return False
+
+def utilities_blur_calibrate():
+	"""Micro-benchmark measuring the actual cost of each candidate of
+	BlurType.AUTO, on this machine and with the available backend, in order to
+	calibrate the cost model. Each algorithm blurs horizontally a small and a
+	bigger noisy surface, which gives its fixed cost and its cost per unit.
+	Returns a human-readable summary of the model."""
+	global _is_cost_model_calibrated
+	_is_cost_model_calibrated = True
+	backend = _get_backend_name()
+	# the pure-python blur is so slow that it needs smaller surfaces
+	sizes = (32, 256) if backend == 'numpy' else (16, 64)
+	radius = _CAIRO_MAX_AUTO_RADIUS
+	direction = BlurDirection.HORIZONTAL
+	summary = []
+	for blur_type in _COST_MODEL[backend].keys():
+		durations = []
+		for size in sizes:
+			surface = cairo.ImageSurface(cairo.Format.ARGB32, size, size)
+			surface.get_data()[:] = os.urandom(size * surface.get_stride())
+			surface.mark_dirty()
+			durations.append(_measure_blur(surface, radius, blur_type, direction))
+		units = [_get_nb_units(blur_type, size * size, radius, direction) \
+		                                                     for size in sizes]
+		unit_cost = max(0.0, (durations[1] - durations[0]) / (units[1] - units[0]))
+		fixed_cost = max(0.0, durations[0] - unit_cost * units[0])
+		_COST_MODEL[backend][blur_type] = (fixed_cost, unit_cost)
+		summary.append("%s: %sµs + %sns/unit" % (_BLUR_TYPES_NAMES[blur_type], \
+		                             round(fixed_cost / 1e3), round(unit_cost, 2)))
+	return ", ".join(summary)
+
+def _measure_blur(surface, radius, blur_type, blur_direction):
+	"""Return the best of 3 measures (in nanoseconds), the others being probably
+	disturbed by something else."""
+	durations = []
+	for i in range(3):
+		time0 = time.perf_counter_ns()
+		utilities_blur_surface(surface, radius, blur_type, blur_direction)
+		durations.append(time.perf_counter_ns() - time0)
+	return min(durations)
+
 ################################################################################
 # BlurType.PX_BOX ##############################################################
 
 def _generic_px_box_blur(surface, radius, blur_direction):
+	if utilities_has_numpy():
+		return _numpy_box_blur(surface, radius, blur_direction)
+	return _python_box_blur(surface, radius, blur_direction)
+
+def _get_surface_copy(surface):
+	w = surface.get_width()
+	h = surface.get_height()
+	copy = cairo.ImageSurface(cairo.Format.ARGB32, w, h)
+	copy.set_device_scale(*surface.get_device_scale())
+	cairo_context = cairo.Context(copy)
+	cairo_context.set_source_surface(surface, 0, 0)
+	cairo_context.paint()
+	copy.flush()
+	return copy
+
+# The vectorized version computes exactly the same values as the pure-python
+# one below, but each phase is a cumulative sum over whole lines of pixels: the
+# sum of the window around a pixel is the difference between 2 values of the
+# cumulative sum, so the cost doesn't depend on the radius.
+
+_NUMPY_CHUNK_SIZE = 1 << 22 # max number of bytes of pixels blurred at once
+
+def _numpy_box_blur(surface, radius, blur_direction):
+	blurred = _get_surface_copy(surface)
+	pixels = utilities_surface_as_array(blurred)
+	if blur_direction != BlurDirection.VERTICAL:
+		_numpy_box_blur_lines(pixels, radius, 1)
+	if blur_direction != BlurDirection.HORIZONTAL:
+		_numpy_box_blur_lines(pixels, radius, 0)
+	blurred.mark_dirty()
+	return blurred
+
+def _numpy_box_blur_lines(pixels, radius, axis, rounded=False):
+	"""Blur in place all the lines of `pixels` along `axis` (1 for horizontal
+	blurring, 0 for vertical blurring). Lines are processed by chunks so the
+	temporary arrays stay reasonably small. Averages are truncated, unless
+	`rounded` is true."""
+	lines_length = pixels.shape[axis]
+	nb_lines = pixels.shape[1 - axis]
+	step = max(1, _NUMPY_CHUNK_SIZE // (lines_length * 4))
+	for first_line in range(0, nb_lines, step):
+		if axis == 1:
+			chunk = pixels[first_line:first_line + step]
+		else:
+			chunk = pixels[:, first_line:first_line + step]
+		_numpy_box_blur_chunk(chunk, radius, axis, rounded)
+
+def _numpy_box_blur_chunk(chunk, radius, axis, rounded):
+	div = 2 * radius + 1
+	length = chunk.shape[axis]
+	# Out of the image, the window uses the value of the nearest edge pixel, as
+	# in the pure-python version. The additional pixel at the beginning makes
+	# the window of the pixel `i` equal to `sums[i + div] - sums[i]`.
+	padding = [(0, 0)] * 3
+	padding[axis] = (radius + 1, radius)
+	padded = numpy.pad(chunk, padding, mode='edge')
+	sums = numpy.cumsum(padded, axis=axis, dtype=numpy.uint32)
+	upper = [slice(None)] * 3
+	upper[axis] = slice(div, div + length)
+	lower = [slice(None)] * 3
+	lower[axis] = slice(0, length)
+	window_sums = sums[tuple(upper)] - sums[tuple(lower)]
+	if rounded:
+		window_sums += radius # which is `div // 2`
+	chunk[...] = window_sums // div
+
+def _python_box_blur(surface, radius, blur_direction):
 	w = surface.get_width()
 	h = surface.get_height()
 	channels = 4 # ARGB
-	if radius > w - 1 or radius > h - 1:
-		return surface
 
 	# this code a modified version of this https://github.com/elementary/granite/blob/14e3aaa216b61f7e63762214c0b36ee97fa7c52b/lib/Drawing/BufferSurface.vala#L230
 	# the main differences (aside of the language) is the poor attempt to use
 	# multithreading (i'm quite sure the access to buffers are not safe at all).
 	# The 2 phases of the algo have been separated to allow directional blur.
-	original = cairo.ImageSurface(cairo.Format.ARGB32, w, h)
-	cairo_context = cairo.Context(original)
-	# cairo_context.set_operator(cairo.Operator.SOURCE)
-	cairo_context.set_source_surface(surface, 0, 0)
-	cairo_context.paint() # XXX is this copy useful?
-	original.flush()
+	original = _get_surface_copy(surface)
 	pixels = original.get_data()
 
 	buffer0 = [None] * (w * h * channels)
@@ -110,12 +365,14 @@ def _box_blur_1st_phase(w, h, channels, radius, pixels, buff0, vmin, vmax, dv):
 		rsum = radius * pixels[cur_pixel + 1]
 		gsum = radius * pixels[cur_pixel + 2]
 		bsum = radius * pixels[cur_pixel + 3]
+		# out of the image, the window uses the value of the nearest edge
+		# pixel, even if the radius is larger than the image
 		for i in range(0, radius+1):
+			cur_pixel = (y * w + min(i, w - 1)) * channels
 			asum += pixels[cur_pixel + 0]
 			rsum += pixels[cur_pixel + 1]
 			gsum += pixels[cur_pixel + 2]
 			bsum += pixels[cur_pixel + 3]
-			cur_pixel += channels
 		cur_pixel = y * w * channels
 		for x in range(0, w):
 			p1 = (y * w + vmin[x]) * channels
@@ -142,11 +399,11 @@ def _box_blur_2nd_phase(w, h, channels, radius, pixels, buff0, vmin, vmax, dv):
 		gsum = radius * buff0[cur_pixel + 2]
 		bsum = radius * buff0[cur_pixel + 3]
 		for i in range(0, radius+1):
+			cur_pixel = (x + min(i, h - 1) * w) * channels
 			asum += buff0[cur_pixel + 0]
 			rsum += buff0[cur_pixel + 1]
 			gsum += buff0[cur_pixel + 2]
 			bsum += buff0[cur_pixel + 3]
-			cur_pixel += w * channels
 		cur_pixel = x * channels
 		for y in range(0, h):
 			p1 = (x + vmin[y]) * channels
@@ -164,100 +421,105 @@ def _box_blur_2nd_phase(w, h, channels, radius, pixels, buff0, vmin, vmax, dv):
 ################################################################################
 # BlurType.PX_BOX_MULTI ########################################################
 
-def _generic_multi_threaded_blur(surface, radius, blur_direction):
-	"""Experimental multi-threaded blur. The parameter `blur_direction` will be
-	ignored (it always blurs in both directions)."""
-	w = surface.get_width()
-	h = surface.get_height()
-	channels = 4 # ARGB
-	if radius > w - 1 or radius > h - 1:
-		return
-
-	original = cairo.ImageSurface(cairo.Format.ARGB32, w, h)
-	cairo_context = cairo.Context(original)
-	# cairo_context.set_operator(cairo.Operator.SOURCE)
-	cairo_context.set_source_surface(surface, 0, 0)
-	cairo_context.paint()
-	original.flush()
-	pixels = original.get_data()
-
-	buffer0 = [None] * (w * h * channels)
-	vmin = [None] * max(w, h)
-	vmax = [None] * max(w, h)
-	div = 2 * radius + 1
-	dv = [None] * (256 * div)
-	for i in range(0, len(dv)):
-		dv[i] = int(i / div)
+# NumPy releases the GIL during its computations, so the lines of each phase of
+# the vectorized box blur can be split in bands blurred by several threads at
+# the same time, directly in the memory of the new surface. The lines are
+# independent from each other so the result is the same as with PX_BOX.
 
-	full_buff = _box_blur_1st_phase_multi(w, h, channels, radius, pixels, vmin, vmax, dv)
-	# print('end of the 1st phase…', datetime.now() - time0)
-	_box_blur_2nd_phase(w, h, channels, radius, pixels, full_buff, vmin, vmax, dv)
+# The threads are created once, when the first multi-threaded blur happens, and
+# reused by all the following ones (the previews of a filter blur the image each
+# time the radius changes).
+_executor = None
+_executor_lock = threading.Lock()
 
-	return original
+def _get_executor():
+	global _executor
+	with _executor_lock:
+		if _executor is None:
+			_executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 1)
+		return _executor
 
-# this code a modified version of a naïve approach to box blur, copied from
-# here: https://github.com/elementary/granite/blob/14e3aaa216b61f7e63762214c0b36ee97fa7c52b/lib/Drawing/BufferSurface.vala#L230
-# the main differences (aside of the language) is the poor attempt to use
-# multithreading (i'm quite sure the access to buffers are not safe at all)
-# during the first phase. Multithreading of the second phase has not even been
-# tried because this multithreaded version is slower than _box_blur_1st_phase
-
-def _box_blur_1st_phase_multi(w, h, channels, radius, pixels, vmin, vmax, dv):
-	NB_THREADS = 4
-	t1 = [None] * NB_THREADS
-	full_buffer = []
-	buffers = []
-	y_end = 0
-	for x in range(0, w):
-		vmin[x] = min(x + radius + 1, w - 1)
-		vmax[x] = max(x - radius, 0)
-	for t in range(0, NB_THREADS):
-		y_start = y_end
-		if t == NB_THREADS - 1:
-			y_end = h
+def _generic_multi_threaded_blur(surface, radius, blur_direction):
+	if not utilities_has_numpy():
+		# pure-python threads would hold the GIL, so they can't be faster
+		return _python_box_blur(surface, radius, blur_direction)
+	blurred = _get_surface_copy(surface)
+	pixels = utilities_surface_as_array(blurred)
+	nb_threads = os.cpu_count() or 1
+	executor = _get_executor()
+	if blur_direction != BlurDirection.VERTICAL:
+		_box_blur_phase_multi(executor, nb_threads, pixels, radius, 1)
+	if blur_direction != BlurDirection.HORIZONTAL:
+		_box_blur_phase_multi(executor, nb_threads, pixels, radius, 0)
+	blurred.mark_dirty()
+	return blurred
+
+def _box_blur_phase_multi(executor, nb_threads, pixels, radius, axis):
+	"""Split the rows (horizontal phase, `axis` is 1) or the columns (vertical
+	phase, `axis` is 0) in one band per thread, and wait for all of them to be
+	blurred before returning."""
+	nb_lines = pixels.shape[1 - axis]
+	band_size = max(1, math.ceil(nb_lines / nb_threads))
+	futures = []
+	for first_line in range(0, nb_lines, band_size):
+		if axis == 1:
+			band = pixels[first_line:first_line + band_size]
 		else:
-			y_end = y_start + int(h / NB_THREADS)
-		buff_size = w * (y_end - y_start) * channels
-		buff = [0] * buff_size
-		buffers.append(buff)
-		t1[t] = threading.Thread(target=_blur_rows3, args=(x, y_start, y_end, \
-		                     w, channels, radius, pixels, buff, vmin, vmax, dv))
-	for t in range(0, NB_THREADS):
-		t1[t].start()
-	for t in range(0, NB_THREADS):
-		t1[t].join()
-		full_buffer += buffers[t]
-	return full_buffer
-
-def _blur_rows3(x, y0, y1, w, channels, radius, pixels, buff0, vmin, vmax, dv):
-	# print('row thread with', y0, y1, '(begin)')
-	diff = y0 * w * channels
-	for y in range(y0, y1):
-		cur_pixel = y * w * channels
-		asum = radius * pixels[cur_pixel + 0]
-		rsum = radius * pixels[cur_pixel + 1]
-		gsum = radius * pixels[cur_pixel + 2]
-		bsum = radius * pixels[cur_pixel + 3]
-		for i in range(0, radius+1):
-			asum += pixels[cur_pixel + 0]
-			rsum += pixels[cur_pixel + 1]
-			gsum += pixels[cur_pixel + 2]
-			bsum += pixels[cur_pixel + 3]
-			cur_pixel += channels
-		cur_pixel = y * w * channels - diff
-		for x in range(0, w):
-			p1 = (y * w + vmin[x]) * channels
-			p2 = (y * w + vmax[x]) * channels
-			buff0[cur_pixel + 0] = dv[asum]
-			buff0[cur_pixel + 1] = dv[rsum]
-			buff0[cur_pixel + 2] = dv[gsum]
-			buff0[cur_pixel + 3] = dv[bsum]
-			asum += pixels[p1 + 0] - pixels[p2 + 0]
-			rsum += pixels[p1 + 1] - pixels[p2 + 1]
-			gsum += pixels[p1 + 2] - pixels[p2 + 2]
-			bsum += pixels[p1 + 3] - pixels[p2 + 3]
-			cur_pixel += channels
-	# print('row thread with', y0, y1, '(end)')
+			band = pixels[:, first_line:first_line + band_size]
+		futures.append(executor.submit(_numpy_box_blur_lines, band, radius, axis))
+	for future in futures:
+		future.result() # raises again the exceptions of the thread, if any
+
+################################################################################
+# BlurType.GAUSSIAN ############################################################
+
+# Three successive box blurs approximate a gaussian blur quite well, as long as
+# the sizes of the boxes are chosen so the variance of the result is the one of
+# the wanted gaussian (http://blog.ivank.net/fastest-gaussian-blur.html). Since
+# the cost of a box blur doesn't depend on its radius, neither does this one.
+# The blurred values are premultiplied by the alpha channel, so transparent
+# areas don't bleed black into the colors around them.
+
+def _generic_gaussian_blur(surface, radius, blur_direction):
+	# the radius given by the user is considered to be twice the deviation
+	boxes_radii = _get_gaussian_boxes_radii(radius / 2, 3)
+	if not utilities_has_numpy():
+		blurred = surface
+		for box_radius in boxes_radii:
+			if box_radius > 0:
+				blurred = _python_box_blur(blurred, box_radius, blur_direction)
+		if blurred is surface:
+			return _get_surface_copy(surface)
+		return blurred
+
+	blurred = _get_surface_copy(surface)
+	pixels = utilities_surface_as_array(blurred)
+	for box_radius in boxes_radii:
+		if box_radius < 1:
+			continue
+		# Truncating the averages 3 times would visibly darken the image
+		if blur_direction != BlurDirection.VERTICAL:
+			_numpy_box_blur_lines(pixels, box_radius, 1, True)
+		if blur_direction != BlurDirection.HORIZONTAL:
+			_numpy_box_blur_lines(pixels, box_radius, 0, True)
+	blurred.mark_dirty()
+	return blurred
+
+def _get_gaussian_boxes_radii(deviation, nb_boxes):
+	"""Return the radii of the `nb_boxes` successive box blurs approximating a
+	gaussian blur whose standard deviation is `deviation`."""
+	variance = 12 * deviation * deviation
+	ideal_width = math.sqrt((variance / nb_boxes) + 1)
+	lower_width = int(ideal_width)
+	if lower_width % 2 == 0:
+		lower_width -= 1
+	upper_width = lower_width + 2
+	# number of boxes which have to use the lower width
+	nb_lower = (variance - nb_boxes * lower_width * lower_width \
+	           - 4 * nb_boxes * lower_width - 3 * nb_boxes) / (-4 * lower_width - 4)
+	nb_lower = max(0, min(nb_boxes, round(nb_lower)))
+	widths = [lower_width] * nb_lower + [upper_width] * (nb_boxes - nb_lower)
+	return [int((width - 1) / 2) for width in widths]
 
 ################################################################################
 # BlurType.CAIRO_REPAINTS ######################################################
@@ -278,16 +540,22 @@ def _generic_cairo_blur(surface, radius, blur_direction):
 # blurred, and with amazing performances, but the quality is not convincing and
 # the result when the area has (semi-)transparency really sucks.
 
+def _get_cairo_nb_paints(radius):
+	return len(range(-1 * radius, radius, _get_cairo_blur_step(radius)))
+
+def _get_cairo_blur_step(radius):
+	if radius < 15:
+		return 1
+	return int(radius / 6) # why 6? mystery
+
 def _cairo_directional_blur(surface, radius, is_vertical):
 	cairo_context = cairo.Context(surface)
+	step = _get_cairo_blur_step(radius)
 	if radius < 10:
-		step = 1
 		alpha = min(0.9, step / radius)
 	elif radius < 15:
-		step = 1
 		alpha = min(0.9, (0.5 + step) / radius)
 	else:
-		step = int(radius / 6) # why 6? mystery
 		# cette optimisation donne de légers glitchs aux grands radius, qui ne
 		# sont de toutes manières pas beaux car on voit en partie à travers
 		alpha = min(0.9, (1 + step) / radius)
@@ -316,37 +584,85 @@ def _generic_tiled_blur(surface, radius, blur_direction):
 	return _get_tiled_surface(surface, tile_width, tile_height)
 
 def _get_tiled_surface(surface, tile_width, tile_height):
+	"""Replace each tile of `surface` by the average color of its pixels. The
+	tiles on the right and bottom edges can be smaller than the others."""
+	tile_width = max(1, tile_width)
+	tile_height = max(1, tile_height)
+	if surface.get_width() == 0 or surface.get_height() == 0:
+		return surface
+	if utilities_has_numpy():
+		_numpy_tiles(surface, tile_width, tile_height)
+	else:
+		_python_tiles(surface, tile_width, tile_height)
+	surface.mark_dirty()
+	return surface
+
+# The pixels are premultiplied, so the averages of the color channels are
+# naturally weighted by the alpha values of the pixels.
+
+def _numpy_tiles(surface, tile_width, tile_height):
+	pixels = utilities_surface_as_array(surface)
+	h, w = pixels.shape[:2]
+	# sizes of each row and column of tiles, the last ones may be partial
+	heights = _get_tiles_sizes(h, tile_height)
+	widths = _get_tiles_sizes(w, tile_width)
+
+	sums = _numpy_sum_by_tiles(pixels, tile_height, 0)
+	sums = _numpy_sum_by_tiles(sums, tile_width, 1)
+	counts = numpy.outer(heights, widths).astype(numpy.uint32)[..., None]
+	means = ((sums + counts // 2) // counts).astype(numpy.uint8)
+
+	means = numpy.repeat(means, heights, axis=0)
+	pixels[:] = numpy.repeat(means, widths, axis=1)
+
+def _get_tiles_sizes(length, tile_size):
+	sizes = numpy.full(-(-length // tile_size), tile_size)
+	sizes[-1] = length - tile_size * (len(sizes) - 1)
+	return sizes
+
+def _numpy_sum_by_tiles(array, tile_size, axis):
+	"""Sum the values of `array` by groups of `tile_size` consecutive lines
+	along `axis` (the last group may be smaller). Splitting the axis in two
+	is way faster than `numpy.add.reduceat` on large images."""
+	length = array.shape[axis]
+	full_length = length - (length % tile_size)
+	if axis == 0:
+		full_part, rest = array[:full_length], array[full_length:]
+	else:
+		full_part, rest = array[:, :full_length], array[:, full_length:]
+	shape = array.shape[:axis] + (full_length // tile_size, tile_size) + \
+	                                                      array.shape[axis + 1:]
+	sums = full_part.reshape(shape).sum(axis=axis + 1, dtype=numpy.uint32)
+	if full_length == length:
+		return sums
+	rest = rest.sum(axis=axis, keepdims=True, dtype=numpy.uint32)
+	return numpy.concatenate((sums, rest), axis=axis)
+
+def _python_tiles(surface, tile_width, tile_height):
 	w = surface.get_width()
 	h = surface.get_height()
-	channels = 4 # ARGB
+	stride = surface.get_stride()
+	surface.flush()
 	pixels = surface.get_data()
-	pixel_max = w * h * channels
-
-	for x in range(0, w, tile_width):
-		for y in range(0, h, tile_height):
-			current_pixel = (x + (w * y)) * channels
-			if current_pixel >= pixel_max:
-				continue
-			tile_b = pixels[current_pixel + 0]
-			tile_g = pixels[current_pixel + 1]
-			tile_r = pixels[current_pixel + 2]
-			tile_a = pixels[current_pixel + 3]
-			for tx in range(0, tile_width):
-				for ty in range(0, tile_height):
-					current_pixel = ((x + tx) + (w * (y + ty))) * channels
-					if current_pixel >= pixel_max:
-						continue
-					if current_pixel >= (w * (y + ty + 1)) * channels:
-						# the current tile is out of the surface, this guard
-						# clause avoids corrupting the next tile
-						continue
-					pixels[current_pixel + 0] = tile_b
-					pixels[current_pixel + 1] = tile_g
-					pixels[current_pixel + 2] = tile_r
-					pixels[current_pixel + 3] = tile_a
-			# end of one tile
-	# end of the "for each tile"
-	return surface
+	for y0 in range(0, h, tile_height):
+		y1 = min(y0 + tile_height, h)
+		sums = [0] * (4 * w)
+		for y in range(y0, y1):
+			row = pixels[y * stride:y * stride + 4 * w]
+			for x0 in range(0, w, tile_width):
+				x1 = min(x0 + tile_width, w)
+				for c in range(4):
+					sums[4 * x0 + c] += sum(row[4 * x0 + c:4 * x1:4])
+		# build the row of averaged pixels once, and copy it on each line
+		averaged_row = bytearray()
+		for x0 in range(0, w, tile_width):
+			x1 = min(x0 + tile_width, w)
+			count = (x1 - x0) * (y1 - y0)
+			tile_color = bytes((sums[4 * x0 + c] + count // 2) // count \
+			                                               for c in range(4))
+			averaged_row += tile_color * (x1 - x0)
+		for y in range(y0, y1):
+			pixels[y * stride:y * stride + 4 * w] = averaged_row
 
 ################################################################################
 
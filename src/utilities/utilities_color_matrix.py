@@ -0,0 +1,167 @@
+# Licensed under GPL3 https://github.com/maoschanz/drawing/blob/master/LICENSE
+
+import math
+from gi.repository import GdkPixbuf, GLib
+from .utilities_pixels import numpy, utilities_has_numpy, \
+                              utilities_surface_as_array, RGBA_INDICES, \
+                              NoNumpyException
+
+# A color matrix is a list of 4 rows (red, green, blue, alpha) of 5 floats: the
+# new value of a channel is the sum of the 4 unpremultiplied values of the
+# pixel (between 0 and 1) weighted by the first 4 items of the row, plus the
+# last item of the row. The results are clamped between 0 and 1.
+
+# Number of pixels processed at once, to keep the arrays of floats reasonably
+# small.
+_NUMPY_CHUNK_SIZE = 1 << 20
+
+# Weights of the channels in the intensity of a color, as used by GdkPixbuf
+_INTENSITY = [0.30, 0.59, 0.11]
+# Weights of the channels in the luminance of a color (sRGB/Rec. 709)
+_LUMINANCE = [0.2126, 0.7152, 0.0722]
+
+################################################################################
+
+def utilities_color_matrix_get_identity():
+	return [[1.0 if column == row else 0.0 for column in range(5)] \
+	                                                     for row in range(4)]
+
+def utilities_color_matrix_compose(first_matrix, second_matrix):
+	"""Return a single matrix equivalent to `first_matrix` followed by
+	`second_matrix` (ignoring the clamping between both)."""
+	first = _get_homogeneous(first_matrix)
+	second = _get_homogeneous(second_matrix)
+	return [[sum(second[row][k] * first[k][column] for k in range(5)) \
+	                          for column in range(5)] for row in range(4)]
+
+def utilities_color_matrix_mix(matrix, amount):
+	"""Return the matrix whose effect is `amount` (between 0 and 1) times the
+	effect of `matrix`."""
+	identity = utilities_color_matrix_get_identity()
+	return [[i + amount * (m - i) for i, m in zip(identity_row, matrix_row)] \
+	                     for identity_row, matrix_row in zip(identity, matrix)]
+
+def _get_homogeneous(matrix):
+	return [list(row) for row in matrix] + [[0.0, 0.0, 0.0, 0.0, 1.0]]
+
+def _get_rgb_matrix(rgb_rows):
+	"""Return the color matrix using the 3x3 `rgb_rows` for the colors, without
+	changing the alpha channel."""
+	matrix = [list(row) + [0.0, 0.0] for row in rgb_rows]
+	return matrix + [[0.0, 0.0, 0.0, 1.0, 0.0]]
+
+################################################################################
+# Presets ######################################################################
+
+def utilities_color_matrix_saturation(saturation):
+	"""Return the matrix changing the saturation like
+	`GdkPixbuf.Pixbuf.saturate_and_pixelate` (without pixelation): 0 gives a
+	grayscale image, 1 doesn't change anything."""
+	return _get_rgb_matrix([[(1 - saturation) * weight + \
+	                                  (saturation if row == column else 0) \
+	                                  for column, weight in enumerate(_INTENSITY)] \
+	                                                       for row in range(3)])
+
+def utilities_color_matrix_grayscale():
+	return _get_rgb_matrix([_LUMINANCE] * 3)
+
+def utilities_color_matrix_sepia():
+	return _get_rgb_matrix([
+		[0.393, 0.769, 0.189],
+		[0.349, 0.686, 0.168],
+		[0.272, 0.534, 0.131],
+	])
+
+def utilities_color_matrix_hue_rotation(degrees):
+	"""Return the matrix rotating the hue of the colors by `degrees`, keeping
+	their luminance (it's the 'hueRotate' matrix of SVG filters)."""
+	cos = math.cos(math.radians(degrees))
+	sin = math.sin(math.radians(degrees))
+	lr, lg, lb = _LUMINANCE
+	return _get_rgb_matrix([
+		[lr + cos * (1 - lr) - sin * lr, lg - cos * lg - sin * lg, \
+		                                         lb - cos * lb + sin * (1 - lb)],
+		[lr - cos * lr + sin * 0.143, lg + cos * (1 - lg) + sin * 0.140, \
+		                                         lb - cos * lb - sin * 0.283],
+		[lr - cos * lr - sin * (1 - lr), lg - cos * lg + sin * lg, \
+		                                         lb + cos * (1 - lb) + sin * lb],
+	])
+
+def utilities_color_matrix_channels_rotation():
+	"""Return the matrix giving the red value to the green channel, the green
+	value to the blue channel, and the blue value to the red channel."""
+	return _get_rgb_matrix([[0, 0, 1], [1, 0, 0], [0, 1, 0]])
+
+def utilities_color_matrix_inversion():
+	matrix = _get_rgb_matrix([[-1, 0, 0], [0, -1, 0], [0, 0, -1]])
+	for row in range(3):
+		matrix[row][4] = 1.0
+	return matrix
+
+################################################################################
+# Application to the pixels ####################################################
+
+def utilities_color_matrix_apply_to_pixbuf(pixbuf, matrix):
+	"""Return a new pixbuf whose pixels have been changed by `matrix`, with a
+	single matrix multiplication for each chunk of rows. It needs NumPy."""
+	if not utilities_has_numpy():
+		raise NoNumpyException()
+	width = pixbuf.get_width()
+	height = pixbuf.get_height()
+	rowstride = pixbuf.get_rowstride()
+	n_channels = pixbuf.get_n_channels()
+	# the last row of a pixbuf may not have the padding of the others
+	pixels = bytearray(pixbuf.get_pixels())
+	pixels.extend(bytes(rowstride * height - len(pixels)))
+	array = numpy.frombuffer(pixels, dtype=numpy.uint8)
+	array = array.reshape(height, rowstride)[:, :width * n_channels]
+	array = array.reshape(height, width, n_channels)
+
+	weights, offsets = _get_weights_and_offsets(matrix)
+	if n_channels == 3:
+		# all the pixels are opaque (255 in bytes), so the weights of the alpha
+		# channel are like offsets
+		offsets = offsets[:3] + weights[3, :3] * 255
+		weights = weights[:3, :3]
+	rows_step = max(1, _NUMPY_CHUNK_SIZE // max(1, width))
+	for first_row in range(0, height, rows_step):
+		chunk = array[first_row:first_row + rows_step]
+		values = chunk.astype(numpy.float32) @ weights + offsets
+		chunk[...] = _to_bytes(values)
+
+	return GdkPixbuf.Pixbuf.new_from_bytes(GLib.Bytes.new(pixels), \
+	                   pixbuf.get_colorspace(), pixbuf.get_has_alpha(), \
+	                   pixbuf.get_bits_per_sample(), width, height, rowstride)
+
+def utilities_color_matrix_apply_to_surface(surface, matrix):
+	"""Change in place the pixels of `surface` using `matrix`. It needs NumPy.
+	The colors are unpremultiplied before being changed, and premultiplied by
+	the new alpha values afterwards."""
+	if not utilities_has_numpy():
+		raise NoNumpyException()
+	weights, offsets = _get_weights_and_offsets(matrix)
+	pixels = utilities_surface_as_array(surface)
+	rows_step = max(1, _NUMPY_CHUNK_SIZE // max(1, pixels.shape[1]))
+	for first_row in range(0, pixels.shape[0], rows_step):
+		chunk = pixels[first_row:first_row + rows_step]
+		values = chunk[..., RGBA_INDICES].astype(numpy.float32)
+		alpha = values[..., 3:]
+		values[..., :3] *= 255 / numpy.maximum(alpha, 1)
+		values = values @ weights + offsets
+		numpy.clip(values, 0, 255, out=values)
+		values[..., :3] *= values[..., 3:] / 255
+		chunk[..., RGBA_INDICES] = _to_bytes(values)
+	surface.mark_dirty()
+
+def _get_weights_and_offsets(matrix):
+	"""Return the transposed 4x4 matrix of the weights (so the rows of pixels
+	can be multiplied by it), and the offsets scaled to the 0-255 range."""
+	matrix = numpy.array(matrix, dtype=numpy.float32)
+	return matrix[:, :4].T.copy(), matrix[:, 4] * 255
+
+def _to_bytes(values):
+	numpy.clip(values, 0, 255, out=values)
+	return (values + 0.5).astype(numpy.uint8)
+
+################################################################################
+
@@ -2,7 +2,6 @@
 
 from gi.repository import Gdk
 
-from .utilities_paths import utilities_get_rgba_for_xy
 
 ################################################################################
 
@@ -54,8 +53,8 @@ def utilities_gdk_rgba_to_hexadecimal(gdk_rgba):
 
 ################################################################################
 
-def utilities_gdk_rgba_from_xy(surface, event_x, event_y):
-	rgba_vals = utilities_get_rgba_for_xy(surface, event_x, event_y)
+def utilities_gdk_rgba_from_xy(pixel_sampler, event_x, event_y):
+	rgba_vals = pixel_sampler.get_rgba(event_x, event_y)
 	if rgba_vals is None:
 		return # event outside of the surface
 	rgba_vals = [*rgba_vals]
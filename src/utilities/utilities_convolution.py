@@ -0,0 +1,133 @@
+# Licensed under GPL3 https://github.com/maoschanz/drawing/blob/master/LICENSE
+
+import cairo, math
+from .utilities_pixels import numpy, utilities_has_numpy, \
+                              utilities_surface_as_array, ALPHA_INDEX, \
+                              NoNumpyException
+
+# Number of pixels of the image processed at once, to keep the temporary
+# arrays (whose values are floats) reasonably small.
+_CHUNK_SIZE = 1 << 20
+
+# Non-separable kernels with more values than this are applied in the
+# frequency domain, where the cost doesn't depend on the size of the kernel.
+_FFT_MIN_KERNEL_SIZE = 11 * 11
+
+################################################################################
+
+def utilities_convolve_surface(surface, kernel, bias=0.0):
+	"""Return a new surface where the color channels of `surface` have been
+	replaced by the sum of the values around each pixel, weighted by `kernel`
+	(a 2D list, or array, whose sizes are odd), plus `bias` (in the 0-255
+	range). The alpha channel isn't changed, and the colors are processed
+	unpremultiplied. At the edges of the image, the outermost pixels are
+	repeated. It needs NumPy."""
+	if not utilities_has_numpy():
+		raise NoNumpyException()
+	kernel = _get_odd_kernel(kernel)
+	convolve_band = _get_band_convolution(kernel)
+	radius_y = kernel.shape[0] // 2
+	radius_x = kernel.shape[1] // 2
+
+	width = surface.get_width()
+	height = surface.get_height()
+	new_surface = cairo.ImageSurface(cairo.Format.ARGB32, width, height)
+	new_surface.set_device_scale(*surface.get_device_scale())
+	if width == 0 or height == 0:
+		return new_surface
+	source = utilities_surface_as_array(surface)
+	result = utilities_surface_as_array(new_surface)
+	colors = [i for i in range(4) if i != ALPHA_INDEX]
+
+	rows_step = max(1, _CHUNK_SIZE // width)
+	for y0 in range(0, height, rows_step):
+		y1 = min(height, y0 + rows_step)
+		# the band is computed with the rows around it (if they exist)
+		top = max(0, y0 - radius_y)
+		bottom = min(height, y1 + radius_y)
+		band = _unpremultiply(source[top:bottom], colors)
+		padding = ((radius_y - (y0 - top), radius_y - (bottom - y1)), \
+		                                      (radius_x, radius_x), (0, 0))
+		band = numpy.pad(band, padding, mode='edge')
+
+		convolved = convolve_band(band, y1 - y0, width)
+		convolved += bias
+		numpy.clip(convolved, 0, 255, out=convolved)
+		alpha = source[y0:y1, :, ALPHA_INDEX]
+		convolved *= alpha[..., None] / numpy.float32(255)
+		result[y0:y1, :, colors] = (convolved + 0.5).astype(numpy.uint8)
+		result[y0:y1, :, ALPHA_INDEX] = alpha
+
+	new_surface.mark_dirty()
+	return new_surface
+
+def utilities_get_gaussian_kernel(radius):
+	"""Return a 1D gaussian kernel (normalized) whose standard deviation is
+	half of `radius`, and whose size is `2 * radius + 1`."""
+	radius = max(1, int(radius))
+	deviation = radius / 2
+	values = [math.exp(-(x * x) / (2 * deviation * deviation)) \
+	                                     for x in range(-radius, radius + 1)]
+	total = sum(values)
+	return [value / total for value in values]
+
+################################################################################
+
+def _get_odd_kernel(kernel):
+	kernel = numpy.array(kernel, dtype=numpy.float64, ndmin=2)
+	# a kernel with an even size is completed with zeros, so it has a center
+	padding = ((0, 1 - kernel.shape[0] % 2), (0, 1 - kernel.shape[1] % 2))
+	return numpy.pad(kernel, padding)
+
+def _unpremultiply(pixels, colors):
+	alpha = pixels[..., ALPHA_INDEX].astype(numpy.float32)
+	factor = numpy.float32(255) / numpy.maximum(alpha, 1)
+	return pixels[..., colors].astype(numpy.float32) * factor[..., None]
+
+def _get_band_convolution(kernel):
+	"""Choose the fastest way to apply `kernel`: as 2 successive 1D kernels if
+	it's separable, in the frequency domain if it's large, or directly."""
+	column, row = _get_separated_kernel(kernel)
+	if column is not None:
+		return lambda band, h, w: _convolve_separable(band, column, row, h, w)
+	if kernel.size >= _FFT_MIN_KERNEL_SIZE:
+		return lambda band, h, w: _convolve_fft(band, kernel, h, w)
+	return lambda band, h, w: _convolve_direct(band, kernel, h, w)
+
+def _get_separated_kernel(kernel):
+	"""If `kernel` is the outer product of a column and a row (its rank is 1),
+	return them. Otherwise, return (None, None)."""
+	u, s, vt = numpy.linalg.svd(kernel)
+	if s[0] == 0 or (len(s) > 1 and s[1] > s[0] * 1e-9):
+		return None, None
+	return u[:, 0] * s[0], vt[0]
+
+# The following functions take a band of pixels padded with the values needed
+# around it, and return the (height, width, 3) convolved colors.
+
+def _convolve_direct(band, kernel, height, width):
+	result = numpy.zeros((height, width, 3), dtype=numpy.float32)
+	for i, j in zip(*numpy.nonzero(kernel)):
+		result += numpy.float32(kernel[i, j]) * band[i:i + height, j:j + width]
+	return result
+
+def _convolve_separable(band, column, row, height, width):
+	rows_result = numpy.zeros((band.shape[0], width, 3), dtype=numpy.float32)
+	for j in numpy.nonzero(row)[0]:
+		rows_result += numpy.float32(row[j]) * band[:, j:j + width]
+	result = numpy.zeros((height, width, 3), dtype=numpy.float32)
+	for i in numpy.nonzero(column)[0]:
+		result += numpy.float32(column[i]) * rows_result[i:i + height]
+	return result
+
+def _convolve_fft(band, kernel, height, width):
+	kh, kw = kernel.shape
+	shape = (band.shape[0] + kh - 1, band.shape[1] + kw - 1)
+	# the kernel is flipped because it's a correlation, not a convolution
+	kernel_fft = numpy.fft.rfft2(kernel[::-1, ::-1], shape)
+	band_fft = numpy.fft.rfft2(band, shape, axes=(0, 1))
+	full = numpy.fft.irfft2(band_fft * kernel_fft[..., None], shape, axes=(0, 1))
+	return full[kh - 1:kh - 1 + height, kw - 1:kw - 1 + width].astype(numpy.float32)
+
+################################################################################
+
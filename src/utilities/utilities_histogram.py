@@ -0,0 +1,119 @@
+# Licensed under GPL3 https://github.com/maoschanz/drawing/blob/master/LICENSE
+
+import math
+from collections import Counter
+from .utilities_pixels import numpy, utilities_has_numpy
+
+# The histograms of an image are a list of 4 lists (for the red, green, blue
+# and alpha channels) of 256 integers: the numbers of pixels having each value.
+
+# Number of pixels counted at once by the vectorized version, to keep the
+# array of indices reasonably small.
+_NUMPY_CHUNK_SIZE = 1 << 20
+
+################################################################################
+
+def utilities_histogram_get_empty():
+	return [[0] * 256 for c in range(4)]
+
+def utilities_histogram_of_pixbuf(pixbuf, rectangle=None):
+	"""Return the histograms of `pixbuf`, computed in one pass over its pixels.
+	If `rectangle` (x, y, width, height) is given, only the pixels inside it
+	are counted. Pixbufs aren't premultiplied, so the values of the color
+	channels are the actual colors, even for transparent pixels."""
+	if rectangle is not None:
+		x0, y0, x1, y1 = _get_clamped_rectangle(pixbuf, rectangle)
+		if x1 <= x0 or y1 <= y0:
+			return utilities_histogram_get_empty()
+		pixbuf = pixbuf.new_subpixbuf(x0, y0, x1 - x0, y1 - y0)
+	width = pixbuf.get_width()
+	height = pixbuf.get_height()
+	rowstride = pixbuf.get_rowstride()
+	n_channels = pixbuf.get_n_channels()
+	# the last row of a pixbuf may not have the padding of the others
+	pixels = pixbuf.get_pixels()
+	if utilities_has_numpy():
+		histograms = _numpy_histograms(pixels, width, height, rowstride, \
+		                                                           n_channels)
+	else:
+		histograms = _python_histograms(pixels, width, height, rowstride, \
+		                                                           n_channels)
+	if n_channels == 3:
+		histograms.append([0] * 255 + [width * height])
+	return histograms
+
+def utilities_histogram_update(histograms, old_histograms, new_histograms):
+	"""Update in place `histograms` after a part of the image, whose histograms
+	were `old_histograms`, has been replaced by pixels whose histograms are
+	`new_histograms`."""
+	for channel, old_channel, new_channel in \
+	                         zip(histograms, old_histograms, new_histograms):
+		for value in range(256):
+			channel[value] += new_channel[value] - old_channel[value]
+
+################################################################################
+
+def utilities_histogram_get_mean(histogram):
+	"""Return the average value of a channel, or None if there is no pixel."""
+	total = sum(histogram)
+	if total == 0:
+		return None
+	return sum(value * count for value, count in enumerate(histogram)) / total
+
+def utilities_histogram_get_bounds(histograms, clipped_ratio=0.0):
+	"""Return the lowest and the highest values of the color channels, once the
+	darkest and the lightest `clipped_ratio` of the values have been ignored.
+	It returns (0, 255) if there is no pixel."""
+	combined = [sum(values) for values in zip(*histograms[:3])]
+	clipped_count = sum(combined) * clipped_ratio
+	lowest = _get_first_value_above(combined, clipped_count)
+	highest = 255 - _get_first_value_above(combined[::-1], clipped_count)
+	if lowest is None or highest < lowest:
+		return 0, 255
+	return lowest, highest
+
+def _get_first_value_above(histogram, clipped_count):
+	accumulated = 0
+	for value, count in enumerate(histogram):
+		accumulated += count
+		if accumulated > clipped_count:
+			return value
+	return None
+
+################################################################################
+
+def _get_clamped_rectangle(pixbuf, rectangle):
+	x, y, width, height = rectangle
+	x0 = max(0, math.floor(x))
+	y0 = max(0, math.floor(y))
+	x1 = min(pixbuf.get_width(), math.ceil(x + width))
+	y1 = min(pixbuf.get_height(), math.ceil(y + height))
+	return x0, y0, x1, y1
+
+def _numpy_histograms(pixels, width, height, rowstride, n_channels):
+	array = numpy.frombuffer(pixels, dtype=numpy.uint8)
+	array = numpy.pad(array, (0, rowstride * height - array.size))
+	array = array.reshape(height, rowstride)[:, :width * n_channels]
+	array = array.reshape(height, width, n_channels)
+	# each channel counts its values in its own range of 256 indices, so one
+	# `bincount` is enough for all of them
+	offsets = numpy.arange(n_channels, dtype=numpy.uint16) * 256
+	counts = numpy.zeros(n_channels * 256, dtype=numpy.int64)
+	rows_step = max(1, _NUMPY_CHUNK_SIZE // max(1, width))
+	for first_row in range(0, height, rows_step):
+		chunk = array[first_row:first_row + rows_step]
+		indices = chunk.astype(numpy.uint16) + offsets
+		counts += numpy.bincount(indices.ravel(), minlength=n_channels * 256)
+	return counts.reshape(n_channels, 256).tolist()
+
+def _python_histograms(pixels, width, height, rowstride, n_channels):
+	counters = [Counter() for c in range(n_channels)]
+	for y in range(height):
+		start = y * rowstride
+		end = start + width * n_channels
+		for c in range(n_channels):
+			counters[c].update(pixels[start + c:end:n_channels])
+	return [[counter[value] for value in range(256)] for counter in counters]
+
+################################################################################
+
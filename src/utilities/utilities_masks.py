@@ -0,0 +1,506 @@
+# Licensed under GPL3 https://github.com/maoschanz/drawing/blob/master/LICENSE
+
+import cairo, math
+from bisect import bisect_left, bisect_right
+from .utilities_pixels import numpy, utilities_has_numpy, \
+                              utilities_surface_as_array
+
+# A mask is a cairo.Format.A8 surface of the size of the image: the value of a
+# pixel is 255 if it belongs to the region, 0 otherwise. It can be used with
+# `cairo.Context.mask_surface` to paint only this region.
+
+# Number of pixels compared at once by the vectorized version, to keep the
+# temporary boolean arrays reasonably small.
+_NUMPY_CHUNK_SIZE = 1 << 20
+
+# Above this number of runs, tracing the exact contours of a region (which is
+# usually very fragmented then) would take seconds, so a coarser region is
+# traced: the path is only an outline anyway, the pixels are given by the mask.
+_MAX_TRACED_RUNS = 5000
+
+# Maximal differences between the values of the channels of 2 colors for them
+# to be considered similar, for each level of tolerance the tools can use.
+_TOLERANCES = {
+	'exact': 0,
+	'low': 10,
+	'medium': 32,
+	'high': 64,
+}
+
+################################################################################
+
+def utilities_mask_new(width, height):
+	return cairo.ImageSurface(cairo.Format.A8, width, height)
+
+def utilities_mask_as_array(mask):
+	"""Return a numpy array whose shape is (height, width), sharing its memory
+	with the pixels of `mask`. The caller has to call `mask.mark_dirty()` after
+	writing into it."""
+	mask.flush()
+	return numpy.ndarray(shape=(mask.get_height(), mask.get_width()), \
+	                     dtype=numpy.uint8, buffer=mask.get_data(), \
+	                     strides=(mask.get_stride(), 1))
+
+def utilities_mask_get_tolerance(level):
+	"""Return the tolerance (as expected by the functions of this module)
+	corresponding to the name of a level of tolerance."""
+	return _TOLERANCES.get(level, 0)
+
+def utilities_mask_of_color(surface, x, y, tolerance=0):
+	"""Return the mask of all the pixels of `surface` whose channels all
+	differ from the channels of the pixel at (x, y) by at most `tolerance`,
+	wherever they are. It returns None if the coordinates are outside of
+	`surface`."""
+	x = int(x)
+	y = int(y)
+	width = surface.get_width()
+	height = surface.get_height()
+	if x < 0 or y < 0 or x >= width or y >= height:
+		return None
+	mask = utilities_mask_new(width, height)
+	mask.set_device_scale(*surface.get_device_scale())
+	if utilities_has_numpy():
+		pixels = utilities_surface_as_array(surface)
+		matching = _numpy_get_matching(pixels, pixels[y, x], tolerance)
+		mask_array = utilities_mask_as_array(mask)
+		mask_array[...] = matching.view(numpy.uint8) * numpy.uint8(255)
+	else:
+		_python_mask_of_color(surface, mask, x, y, tolerance)
+	mask.mark_dirty()
+	return mask
+
+def utilities_mask_flood_fill(surface, x, y, tolerance=0):
+	"""Return the mask of the region of pixels connected (horizontally or
+	vertically) to the pixel at (x, y), whose channels all differ from this
+	pixel's channels by at most `tolerance`. Regions of other colors enclosed
+	in this region aren't part of the mask. It returns None if the coordinates
+	are outside of `surface`.
+	The region is found row by row, as runs of consecutive matching pixels: a
+	run belongs to the region if it touches a run of the region in the row
+	above or below."""
+	x = int(x)
+	y = int(y)
+	width = surface.get_width()
+	height = surface.get_height()
+	if x < 0 or y < 0 or x >= width or y >= height:
+		return None
+	mask = utilities_mask_new(width, height)
+	mask.set_device_scale(*surface.get_device_scale())
+	if utilities_has_numpy():
+		_numpy_flood_fill(surface, mask, x, y, tolerance)
+	else:
+		_python_flood_fill(surface, mask, x, y, tolerance)
+	mask.mark_dirty()
+	return mask
+
+def utilities_mask_contains(mask, x, y):
+	"""Tell whether the pixel at (x, y) belongs to the region of the mask."""
+	x = int(x)
+	y = int(y)
+	if x < 0 or y < 0 or x >= mask.get_width() or y >= mask.get_height():
+		return False
+	mask.flush()
+	return mask.get_data()[y * mask.get_stride() + x] != 0
+
+def utilities_mask_get_extents(mask):
+	"""Return the smallest rectangle (x, y, width, height) containing the
+	region of the mask, or None if the region is empty."""
+	runs = _get_mask_runs(mask)
+	rows = [y for y, row_runs in enumerate(runs) if len(row_runs) > 0]
+	if len(rows) == 0:
+		return None
+	x_min = min(runs[y][0][0] for y in rows)
+	x_max = max(runs[y][-1][1] for y in rows)
+	return x_min, rows[0], x_max - x_min, rows[-1] + 1 - rows[0]
+
+def utilities_mask_to_path(mask, tolerance=0.0):
+	"""Return a cairo.Path made of the closed contours of the region of the
+	mask, following the edges of its pixels. The contours of the holes go in
+	the opposite direction, so the path gives the same region with both fill
+	rules. It should be filled with `cairo.FillRule.EVEN_ODD` anyway.
+	If `tolerance` (in pixels) isn't zero, the contours are simplified: their
+	points are removed as long as the contours don't move by more than this
+	distance, so a staircase of pixels becomes a single oblique line.
+	If the region is too fragmented, the path is the contours of the blocks
+	of pixels containing the region, so it contains it but isn't exact."""
+	cairo_context = cairo.Context(mask)
+	cairo_context.new_path()
+	runs, block_size = _get_traced_runs(mask)
+	width = mask.get_width()
+	height = mask.get_height()
+	for contour in _get_contours(runs):
+		if block_size > 1:
+			contour = [(min(x * block_size, width), min(y * block_size, height)) \
+			                                                  for x, y in contour]
+		if tolerance > 0:
+			contour = _simplify_contour(contour, tolerance)
+		cairo_context.move_to(*contour[0])
+		for point in contour[1:]:
+			cairo_context.line_to(*point)
+		cairo_context.close_path()
+	return cairo_context.copy_path()
+
+################################################################################
+# Contours #####################################################################
+
+# The contours go along the edges between pixels, so their points are corners
+# of pixels. The region is always on the right of the edges (with the y-axis
+# going downwards).
+
+def _get_contours(runs):
+	"""Return the list of the contours of the region whose runs of pixels (for
+	each row) are `runs`, as lists of points without aligned points."""
+	edges = {}
+	def add_edge(start, end):
+		edges.setdefault(start, []).append(end)
+
+	for y, row_runs in enumerate(runs):
+		for start, end in row_runs:
+			add_edge((start, y + 1), (start, y))
+			add_edge((end, y), (end, y + 1))
+	for y in range(len(runs) + 1):
+		above = runs[y - 1] if y > 0 else []
+		below = runs[y] if y < len(runs) else []
+		for start, end, region_is_below in _get_horizontal_edges(above, below):
+			if region_is_below:
+				add_edge((start, y), (end, y))
+			else:
+				add_edge((end, y), (start, y))
+
+	contours = []
+	while len(edges) > 0:
+		first_point = next(iter(edges))
+		contour = [first_point]
+		point = _pop_edge(edges, first_point)
+		while point != first_point:
+			contour.append(point)
+			point = _pop_edge(edges, point)
+		contours.append(_remove_aligned_points(contour))
+	return contours
+
+def _get_horizontal_edges(above, below):
+	"""Yield the edges between 2 rows (described by their runs), as tuples of
+	the first column, the column after the last one, and a boolean telling if
+	the region is in the row below. The edges are as long as possible."""
+	bounds = sorted(set([b for run in above + below for b in run]))
+	current = None
+	i_above = i_below = 0
+	for left, right in zip(bounds, bounds[1:]):
+		while i_above < len(above) and above[i_above][1] <= left:
+			i_above += 1
+		while i_below < len(below) and below[i_below][1] <= left:
+			i_below += 1
+		in_above = i_above < len(above) and above[i_above][0] <= left
+		in_below = i_below < len(below) and below[i_below][0] <= left
+		if in_above == in_below:
+			region_is_below = None
+		else:
+			region_is_below = in_below
+		if current is not None and current[2] == region_is_below \
+		                                              and current[1] == left:
+			current[1] = right
+			continue
+		if current is not None and current[2] is not None:
+			yield tuple(current)
+		current = [left, right, region_is_below]
+	if current is not None and current[2] is not None:
+		yield tuple(current)
+
+def _get_traced_runs(mask):
+	"""Return the runs of the region of the mask, or of the blocks of pixels
+	containing it if it has too many runs, with the size of these blocks (its
+	coordinates are in blocks)."""
+	block_size = 1
+	if utilities_has_numpy():
+		region = utilities_mask_as_array(mask) > 0
+		rows, starts, ends = _numpy_get_runs(region)
+		while len(rows) > _MAX_TRACED_RUNS:
+			block_size *= 2
+			region = _numpy_get_coarse_region(region)
+			rows, starts, ends = _numpy_get_runs(region)
+		return _get_runs_lists(region.shape[0], rows, starts, ends), block_size
+	runs = _get_mask_runs(mask)
+	while sum(len(row_runs) for row_runs in runs) > _MAX_TRACED_RUNS:
+		block_size *= 2
+		runs = _get_coarse_runs(runs)
+	return runs, block_size
+
+def _get_coarse_runs(runs):
+	"""Return the runs of the region made of the blocks of 2 by 2 pixels
+	which contain at least one pixel of the region whose runs are `runs`."""
+	coarse_runs = []
+	for first_row in range(0, len(runs), 2):
+		bounds = sorted((start // 2, (end + 1) // 2) \
+		                for row_runs in runs[first_row:first_row + 2] \
+		                for start, end in row_runs)
+		row_runs = []
+		for start, end in bounds:
+			if len(row_runs) > 0 and start <= row_runs[-1][1]:
+				row_runs[-1] = (row_runs[-1][0], max(end, row_runs[-1][1]))
+			else:
+				row_runs.append((start, end))
+		coarse_runs.append(row_runs)
+	return coarse_runs
+
+def _pop_edge(edges, start):
+	ends = edges[start]
+	end = ends.pop()
+	if len(ends) == 0:
+		del edges[start]
+	return end
+
+def _simplify_contour(contour, tolerance):
+	"""Return the points of the closed `contour` kept by the Douglas-Peucker
+	algorithm: the contour is split in 2 halves, between its first point and
+	the point the most distant from it, and each part is replaced by a segment
+	if none of its points is further than `tolerance` from this segment, or
+	split again at its most distant point otherwise."""
+	length = len(contour)
+	if length < 4:
+		return contour
+	distances = [_get_distance_to_segment(point, contour[0], contour[0]) \
+	                                                      for point in contour]
+	farthest = distances.index(max(distances))
+	is_kept = [False] * length
+	is_kept[0] = is_kept[farthest] = True
+	# the index `length` is the first point again, since the contour is closed
+	parts = [(0, farthest), (farthest, length)]
+	while len(parts) > 0:
+		start, end = parts.pop()
+		a = contour[start]
+		b = contour[end % length]
+		max_distance = tolerance
+		split_index = None
+		for i in range(start + 1, end):
+			distance = _get_distance_to_segment(contour[i], a, b)
+			if distance > max_distance:
+				max_distance = distance
+				split_index = i
+		if split_index is not None:
+			is_kept[split_index] = True
+			parts.append((start, split_index))
+			parts.append((split_index, end))
+	points = [point for point, kept in zip(contour, is_kept) if kept]
+	if len(points) < 3:
+		return contour # a simplified contour shouldn't be flat
+	return points
+
+def _get_distance_to_segment(point, a, b):
+	dx = b[0] - a[0]
+	dy = b[1] - a[1]
+	squared_length = dx * dx + dy * dy
+	if squared_length == 0:
+		ratio = 0
+	else:
+		ratio = (point[0] - a[0]) * dx + (point[1] - a[1]) * dy
+		ratio = max(0, min(1, ratio / squared_length))
+	return math.hypot(point[0] - a[0] - ratio * dx, point[1] - a[1] - ratio * dy)
+
+def _remove_aligned_points(contour):
+	points = []
+	for i, point in enumerate(contour):
+		previous = contour[i - 1]
+		following = contour[(i + 1) % len(contour)]
+		if (previous[0] == point[0] == following[0]) or \
+		                             (previous[1] == point[1] == following[1]):
+			continue
+		points.append(point)
+	return points
+
+################################################################################
+# Vectorized implementation ####################################################
+
+def _numpy_flood_fill(surface, mask, x, y, tolerance):
+	pixels = utilities_surface_as_array(surface)
+	matching = _numpy_get_matching(pixels, pixels[y, x], tolerance)
+	rows, starts, ends = _numpy_get_runs(matching)
+	# index of the first run of each row (and of the end of the last row)
+	row_indices = numpy.searchsorted(rows, numpy.arange(pixels.shape[0] + 1))
+	row_indices = row_indices.tolist()
+	starts_list = starts.tolist()
+	ends_list = ends.tolist()
+
+	# the run containing the clicked pixel
+	first_run = bisect_right(starts_list, x, row_indices[y], \
+	                                                   row_indices[y + 1]) - 1
+	visited = bytearray(len(starts_list))
+	visited[first_run] = 1
+	stack = [(first_run, y)]
+	while len(stack) > 0:
+		run, row = stack.pop()
+		start, end = starts_list[run], ends_list[run]
+		for next_row in (row - 1, row + 1):
+			if next_row < 0 or next_row >= pixels.shape[0]:
+				continue
+			row_start = row_indices[next_row]
+			row_end = row_indices[next_row + 1]
+			# the runs of a row are sorted, and they never overlap, so the
+			# runs touching [start, end) are consecutive
+			first = bisect_right(ends_list, start, row_start, row_end)
+			last = bisect_left(starts_list, end, row_start, row_end)
+			for next_run in range(first, last):
+				if not visited[next_run]:
+					visited[next_run] = 1
+					stack.append((next_run, next_row))
+
+	region = numpy.frombuffer(visited, dtype=numpy.bool_)
+	_numpy_fill_runs(utilities_mask_as_array(mask), rows[region], \
+	                                             starts[region], ends[region])
+
+def _numpy_get_matching(pixels, color, tolerance):
+	"""Return the boolean array of the pixels whose channels all differ from
+	`color` by at most `tolerance`."""
+	matching = numpy.empty(pixels.shape[:2], dtype=numpy.bool_)
+	rows_step = max(1, _NUMPY_CHUNK_SIZE // max(1, pixels.shape[1]))
+	if tolerance == 0:
+		# the 4 channels of a pixel are compared at once, as an integer
+		color = color.copy().view(numpy.uint32)[0]
+		for first_row in range(0, pixels.shape[0], rows_step):
+			chunk = pixels[first_row:first_row + rows_step]
+			matching[first_row:first_row + rows_step] = \
+			                          chunk.view(numpy.uint32)[..., 0] == color
+		return matching
+	color = color.astype(numpy.int16)
+	lowest = numpy.maximum(color - tolerance, 0).astype(numpy.uint8)
+	highest = numpy.minimum(color + tolerance, 255).astype(numpy.uint8)
+	# values below `lowest` overflow, so they're above the range too
+	span = highest - lowest
+	all_true = numpy.array([1, 1, 1, 1], dtype=numpy.uint8).view(numpy.uint32)[0]
+	for first_row in range(0, pixels.shape[0], rows_step):
+		chunk = pixels[first_row:first_row + rows_step]
+		in_range = (chunk - lowest) <= span
+		matching[first_row:first_row + rows_step] = \
+		                       in_range.view(numpy.uint32)[..., 0] == all_true
+	return matching
+
+def _numpy_get_runs(matching):
+	"""Return 3 arrays with the row, the first column, and the column after
+	the last one, of each run of True values, sorted by row then column."""
+	height, width = matching.shape
+	padded = numpy.zeros((height, width + 2), dtype=numpy.int8)
+	padded[:, 1:-1] = matching
+	changes = numpy.diff(padded, axis=1)
+	rows, starts = numpy.nonzero(changes == 1)
+	ends = numpy.nonzero(changes == -1)[1]
+	return rows, starts, ends
+
+def _numpy_get_coarse_region(region):
+	"""Return the boolean array telling which blocks of 2 by 2 values of
+	`region` contain at least one True value."""
+	height, width = region.shape
+	padded = numpy.zeros((height + height % 2, width + width % 2), dtype=bool)
+	padded[:height, :width] = region
+	blocks = padded.reshape(padded.shape[0] // 2, 2, padded.shape[1] // 2, 2)
+	return blocks.any(axis=(1, 3))
+
+def _numpy_fill_runs(mask_array, rows, starts, ends):
+	# the runs of a row never touch each other, so a run can't start where
+	# another one ends, and the cumulated sum is 1 exactly inside the runs
+	changes = numpy.zeros((mask_array.shape[0], mask_array.shape[1] + 1), \
+	                                                        dtype=numpy.int8)
+	changes[rows, starts] = 1
+	changes[rows, ends] = -1
+	inside = numpy.cumsum(changes[:, :-1], axis=1, dtype=numpy.int8)
+	mask_array[...] = inside * numpy.uint8(255)
+
+def _get_runs_lists(height, rows, starts, ends):
+	"""Return the runs given by the arrays of `_numpy_get_runs` as a list of
+	lists of (start, end) tuples, one list for each row."""
+	runs = [[] for row in range(height)]
+	for row, start, end in zip(rows.tolist(), starts.tolist(), ends.tolist()):
+		runs[row].append((start, end))
+	return runs
+
+################################################################################
+# Pure-python implementation ###################################################
+
+def _python_get_matching_function(surface, x, y, tolerance):
+	"""Return a function telling if the pixel at the given coordinates is
+	similar to the pixel at (x, y)."""
+	surface.flush()
+	data = surface.get_data()
+	stride = surface.get_stride()
+	color = bytes(data[y * stride + x * 4:y * stride + x * 4 + 4])
+	bounds = [(max(0, c - tolerance), min(255, c + tolerance)) for c in color]
+
+	def is_matching(px, py):
+		index = py * stride + px * 4
+		for c in range(4):
+			if not bounds[c][0] <= data[index + c] <= bounds[c][1]:
+				return False
+		return True
+	return is_matching
+
+def _python_mask_of_color(surface, mask, x, y, tolerance):
+	is_matching = _python_get_matching_function(surface, x, y, tolerance)
+	mask_data = mask.get_data()
+	mask_stride = mask.get_stride()
+	for py in range(surface.get_height()):
+		for px in range(surface.get_width()):
+			if is_matching(px, py):
+				mask_data[py * mask_stride + px] = 255
+
+def _python_flood_fill(surface, mask, x, y, tolerance):
+	is_matching = _python_get_matching_function(surface, x, y, tolerance)
+	width = surface.get_width()
+	height = surface.get_height()
+	mask_data = mask.get_data()
+	mask_stride = mask.get_stride()
+	filled = bytearray(width * height)
+	stack = [(x, y)]
+	while len(stack) > 0:
+		px, py = stack.pop()
+		if filled[py * width + px] or not is_matching(px, py):
+			continue
+		start = px
+		while start > 0 and not filled[py * width + start - 1] and \
+		                                           is_matching(start - 1, py):
+			start -= 1
+		end = px + 1
+		while end < width and not filled[py * width + end] and \
+		                                                 is_matching(end, py):
+			end += 1
+		filled[py * width + start:py * width + end] = b'\x01' * (end - start)
+		mask_data[py * mask_stride + start:py * mask_stride + end] = \
+		                                                b'\xff' * (end - start)
+		# only the first pixel of each run of the adjacent rows is queued
+		for next_row in (py - 1, py + 1):
+			if next_row < 0 or next_row >= height:
+				continue
+			was_matching = False
+			for px in range(start, end):
+				matching = not filled[next_row * width + px] and \
+				                                   is_matching(px, next_row)
+				if matching and not was_matching:
+					stack.append((px, next_row))
+				was_matching = matching
+
+def _get_mask_runs(mask):
+	"""Return, for each row of the mask, the list of its runs of non-zero
+	pixels, as (start, end) tuples."""
+	height = mask.get_height()
+	if utilities_has_numpy():
+		rows, starts, ends = _numpy_get_runs(utilities_mask_as_array(mask) > 0)
+		return _get_runs_lists(height, rows, starts, ends)
+	mask.flush()
+	data = mask.get_data()
+	stride = mask.get_stride()
+	width = mask.get_width()
+	runs = []
+	for row in range(height):
+		row_data = bytes(data[row * stride:row * stride + width])
+		row_runs = []
+		start = None
+		for column, value in enumerate(row_data):
+			if value and start is None:
+				start = column
+			elif not value and start is not None:
+				row_runs.append((start, column))
+				start = None
+		if start is not None:
+			row_runs.append((start, width))
+		runs.append(row_runs)
+	return runs
+
+################################################################################
+
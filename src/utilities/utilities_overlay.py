@@ -61,6 +61,7 @@ def utilities_show_overlay_on_context(ccontext, cpath, thickness=1):
 	ccontext.set_line_width(thickness)
 	ccontext.set_dash([thickness * 3, thickness * 3])
 	ccontext.append_path(cpath)
+	ccontext.set_fill_rule(cairo.FillRule.EVEN_ODD)
 	ccontext.set_source_rgba(0.1, 0.1, 0.3, 0.2)
 	ccontext.fill_preserve()
 	ccontext.set_source_rgba(0.5, 0.5, 0.5, 0.5)
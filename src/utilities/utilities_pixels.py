@@ -0,0 +1,98 @@
+# Licensed under GPL3 https://github.com/maoschanz/drawing/blob/master/LICENSE
+
+import sys
+
+try:
+	import numpy
+except ImportError:
+	# NumPy is an optional dependency: without it, the algorithms working on
+	# the pixels fall back to (much slower) pure-python implementations.
+	numpy = None
+
+# Index of the alpha channel in the memory of a cairo.Format.ARGB32 surface,
+# whose pixels are native-endian 32-bits integers.
+ALPHA_INDEX = 3 if sys.byteorder == 'little' else 0
+# Indices of the red, green, blue and alpha channels in the memory of such a
+# surface.
+RGBA_INDICES = [2, 1, 0, 3] if sys.byteorder == 'little' else [1, 2, 3, 0]
+
+# Number of pixels processed at once, to keep the temporary arrays reasonably
+# small.
+_NUMPY_CHUNK_SIZE = 1 << 20
+
+class NoNumpyException(Exception):
+	def __init__(self, *args):
+		super().__init__(_("This operation requires NumPy, which isn't installed."))
+
+################################################################################
+
+def utilities_has_numpy():
+	return numpy is not None
+
+def utilities_surface_as_array(surface):
+	"""Return a numpy array whose shape is (height, width, 4), sharing its
+	memory with the pixels of `surface` (a cairo.Format.ARGB32 image surface),
+	so nothing is copied. Writing into the array writes into the surface, so
+	the caller has to call `surface.mark_dirty()` afterwards."""
+	surface.flush()
+	width = surface.get_width()
+	height = surface.get_height()
+	stride = surface.get_stride()
+	return numpy.ndarray(shape=(height, width, 4), dtype=numpy.uint8, \
+	                     buffer=surface.get_data(), strides=(stride, 4, 1))
+
+def utilities_surface_is_opaque(surface):
+	"""Tells whether or not all the pixels of `surface` are fully opaque."""
+	if surface.get_width() == 0 or surface.get_height() == 0:
+		return True
+	if utilities_has_numpy():
+		return utilities_surface_as_array(surface)[..., ALPHA_INDEX].min() == 255
+	surface.flush()
+	# a stride of an ARGB32 surface has no padding, so every 4th byte is alpha
+	alpha_values = bytes(surface.get_data()[ALPHA_INDEX::4])
+	return alpha_values.count(255) == len(alpha_values)
+
+def utilities_surface_erase_colors(surface, colors):
+	"""Make fully transparent, in place, the pixels of `surface` whose colors
+	(unpremultiplied) are exactly in `colors` (a list of (red, green, blue)
+	tuples of integers between 0 and 255), like `GdkPixbuf.add_alpha` would.
+	All the colors are erased in a single pass over the pixels. It needs
+	NumPy."""
+	if not utilities_has_numpy():
+		raise NoNumpyException()
+	targets = _get_packed_colors(colors)
+	if targets.size == 0:
+		return
+	pixels = utilities_surface_as_array(surface)
+	rows_step = max(1, _NUMPY_CHUNK_SIZE // max(1, pixels.shape[1]))
+	for first_row in range(0, pixels.shape[0], rows_step):
+		chunk = pixels[first_row:first_row + rows_step]
+		# a pixel is a native-endian integer whose bytes are alpha, red, green
+		# and blue, so the color of an opaque pixel is its 24 lowest bits
+		values = chunk.view(numpy.uint32)[..., 0]
+		packed = values & 0xffffff
+		alpha = values >> 24
+		translucent = (alpha > 0) & (alpha < 255)
+		if translucent.any():
+			a = alpha[translucent]
+			packed[translucent] = _get_unpremultiplied(values[translucent], a, 16) \
+			                    | _get_unpremultiplied(values[translucent], a, 8) \
+			                    | _get_unpremultiplied(values[translucent], a, 0)
+		erased = numpy.isin(packed, targets) & (alpha > 0)
+		chunk[erased] = 0
+	surface.mark_dirty()
+
+def _get_unpremultiplied(values, alpha, shift):
+	"""Return the unpremultiplied values of the channel stored at `shift`, at
+	the same place. They're rounded like GdkPixbuf does."""
+	channel = (values >> shift) & 0xff
+	return ((channel * 255 + alpha // 2) // alpha) << shift
+
+def _get_packed_colors(colors):
+	"""Return the sorted array of the colors, as 24-bits integers."""
+	colors = numpy.array(list(colors), dtype=numpy.int32).reshape(-1, 3)
+	packed = (colors[:, 0] << 16) | (colors[:, 1] << 8) | colors[:, 2]
+	return numpy.unique(packed.astype(numpy.uint32))
+
+################################################################################
+
@@ -0,0 +1,160 @@
+# Licensed under GPL3 https://github.com/maoschanz/drawing/blob/master/LICENSE
+
+import hashlib, time, weakref, zlib
+from gi.repository import GdkPixbuf, GLib
+from .utilities_pixels import numpy, utilities_has_numpy
+
+# The fastest level is enough: the drawings are usually made of large areas of
+# flat colors, which any level compresses very well, and a snapshot should be
+# compressed and decompressed without the user noticing.
+_COMPRESSION_LEVEL = 1
+
+_TILE_SIZE = 64
+
+class TileStore():
+	"""Content-addressed storage of the tiles of the snapshots of the history:
+	identical tiles, in several versions of an image or in several images, are
+	stored only once. A tile is forgotten as soon as no snapshot uses it."""
+
+	def __init__(self):
+		self._tiles = weakref.WeakValueDictionary()
+
+	def get_tile(self, width, height, data):
+		"""Return the stored tile whose pixels are `data`, adding it to the
+		store if it's not already known."""
+		digest = hashlib.blake2b(data, digest_size=16).digest()
+		key = (width, height, len(data), digest)
+		tile = self._tiles.get(key)
+		if tile is None:
+			tile = _Tile(zlib.compress(data, _COMPRESSION_LEVEL))
+			self._tiles[key] = tile
+		return tile
+
+	def get_nb_tiles(self):
+		return len(self._tiles)
+
+	############################################################################
+################################################################################
+
+class _Tile():
+	__slots__ = ('data', '__weakref__')
+
+	def __init__(self, data):
+		self.data = data
+
+################################################################################
+
+class TiledPixbuf():
+	"""The pixels of a pixbuf, as a grid of tiles from a TileStore, in order to
+	store in the history the versions of the image which are rarely restored.
+	The tiles which didn't change since a previous version cost nothing."""
+
+	def __init__(self, pixbuf, tile_store):
+		self._width = pixbuf.get_width()
+		self._height = pixbuf.get_height()
+		self._n_channels = pixbuf.get_n_channels()
+		self._colorspace = pixbuf.get_colorspace()
+		self._has_alpha = pixbuf.get_has_alpha()
+		self._bits_per_sample = pixbuf.get_bits_per_sample()
+		self._tiles = []
+		rows = _get_rows(pixbuf)
+		for y in range(0, self._height, _TILE_SIZE):
+			tile_height = min(_TILE_SIZE, self._height - y)
+			for x in range(0, self._width, _TILE_SIZE):
+				tile_width = min(_TILE_SIZE, self._width - x)
+				data = _get_tile_data(rows, x * self._n_channels, y, \
+				                   tile_width * self._n_channels, tile_height)
+				tile = tile_store.get_tile(tile_width, tile_height, data)
+				self._tiles.append(tile)
+
+	def get_tiles(self):
+		return self._tiles
+
+	def get_byte_length(self):
+		return sum(len(tile.data) for tile in set(self._tiles))
+
+	def get_pixbuf(self):
+		"""Return a new pixbuf with the decompressed pixels of the tiles."""
+		rowstride = self._width * self._n_channels
+		pixels = bytearray(rowstride * self._height)
+		if utilities_has_numpy():
+			rows = numpy.frombuffer(pixels, dtype=numpy.uint8)
+			rows = rows.reshape(self._height, rowstride)
+		tiles = iter(self._tiles)
+		for y in range(0, self._height, _TILE_SIZE):
+			tile_height = min(_TILE_SIZE, self._height - y)
+			for x in range(0, self._width, _TILE_SIZE):
+				line_length = min(_TILE_SIZE, self._width - x) * self._n_channels
+				data = zlib.decompress(next(tiles).data)
+				start = x * self._n_channels
+				if utilities_has_numpy():
+					tile = numpy.frombuffer(data, dtype=numpy.uint8)
+					rows[y:y + tile_height, start:start + line_length] = \
+					                    tile.reshape(tile_height, line_length)
+					continue
+				for i in range(tile_height):
+					index = (y + i) * rowstride + start
+					pixels[index:index + line_length] = \
+					              data[i * line_length:(i + 1) * line_length]
+		return GdkPixbuf.Pixbuf.new_from_bytes(GLib.Bytes.new(pixels), \
+		                      self._colorspace, self._has_alpha, \
+		                      self._bits_per_sample, self._width, self._height, \
+		                                                              rowstride)
+
+	############################################################################
+################################################################################
+
+def _get_rows(pixbuf):
+	"""Return the pixels of `pixbuf` as an object whose rows can be sliced by
+	`_get_tile_data`: a 2D array if possible, or the list of the rows."""
+	rowstride = pixbuf.get_rowstride()
+	line_length = pixbuf.get_width() * pixbuf.get_n_channels()
+	pixels = pixbuf.get_pixels()
+	if utilities_has_numpy():
+		# the last row of a pixbuf may not have the padding of the others
+		pixels = bytearray(pixels)
+		pixels.extend(bytes(rowstride * pixbuf.get_height() - len(pixels)))
+		rows = numpy.frombuffer(pixels, dtype=numpy.uint8)
+		return rows.reshape(pixbuf.get_height(), rowstride)[:, :line_length]
+	return [pixels[y * rowstride:y * rowstride + line_length] \
+	                                      for y in range(pixbuf.get_height())]
+
+def _get_tile_data(rows, start, y, line_length, nb_rows):
+	if utilities_has_numpy():
+		return rows[y:y + nb_rows, start:start + line_length].tobytes()
+	return b''.join([row[start:start + line_length] \
+	                                             for row in rows[y:y + nb_rows]])
+
+################################################################################
+
+def utilities_snapshots_benchmark(pixbuf):
+	"""Micro-benchmark comparing the storage of `pixbuf` as a snapshot of the
+	history, tiled or not: it measures the memory used, and the time to store
+	and to restore it, in a store which already knows it or not. Returns a
+	human-readable summary."""
+	copy_duration = _measure(pixbuf.copy)
+	new_duration = _measure(lambda: TiledPixbuf(pixbuf, TileStore()))
+	tile_store = TileStore()
+	tiled = TiledPixbuf(pixbuf, tile_store)
+	known_duration = _measure(lambda: TiledPixbuf(pixbuf, tile_store))
+	restore_duration = _measure(tiled.get_pixbuf)
+	raw_size = GLib.format_size(pixbuf.get_byte_length())
+	tiled_size = GLib.format_size(tiled.get_byte_length())
+	return "%s stored as %s tiles (%s), copy: %sms, new tiles: %sms, " \
+	       "known tiles: %sms, restoration: %sms" % (raw_size, \
+	       tile_store.get_nb_tiles(), tiled_size, \
+	       round(copy_duration * 1e3, 1), round(new_duration * 1e3, 1), \
+	       round(known_duration * 1e3, 1), round(restore_duration * 1e3, 1))
+
+def _measure(function):
+	"""Return the best of 3 measures (in seconds), the others being probably
+	disturbed by something else."""
+	durations = []
+	for i in range(3):
+		time0 = time.perf_counter()
+		function()
+		durations.append(time.perf_counter() - time0)
+	return min(durations)
+
+################################################################################
+
@@ -0,0 +1,102 @@
+# Licensed under GPL3 https://github.com/maoschanz/drawing/blob/master/LICENSE
+
+from gi.repository import GdkPixbuf, GLib
+from .utilities_pixels import numpy, utilities_has_numpy, \
+                              utilities_surface_as_array, ALPHA_INDEX
+
+# A lookup table (LUT) is a list of 256 integers between 0 and 255: the value
+# of a color channel is replaced by the item of the LUT at this index. All the
+# color channels use the same LUT, and the alpha channel isn't changed.
+
+# Number of pixels processed at once by the vectorized versions, to keep the
+# arrays of indices reasonably small.
+_NUMPY_CHUNK_SIZE = 1 << 20
+
+################################################################################
+
+def utilities_tones_get_identity():
+	return list(range(256))
+
+def utilities_tones_clamp(value):
+	"""Round a value computed for a LUT to an integer between 0 and 255."""
+	return max(0, min(255, int(round(value))))
+
+def utilities_tones_compose(first_lut, second_lut):
+	"""Return a single LUT equivalent to `first_lut` followed by `second_lut`."""
+	return [second_lut[value] for value in first_lut]
+
+def utilities_tones_get_levels(black, white):
+	"""Return the LUT stretching the values between `black` and `white` to
+	the whole range: the values below `black` become 0, and the values above
+	`white` become 255."""
+	white = max(black + 1, white)
+	factor = 255 / (white - black)
+	return [utilities_tones_clamp((value - black) * factor) \
+	                                                for value in range(256)]
+
+################################################################################
+
+def utilities_tones_apply_to_pixbuf(pixbuf, lut):
+	"""Return a new pixbuf whose color channels have been replaced using `lut`.
+	Pixbufs aren't premultiplied, so the LUT applies directly to the values."""
+	width = pixbuf.get_width()
+	height = pixbuf.get_height()
+	rowstride = pixbuf.get_rowstride()
+	n_channels = pixbuf.get_n_channels()
+	# the last row of a pixbuf may not have the padding of the others
+	pixels = bytearray(pixbuf.get_pixels())
+	pixels.extend(bytes(rowstride * height - len(pixels)))
+
+	if utilities_has_numpy():
+		array = numpy.frombuffer(pixels, dtype=numpy.uint8)
+		array = array.reshape(height, rowstride)[:, :width * n_channels]
+		array = array.reshape(height, width, n_channels)
+		_numpy_apply_lut(array[..., :3], numpy.array(lut, dtype=numpy.uint8))
+	else:
+		table = bytes(lut)
+		for y in range(height):
+			start = y * rowstride
+			end = start + width * n_channels
+			for c in range(3):
+				channel = slice(start + c, end, n_channels)
+				pixels[channel] = pixels[channel].translate(table)
+
+	return GdkPixbuf.Pixbuf.new_from_bytes(GLib.Bytes.new(pixels), \
+	                   pixbuf.get_colorspace(), pixbuf.get_has_alpha(), \
+	                   pixbuf.get_bits_per_sample(), width, height, rowstride)
+
+def utilities_tones_apply_to_surface(surface, lut):
+	"""Replace in place the color channels of `surface` using `lut`. It needs
+	NumPy. The surface is premultiplied: the values are unpremultiplied, then
+	changed, then premultiplied again, all using a single table indexed by
+	both the alpha value and the color value."""
+	table = _get_premultiplied_table(lut)
+	pixels = utilities_surface_as_array(surface)
+	color_indices = [i for i in range(4) if i != ALPHA_INDEX]
+	rows_step = max(1, _NUMPY_CHUNK_SIZE // max(1, pixels.shape[1]))
+	for first_row in range(0, pixels.shape[0], rows_step):
+		chunk = pixels[first_row:first_row + rows_step]
+		alpha = chunk[..., ALPHA_INDEX].astype(numpy.uint16) << 8
+		for c in color_indices:
+			chunk[..., c] = table.take(alpha | chunk[..., c])
+	surface.mark_dirty()
+
+def _numpy_apply_lut(array, lut):
+	rows_step = max(1, _NUMPY_CHUNK_SIZE // max(1, array.shape[1]))
+	for first_row in range(0, array.shape[0], rows_step):
+		chunk = array[first_row:first_row + rows_step]
+		chunk[...] = lut.take(chunk)
+
+def _get_premultiplied_table(lut):
+	"""Return a flat table of 256 * 256 values, where the value at the index
+	`alpha * 256 + value` is the premultiplied result of the LUT."""
+	alpha = numpy.arange(256, dtype=numpy.uint32)[:, None]
+	value = numpy.arange(256, dtype=numpy.uint32)[None, :]
+	unpremultiplied = (value * 255 + alpha // 2) // numpy.maximum(alpha, 1)
+	unpremultiplied = numpy.minimum(unpremultiplied, 255)
+	changed = numpy.array(lut, dtype=numpy.uint32)[unpremultiplied]
+	table = (changed * alpha + 127) // 255
+	return table.astype(numpy.uint8).ravel()
+
+################################################################################
+
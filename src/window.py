@@ -35,6 +35,10 @@ from .tools_initializer import DrToolsInitializer
 # Import various functions
 from .utilities_files import utilities_add_filechooser_filters, \
                              utilities_gfile_is_image
+from .utilities_blur import utilities_blur_calibrate, \
+                            utilities_blur_calibrate_when_idle, \
+                            utilities_blur_set_logger
+from .utilities_snapshots import utilities_snapshots_benchmark
 
 UI_PATH = '/com/github/maoschanz/drawing/ui/'
 DEFAULT_TOOL_ID = 'pencil'
@@ -104,6 +108,9 @@ class DrWindow(Gtk.ApplicationWindow):
 		self.printing_manager = DrPrintingManager(self)
 
 		self.devel_mode = self.gsettings.get_boolean('devel-only')
+		if self.devel_mode:
+			utilities_blur_set_logger(self.log_message)
+		utilities_blur_calibrate_when_idle()
 		self.add_all_win_actions()
 		self._init_tools()
 		self.connect_signals()
@@ -589,6 +596,9 @@ class DrWindow(Gtk.ApplicationWindow):
 			self.add_action_simple('rebuild_from_histo', self.action_rebuild)
 			self.add_action_simple('get_values', self.action_getvalues, ['<Ctrl>g'])
 			self.add_action_boolean('track_framerate', False, self.action_fsp)
+			self.add_action_simple('calibrate_blur', self.action_calibrate_blur)
+			self.add_action_simple('benchmark_snapshots', \
+			                                   self.action_benchmark_snapshots)
 
 		action = Gio.PropertyAction.new('active_tab', self.notebook, 'page')
 		self.add_action(action)
@@ -1274,6 +1284,16 @@ class DrWindow(Gtk.ApplicationWindow):
 		"""[Dev only] rebuild the image according to the history content."""
 		self.get_active_image()._history._rebuild_from_history()
 
+	def action_calibrate_blur(self, *args):
+		"""[Dev only] run again the micro-benchmark of the blur algorithms."""
+		self.reveal_message(utilities_blur_calibrate())
+
+	def action_benchmark_snapshots(self, *args):
+		"""[Dev only] measure the cost of the storage of the history's snapshots
+		as tiles, using the current image."""
+		pixbuf = self.get_active_image().main_pixbuf
+		self.reveal_message(utilities_snapshots_benchmark(pixbuf))
+
 	def update_history_actions_labels(self, undo_label, redo_label):
 		self._decorations.set_undo_label(undo_label)
 		self._decorations.set_redo_label(redo_label)